@@ -0,0 +1,271 @@
+"""
+Audio analysis: duration/codec probing and waveform peak precomputation.
+
+Duration, codec and bitrate come from container headers (the stdlib `wave`
+module for WAV, ffprobe for everything else) so nothing is decoded just to
+show a length. The recording is then decoded once - straight from the WAV
+frames, or by ffmpeg to 8 kHz mono PCM - into a compact array of PEAK_COUNT
+peak values (one byte each) that is stored as a sidecar file next to the
+audio and served by GET /api/audio/{id}/peaks.
+
+ffmpeg/ffprobe are optional: without them WAV files are still fully
+analysed and other formats just get no duration or waveform.
+"""
+
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import wave
+from array import array
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app import models, storage
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+FFMPEG = shutil.which(os.getenv("FFMPEG_PATH", "ffmpeg"))
+FFPROBE = shutil.which(os.getenv("FFPROBE_PATH", "ffprobe"))
+
+PEAK_COUNT = int(os.getenv("AUDIO_PEAK_COUNT", "1000"))  # 1 byte per peak
+DECODE_SAMPLE_RATE = 8000  # Plenty for a waveform outline
+WINDOW_SECONDS = 0.01  # Peaks are gathered per 10ms window, then downsampled
+READ_BYTES = 256 * 1024
+PEAKS_FOLDER = "audio_peaks"
+
+
+@contextmanager
+def local_copy(file_path_or_url: str) -> Iterator[str]:
+    """Yield a local filesystem path for a stored file, downloading cloud files to a temp file"""
+    if not file_path_or_url.startswith('http'):
+        yield file_path_or_url
+        return
+
+    suffix = os.path.splitext(file_path_or_url.split('?')[0])[1]
+    fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        storage.download_file(file_path_or_url, tmp_path)
+        yield tmp_path
+    finally:
+        os.remove(tmp_path)
+
+
+def _probe_wav(path: str) -> Optional[dict]:
+    try:
+        with wave.open(path, 'rb') as wav:
+            rate = wav.getframerate()
+            channels = wav.getnchannels()
+            sample_width = wav.getsampwidth()
+            return {
+                "duration": wav.getnframes() / rate if rate else None,
+                "codec": f"pcm_s{sample_width * 8}le" if sample_width > 1 else "pcm_u8",
+                "bitrate": rate * channels * sample_width * 8,
+                "sample_rate": rate,
+                "channels": channels,
+            }
+    except (wave.Error, EOFError):
+        return None
+
+
+def _probe_ffprobe(path: str) -> Optional[dict]:
+    if not FFPROBE:
+        return None
+    try:
+        result = subprocess.run(
+            [FFPROBE, "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "format=duration,bit_rate:stream=codec_name,sample_rate,channels,bit_rate",
+             "-of", "json", path],
+            capture_output=True, text=True, timeout=60, check=True
+        )
+        info = json.loads(result.stdout)
+    except (subprocess.SubprocessError, ValueError) as e:
+        log.warning("ffprobe failed", extra={"path": path, "error": str(e)})
+        return None
+
+    stream = (info.get("streams") or [{}])[0]
+    fmt = info.get("format") or {}
+
+    def number(value, cast):
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return None
+
+    return {
+        # Browser-recorded webm often has no duration in its header ("N/A")
+        "duration": number(fmt.get("duration"), float),
+        "codec": stream.get("codec_name"),
+        "bitrate": number(stream.get("bit_rate") or fmt.get("bit_rate"), int),
+        "sample_rate": number(stream.get("sample_rate"), int),
+        "channels": number(stream.get("channels"), int),
+    }
+
+
+def probe(path: str) -> dict:
+    """Read duration (seconds), codec, bitrate, sample rate and channels from headers"""
+    return _probe_wav(path) or _probe_ffprobe(path) or {
+        "duration": None, "codec": None, "bitrate": None, "sample_rate": None, "channels": None,
+    }
+
+
+def _pcm_from_wav(path: str):
+    """(sample stream of signed 16-bit arrays, samples per second) straight from WAV frames"""
+    with wave.open(path, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            return None
+        rate = wav.getframerate() * wav.getnchannels()  # Interleaved channels are fine for peaks
+
+    def stream():
+        with wave.open(path, 'rb') as wav:
+            while True:
+                frames = wav.readframes(READ_BYTES // 2)
+                if not frames:
+                    break
+                yield frames
+
+    return stream(), rate
+
+
+def _pcm_from_ffmpeg(path: str):
+    """(sample stream, samples per second) decoded by ffmpeg to 8 kHz mono s16le"""
+    if not FFMPEG:
+        return None
+
+    def stream():
+        process = subprocess.Popen(
+            [FFMPEG, "-v", "error", "-i", path, "-vn", "-ac", "1", "-ar", str(DECODE_SAMPLE_RATE),
+             "-f", "s16le", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        try:
+            while True:
+                data = process.stdout.read(READ_BYTES)
+                if not data:
+                    break
+                yield data
+        finally:
+            process.stdout.close()
+            process.wait()
+
+    return stream(), DECODE_SAMPLE_RATE
+
+
+def compute_peaks(path: str, peak_count: int = PEAK_COUNT):
+    """
+    Decode the recording once and reduce it to peak_count peaks (0-255).
+
+    Returns:
+        (peaks bytes, decoded duration in seconds), or (None, None) if it can't be decoded
+    """
+    source = None
+    try:
+        source = _pcm_from_wav(path)
+    except (wave.Error, EOFError):
+        pass
+    source = source or _pcm_from_ffmpeg(path)
+    if not source:
+        return None, None
+
+    chunks, rate = source
+    window = max(1, int(rate * WINDOW_SECONDS))
+    window_peaks = array('H')
+    current_peak = 0
+    in_window = 0
+    total = 0
+    leftover = b""
+
+    for data in chunks:
+        data = leftover + data
+        usable = len(data) - len(data) % 2
+        leftover = data[usable:]
+        samples = array('h', data[:usable])
+        if sys.byteorder == 'big':
+            samples.byteswap()
+        total += len(samples)
+
+        pos = 0
+        while pos < len(samples):
+            take = min(window - in_window, len(samples) - pos)
+            chunk = samples[pos:pos + take]
+            current_peak = max(current_peak, max(chunk), -min(chunk))
+            in_window += take
+            pos += take
+            if in_window == window:
+                window_peaks.append(min(current_peak, 32767))
+                current_peak = 0
+                in_window = 0
+
+    if in_window:
+        window_peaks.append(min(current_peak, 32767))
+    if not window_peaks:
+        return None, None
+
+    # Downsample window peaks to exactly peak_count buckets (max per bucket)
+    count = len(window_peaks)
+    peaks = bytearray(peak_count)
+    for i in range(peak_count):
+        start = i * count // peak_count
+        end = max(start + 1, (i + 1) * count // peak_count)
+        peaks[i] = max(window_peaks[start:end]) * 255 // 32767
+
+    return bytes(peaks), total / rate
+
+
+def analyse_recording(db, audio: models.AudioRecording):
+    """Probe, compute peaks and store the results for one recording (caller commits)"""
+    with local_copy(audio.file_path) as path:
+        info = probe(path)
+        peaks, decoded_duration = compute_peaks(path)
+
+    duration = info["duration"] or decoded_duration
+    if duration is not None:
+        audio.duration_seconds = int(round(duration))
+
+    peaks_path = None
+    if peaks:
+        peaks_path = storage.upload_file(
+            io.BytesIO(peaks),
+            f"{audio.filename}.peaks",
+            PEAKS_FOLDER,
+            "application/octet-stream"
+        )
+
+    analysis = db.query(models.AudioAnalysis).filter(
+        models.AudioAnalysis.audio_id == audio.id
+    ).first() or models.AudioAnalysis(audio_id=audio.id)
+    # Re-analysis overwrites {filename}.peaks in place: only delete a different file
+    if analysis.peaks_path and not (peaks_path and storage.same_file(analysis.peaks_path, peaks_path)):
+        storage.delete_file(analysis.peaks_path)
+    analysis.codec = info["codec"]
+    analysis.bitrate = info["bitrate"]
+    analysis.sample_rate = info["sample_rate"]
+    analysis.channels = info["channels"]
+    analysis.peaks_path = peaks_path
+    analysis.peak_count = len(peaks) if peaks else None
+    db.add(analysis)
+    return analysis
+
+
+def analyse_recording_task(audio_id: int):
+    """Background task entry point: analyse a freshly uploaded recording in its own session"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        audio = db.query(models.AudioRecording).filter(models.AudioRecording.id == audio_id).first()
+        if not audio:
+            return
+        analyse_recording(db, audio)
+        db.commit()
+        log.info("Analysed recording", extra={"audio_id": audio_id, "duration_seconds": audio.duration_seconds})
+    except Exception:
+        db.rollback()
+        log.exception("Failed to analyse recording", extra={"audio_id": audio_id})
+    finally:
+        db.close()
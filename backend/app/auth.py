@@ -7,13 +7,20 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app import models
+from app.metrics import auth_logins, auth_rejected_tokens
+from app.logs import get_logger
 import os
 
+log = get_logger(__name__)
+
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Media tokens ride in URLs for players that can't send headers (native HLS)
+MEDIA_TOKEN_EXPIRE_MINUTES = int(os.getenv("MEDIA_TOKEN_EXPIRE_MINUTES", "360"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 
 
 def verify_password(plain_password, hashed_password):
@@ -33,7 +40,7 @@ def verify_password(plain_password, hashed_password):
         
         return bcrypt.checkpw(password_bytes, hash_bytes)
     except Exception as e:
-        print(f"Password verification error: {e}")
+        log.error("Password verification error", extra={"error": str(e)})
         return False
 
 
@@ -62,16 +69,40 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+def create_media_token(username: str, scope: str) -> str:
+    """Token that only grants `scope` (e.g. "hls:12"), for use in a URL query"""
+    return create_access_token(
+        {"sub": username, "scope": scope},
+        timedelta(minutes=MEDIA_TOKEN_EXPIRE_MINUTES)
+    )
+
+
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
 
+def user_from_token(db: Session, token: str, scope: Optional[str] = None):
+    """User of a valid token, or None: an access token, or with scope a media token for exactly that scope"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    # Media tokens leak into URLs and logs, so they never work as access tokens
+    if username is None or payload.get("scope") != scope:
+        return None
+    return get_user_by_username(db, username=username)
+
+
 def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_username(db, username)
     if not user:
+        auth_logins.inc("unknown_user")
         return False
     if not verify_password(password, user.hashed_password):
+        auth_logins.inc("bad_password")
         return False
+    auth_logins.inc("success")
     return user
 
 
@@ -84,15 +115,9 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = get_user_by_username(db, username=username)
+    user = user_from_token(db, token)
     if user is None:
+        auth_rejected_tokens.inc()
         raise credentials_exception
     return user
 
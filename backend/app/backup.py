@@ -0,0 +1,654 @@
+"""
+Incremental, deduplicated SQLite backups.
+
+Each snapshot takes a consistent copy of the database with SQLite's online
+backup API, splits it into fixed-size blocks (a whole number of database
+pages) and stores only blocks whose content hash isn't already in the
+repository. A snapshot is a small JSON manifest listing its block hashes,
+so disk usage grows with the pages that changed, not with database size.
+
+Repository layout (under BACKUP_DIR, default backend/backups):
+    incremental/chunks/ab/<sha256>.zst   compressed blocks (.gz without zstandard)
+    incremental/snapshots/<id>.json      one manifest per snapshot
+
+Every block is named by the SHA-256 of its uncompressed bytes and each
+manifest records the SHA-256 of the whole database, so restores and
+`verify` detect any corruption.
+
+The copy runs in batches of PAGES_PER_STEP pages with a STEP_SLEEP pause
+between them, so a backup taken during peak use never holds the database
+for long. Postgres deployments get a streamed, compressed pg_dump instead
+(incremental/dumps/<id>.sql.zst). run_job() wraps either one with progress
+reporting for the admin API.
+
+Retention is grandfather-father-son: the KEEP_LAST most recent snapshots
+plus the newest snapshot of each of the last KEEP_DAILY days, KEEP_WEEKLY
+weeks and KEEP_MONTHLY months are kept; blocks no longer referenced by any
+snapshot are then deleted.
+
+Snapshots, retention and garbage collection take the repository lock (an
+in-process lock plus an flock on incremental/.lock), so the API job and a
+cron-run backup_database.py never overlap: a snapshot reuses blocks that
+are already stored, and a concurrent collection could otherwise delete
+them before the new manifest references them.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # Falls back to gzip
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+BACKUP_DIR = Path(os.getenv("BACKUP_DIR", Path(__file__).resolve().parent.parent / "backups"))
+BLOCK_SIZE = int(os.getenv("BACKUP_BLOCK_SIZE", str(64 * 1024)))
+KEEP_LAST = int(os.getenv("BACKUP_KEEP_LAST", "3"))
+KEEP_DAILY = int(os.getenv("BACKUP_KEEP_DAILY", "7"))
+KEEP_WEEKLY = int(os.getenv("BACKUP_KEEP_WEEKLY", "4"))
+KEEP_MONTHLY = int(os.getenv("BACKUP_KEEP_MONTHLY", "12"))
+
+# Online copy pacing: pages per sqlite3 backup step and pause between steps
+PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.02"))
+# Writes from other connections restart a paced copy; after this many
+# restarts the rest is copied in one step (like a plain backup)
+MAX_RESTARTS = 3
+
+PG_DUMP = shutil.which(os.getenv("PG_DUMP_PATH", "pg_dump"))
+DUMP_READ_BYTES = 1024 * 1024
+
+SNAPSHOT_ID_FORMAT = "%Y%m%d_%H%M%S"
+
+
+class BackupError(Exception):
+    pass
+
+
+class _CopyRestarted(Exception):
+    pass
+
+
+# One snapshot or retention run at a time in this process (see _exclusive)
+_repo_lock = threading.Lock()
+
+
+def is_postgres() -> bool:
+    from app.database import DATABASE_URL
+
+    return DATABASE_URL.startswith("postgresql")
+
+
+def sqlite_db_path() -> Path:
+    """Path of the SQLite database from DATABASE_URL"""
+    from app.database import DATABASE_URL
+
+    if not DATABASE_URL.startswith("sqlite:///"):
+        raise BackupError("Incremental backups are only available for SQLite databases")
+    return Path(DATABASE_URL.replace("sqlite:///", "", 1))
+
+
+def _repo(backup_dir: Optional[Path]) -> Path:
+    return Path(backup_dir or BACKUP_DIR) / "incremental"
+
+
+def _snapshot_dir(backup_dir: Optional[Path]) -> Path:
+    return _repo(backup_dir) / "snapshots"
+
+
+def _chunk_dir(backup_dir: Optional[Path]) -> Path:
+    return _repo(backup_dir) / "chunks"
+
+
+def _dump_dir(backup_dir: Optional[Path]) -> Path:
+    return _repo(backup_dir) / "dumps"
+
+
+def _chunk_path(backup_dir: Optional[Path], digest: str, extension: str) -> Path:
+    return _chunk_dir(backup_dir) / digest[:2] / f"{digest}{extension}"
+
+
+@contextmanager
+def _exclusive(backup_dir: Optional[Path]):
+    """Hold the repository lock, for this process and others (raises BackupError if taken)"""
+    if not _repo_lock.acquire(blocking=False):
+        raise BackupError("A backup is already running")
+    lock_file = None
+    try:
+        if fcntl is not None:
+            repo = _repo(backup_dir)
+            repo.mkdir(parents=True, exist_ok=True)
+            lock_file = open(repo / ".lock", "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise BackupError("A backup is already running in another process")
+        yield
+    finally:
+        if lock_file is not None:
+            lock_file.close()  # Releases the flock
+        _repo_lock.release()
+
+
+def _find_chunk(backup_dir: Optional[Path], digest: str) -> Optional[Path]:
+    for extension in (".zst", ".gz"):
+        path = _chunk_path(backup_dir, digest, extension)
+        if path.exists():
+            return path
+    return None
+
+
+def compress_block(data: bytes, level: int = 10):
+    """(compressed bytes, file extension) - zstd when available, else gzip"""
+    if zstandard:
+        return zstandard.ZstdCompressor(level=level).compress(data), ".zst"
+    return gzip.compress(data, compresslevel=6), ".gz"
+
+
+def decompress_block(path: Path) -> bytes:
+    data = path.read_bytes()
+    if path.suffix == ".raw":
+        return data
+    if path.suffix == ".zst":
+        if not zstandard:
+            raise BackupError("zstandard is required to read this backup (pip install zstandard)")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def store_file(source_path: Path, manifest: dict, backup_dir: Optional[Path] = None) -> dict:
+    """Chunk a consistent database copy into the repository and write its manifest"""
+    blocks = []
+    new_blocks = 0
+    stored_bytes = 0
+    whole = hashlib.sha256()
+
+    with open(source_path, "rb") as f:
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                break
+            whole.update(block)
+            digest = hashlib.sha256(block).hexdigest()
+            blocks.append(digest)
+            if not _find_chunk(backup_dir, digest):
+                compressed, extension = compress_block(block)
+                write_atomic(_chunk_path(backup_dir, digest, extension), compressed)
+                new_blocks += 1
+                stored_bytes += len(compressed)
+
+    manifest.update({
+        "size": source_path.stat().st_size,
+        "block_size": BLOCK_SIZE,
+        "blocks": blocks,
+        "sha256": whole.hexdigest(),
+        "new_blocks": new_blocks,
+        "stored_bytes": stored_bytes,
+    })
+    write_atomic(
+        _snapshot_dir(backup_dir) / f"{manifest['id']}.json",
+        json.dumps(manifest).encode("utf-8")
+    )
+    return manifest
+
+
+def _paced_copy(
+    source_conn,
+    dest_conn,
+    progress: Optional[Callable[[int, int], None]],
+    pages: int,
+    step_sleep: float
+):
+    """sqlite3 online backup in page batches, sleeping between batches"""
+    restarts = 0
+    last_remaining = None
+
+    def on_step(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _CopyRestarted()
+        last_remaining = remaining
+        if progress:
+            progress(total - remaining, total)
+        if remaining and step_sleep:
+            time.sleep(step_sleep)  # Runs between steps, when no read lock is held
+
+    try:
+        with dest_conn:
+            source_conn.backup(dest_conn, pages=pages, progress=on_step)
+    except _CopyRestarted:
+        log.info("Database changed during paced copy; finishing in one step", extra={"restarts": restarts})
+        with dest_conn:
+            source_conn.backup(dest_conn)
+
+
+def create_snapshot(
+    db_path: Optional[Path] = None,
+    backup_dir: Optional[Path] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    pages: int = PAGES_PER_STEP,
+    step_sleep: float = STEP_SLEEP,
+    prune: bool = False
+) -> dict:
+    """
+    Take an incremental snapshot of the SQLite database.
+
+    Args:
+        progress: Optional callback receiving (pages copied, total pages) after each step
+        prune: Also apply the retention policy, without releasing the lock in between
+
+    Returns:
+        The snapshot manifest without the block list (with the apply_retention()
+        result under "retention" if prune)
+    """
+    db_path = Path(db_path or sqlite_db_path())
+    if not db_path.exists():
+        raise BackupError(f"Database not found at {db_path}")
+
+    with _exclusive(backup_dir):
+        summary = _create_snapshot(db_path, backup_dir, progress, pages, step_sleep)
+        if prune:
+            return {**summary, "retention": _apply_retention(backup_dir)}
+        return summary
+
+
+def _create_snapshot(
+    db_path: Path,
+    backup_dir: Optional[Path],
+    progress: Optional[Callable[[int, int], None]],
+    pages: int,
+    step_sleep: float
+) -> dict:
+    now = datetime.now()
+    snapshot_id = now.strftime(SNAPSHOT_ID_FORMAT)
+    if (_snapshot_dir(backup_dir) / f"{snapshot_id}.json").exists():
+        raise BackupError(f"Snapshot {snapshot_id} already exists")
+
+    # Consistent point-in-time copy (safe while the app is writing)
+    tmp_copy = _repo(backup_dir) / f".snapshot_{snapshot_id}.db"
+    tmp_copy.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        source_conn = sqlite3.connect(str(db_path))
+        backup_conn = sqlite3.connect(str(tmp_copy))
+        try:
+            _paced_copy(source_conn, backup_conn, progress, pages, step_sleep)
+        finally:
+            source_conn.close()
+            backup_conn.close()
+
+        manifest = store_file(tmp_copy, {
+            "id": snapshot_id,
+            "created_at": now.isoformat(timespec="seconds"),
+            "source": str(db_path),
+        }, backup_dir)
+    finally:
+        tmp_copy.unlink(missing_ok=True)
+
+    return _summary(manifest)
+
+
+def _summary(manifest: dict) -> dict:
+    return {key: value for key, value in manifest.items() if key != "blocks"}
+
+
+def load_manifest(snapshot_id: str, backup_dir: Optional[Path] = None) -> dict:
+    if not snapshot_id.replace("_", "").isdigit():
+        raise BackupError(f"Invalid snapshot id '{snapshot_id}'")
+    path = _snapshot_dir(backup_dir) / f"{snapshot_id}.json"
+    if not path.exists():
+        raise BackupError(f"Snapshot {snapshot_id} not found")
+    return json.loads(path.read_text())
+
+
+def list_snapshots(backup_dir: Optional[Path] = None) -> List[dict]:
+    """All snapshots, newest first"""
+    snapshot_dir = _snapshot_dir(backup_dir)
+    if not snapshot_dir.exists():
+        return []
+    return [
+        _summary(json.loads(path.read_text()))
+        for path in sorted(snapshot_dir.glob("*.json"), reverse=True)
+    ]
+
+
+def snapshot_at(when: datetime, backup_dir: Optional[Path] = None) -> Optional[str]:
+    """Id of the newest snapshot taken at or before `when` (for point-in-time restore)"""
+    for snapshot in list_snapshots(backup_dir):
+        if datetime.strptime(snapshot["id"], SNAPSHOT_ID_FORMAT) <= when:
+            return snapshot["id"]
+    return None
+
+
+def restore_snapshot(snapshot_id: str, dest_path: Path, backup_dir: Optional[Path] = None) -> dict:
+    """Rebuild a snapshot's database file at dest_path, verifying every checksum"""
+    manifest = load_manifest(snapshot_id, backup_dir)
+    dest_path = Path(dest_path)
+    tmp_path = dest_path.with_name(dest_path.name + ".restoring")
+    whole = hashlib.sha256()
+
+    try:
+        with open(tmp_path, "wb") as out:
+            for digest in manifest["blocks"]:
+                chunk_path = _find_chunk(backup_dir, digest)
+                if not chunk_path:
+                    raise BackupError(f"Missing block {digest}")
+                block = decompress_block(chunk_path)
+                if hashlib.sha256(block).hexdigest() != digest:
+                    raise BackupError(f"Corrupt block {digest}")
+                whole.update(block)
+                out.write(block)
+
+        if whole.hexdigest() != manifest["sha256"]:
+            raise BackupError("Restored database checksum mismatch")
+        os.replace(tmp_path, dest_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    return _summary(manifest)
+
+
+def _pg_dump_url() -> str:
+    """DATABASE_URL in the libpq form pg_dump understands"""
+    from app.database import DATABASE_URL
+
+    return DATABASE_URL.replace("postgresql+psycopg://", "postgresql://", 1)
+
+
+def create_pg_dump(
+    backup_dir: Optional[Path] = None,
+    progress: Optional[Callable[[int], None]] = None,
+    prune: bool = False
+) -> dict:
+    """
+    Stream a logical pg_dump of the Postgres database through zstd (gzip
+    without zstandard) into the repository. pg_dump reads from a single
+    REPEATABLE READ snapshot, so the dump is consistent and never blocks writers.
+
+    Args:
+        progress: Optional callback receiving the number of dump bytes read so far
+        prune: Also apply the retention policy, without releasing the lock in between
+    """
+    if not PG_DUMP:
+        raise BackupError("pg_dump is not installed (set PG_DUMP_PATH)")
+
+    with _exclusive(backup_dir):
+        result = _create_pg_dump(backup_dir, progress)
+        if prune:
+            return {**result, "retention": _apply_retention(backup_dir)}
+        return result
+
+
+def _create_pg_dump(backup_dir: Optional[Path], progress: Optional[Callable[[int], None]]) -> dict:
+    now = datetime.now()
+    dump_id = now.strftime(SNAPSHOT_ID_FORMAT)
+    extension = ".sql.zst" if zstandard else ".sql.gz"
+    dest = _dump_dir(backup_dir) / f"{dump_id}{extension}"
+    if dest.exists():
+        raise BackupError(f"Dump {dump_id} already exists")
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest.with_name(dest.name + ".tmp")
+
+    dumped = 0
+    process = subprocess.Popen(
+        [PG_DUMP, "--no-owner", "--no-privileges", "--format=plain", f"--dbname={_pg_dump_url()}"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    try:
+        with open(tmp_path, "wb") as raw:
+            if zstandard:
+                out = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False)
+            else:
+                out = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+            with out:
+                while True:
+                    data = process.stdout.read(DUMP_READ_BYTES)
+                    if not data:
+                        break
+                    out.write(data)
+                    dumped += len(data)
+                    if progress:
+                        progress(dumped)
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        stderr = process.stderr.read().decode("utf-8", "replace")
+        if process.wait() != 0:
+            raise BackupError(f"pg_dump failed: {stderr.strip()}")
+        os.replace(tmp_path, dest)
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.stderr.close()
+        tmp_path.unlink(missing_ok=True)
+
+    return {
+        "id": dump_id,
+        "created_at": now.isoformat(timespec="seconds"),
+        "filename": dest.name,
+        "size": dumped,
+        "stored_bytes": dest.stat().st_size,
+    }
+
+
+def list_dumps(backup_dir: Optional[Path] = None) -> List[dict]:
+    """All Postgres dumps, newest first"""
+    dump_dir = _dump_dir(backup_dir)
+    if not dump_dir.exists():
+        return []
+    dumps = []
+    for path in sorted(dump_dir.glob("*.sql.*"), reverse=True):
+        if path.suffix == ".tmp":
+            continue
+        dump_id = path.name.split(".")[0]
+        dumps.append({
+            "id": dump_id,
+            "created_at": datetime.strptime(dump_id, SNAPSHOT_ID_FORMAT).isoformat(),
+            "filename": path.name,
+            "stored_bytes": path.stat().st_size,
+        })
+    return dumps
+
+
+def dump_path(filename: str, backup_dir: Optional[Path] = None) -> Path:
+    path = _dump_dir(backup_dir) / filename
+    if "/" in filename or ".." in filename or not path.exists():
+        raise BackupError(f"Dump {filename} not found")
+    return path
+
+
+# Background backup jobs (one at a time), polled or streamed by the admin API
+
+_job_lock = threading.Lock()
+_job = {"state": "idle"}
+
+
+def job_status() -> dict:
+    with _job_lock:
+        return dict(_job)
+
+
+def start_job() -> dict:
+    """Reserve the job slot; raises BackupError if a backup is already running"""
+    with _job_lock:
+        if _job.get("state") in ("queued", "running"):
+            raise BackupError("A backup is already running")
+        _job.clear()
+        _job.update({
+            "id": datetime.now().strftime(SNAPSHOT_ID_FORMAT),
+            "state": "queued",
+            "engine": "postgres" if is_postgres() else "sqlite",
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        })
+        return dict(_job)
+
+
+def _update_job(**fields):
+    with _job_lock:
+        _job.update(fields)
+
+
+def run_job(backup_dir: Optional[Path] = None):
+    """Run the job reserved by start_job() (call from a worker thread/background task)
+
+    The backup and its retention run under one repository lock, so a cron-run
+    backup_database.py can't collect blocks in between.
+    """
+    _update_job(state="running")
+    try:
+        if is_postgres():
+            result = create_pg_dump(backup_dir, progress=lambda dumped: _update_job(bytes_dumped=dumped), prune=True)
+        else:
+            def on_progress(copied, total):
+                _update_job(
+                    pages_copied=copied,
+                    pages_total=total,
+                    percent=round(100 * copied / total, 1) if total else 100.0
+                )
+            result = create_snapshot(backup_dir=backup_dir, progress=on_progress, prune=True)
+        retention = result.pop("retention")
+        _update_job(
+            state="done",
+            percent=100.0,
+            result=result,
+            removed_snapshots=retention["removed_snapshots"],
+            finished_at=datetime.now().isoformat(timespec="seconds"),
+        )
+        log.info("Backup created", extra={"backup_id": result['id'], "stored_bytes": result['stored_bytes']})
+    except Exception as e:
+        _update_job(state="failed", error=str(e), finished_at=datetime.now().isoformat(timespec="seconds"))
+        log.exception("Backup failed")
+
+
+def verify(backup_dir: Optional[Path] = None) -> dict:
+    """Check every block referenced by any snapshot; returns counts and any problems"""
+    problems = []
+    checked = set()
+    snapshots = list_snapshots(backup_dir)
+
+    for snapshot in snapshots:
+        for digest in load_manifest(snapshot["id"], backup_dir)["blocks"]:
+            if digest in checked:
+                continue
+            checked.add(digest)
+            chunk_path = _find_chunk(backup_dir, digest)
+            if not chunk_path:
+                problems.append(f"{snapshot['id']}: missing block {digest}")
+            elif hashlib.sha256(decompress_block(chunk_path)).hexdigest() != digest:
+                problems.append(f"{snapshot['id']}: corrupt block {digest}")
+
+    return {"snapshots": len(snapshots), "blocks": len(checked), "problems": problems}
+
+
+def select_retained(snapshot_ids: List[str], last: int, daily: int, weekly: int, monthly: int) -> set:
+    """Grandfather-father-son: the `last` newest, plus newest snapshot per day/ISO week/month within each window"""
+    snapshot_ids = sorted(snapshot_ids, reverse=True)
+    keep = set(snapshot_ids[:last])
+    buckets = {"daily": {}, "weekly": {}, "monthly": {}}
+
+    for snapshot_id in snapshot_ids:
+        taken = datetime.strptime(snapshot_id, SNAPSHOT_ID_FORMAT)
+        for kind, key, limit in (
+            ("daily", taken.date(), daily),
+            ("weekly", taken.isocalendar()[:2], weekly),
+            ("monthly", (taken.year, taken.month), monthly),
+        ):
+            bucket = buckets[kind]
+            if key not in bucket and len(bucket) < limit:
+                bucket[key] = snapshot_id
+                keep.add(snapshot_id)
+
+    return keep
+
+
+def apply_retention(
+    backup_dir: Optional[Path] = None,
+    last: int = KEEP_LAST,
+    daily: int = KEEP_DAILY,
+    weekly: int = KEEP_WEEKLY,
+    monthly: int = KEEP_MONTHLY
+) -> dict:
+    """Delete snapshots and dumps outside the retention policy, then unreferenced blocks"""
+    with _exclusive(backup_dir):
+        return _apply_retention(backup_dir, last, daily, weekly, monthly)
+
+
+def _apply_retention(
+    backup_dir: Optional[Path],
+    last: int = KEEP_LAST,
+    daily: int = KEEP_DAILY,
+    weekly: int = KEEP_WEEKLY,
+    monthly: int = KEEP_MONTHLY
+) -> dict:
+    snapshot_ids = [snapshot["id"] for snapshot in list_snapshots(backup_dir)]
+    keep = select_retained(snapshot_ids, last, daily, weekly, monthly)
+
+    removed = []
+    for snapshot_id in snapshot_ids:
+        if snapshot_id not in keep:
+            (_snapshot_dir(backup_dir) / f"{snapshot_id}.json").unlink()
+            removed.append(snapshot_id)
+
+    dumps = list_dumps(backup_dir)
+    keep = select_retained([dump["id"] for dump in dumps], last, daily, weekly, monthly)
+    for dump in dumps:
+        if dump["id"] not in keep:
+            (_dump_dir(backup_dir) / dump["filename"]).unlink()
+            removed.append(dump["id"])
+
+    return {"removed_snapshots": removed, "removed_blocks": _collect_garbage(backup_dir)}
+
+
+def collect_garbage(backup_dir: Optional[Path] = None) -> int:
+    """Delete blocks not referenced by any remaining snapshot"""
+    with _exclusive(backup_dir):
+        return _collect_garbage(backup_dir)
+
+
+def _collect_garbage(backup_dir: Optional[Path]) -> int:
+    referenced = set()
+    for snapshot in list_snapshots(backup_dir):
+        referenced.update(load_manifest(snapshot["id"], backup_dir)["blocks"])
+
+    removed = 0
+    chunk_dir = _chunk_dir(backup_dir)
+    if chunk_dir.exists():
+        for path in chunk_dir.glob("*/*"):
+            if path.suffix == ".tmp":  # A block being written (write_atomic)
+                continue
+            if path.name.split(".")[0] not in referenced:
+                path.unlink()
+                removed += 1
+    return removed
@@ -0,0 +1,140 @@
+"""
+In-memory cache of serialized GET responses for read-mostly family content.
+
+Each cached route names the topics its output depends on (e.g. an album
+listing depends on "albums" and "photos"). Write endpoints call
+`bump("photos")` etc. after committing; every entry remembers the topic
+versions it was built from and is ignored once any of them has moved on, so
+a write is visible on the very next read.
+
+Entries are keyed by path and query string, hold the JSON body and a weak
+ETag, and are evicted least-recently-used once RESPONSE_CACHE_MB is used.
+A repeat load is answered from memory (or with 304 when the browser sends
+If-None-Match) without querying the content tables.
+
+Versions live in this process, which matches the single uvicorn worker this
+app is deployed with; with several workers each keeps its own cache and a
+write only invalidates the worker that handled it.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.serialize import dumps
+
+RESPONSE_CACHE_MB = float(os.getenv("RESPONSE_CACHE_MB", "32"))
+
+TOPICS = ("albums", "background", "photos", "vignettes")
+
+_lock = threading.Lock()
+_versions = {topic: 0 for topic in TOPICS}
+
+
+def bump(*topics: str):
+    """Invalidate cached responses that depend on any of the topics"""
+    with _lock:
+        for topic in topics:
+            _versions[topic] += 1
+
+
+def bump_all():
+    bump(*TOPICS)
+
+
+def _current(topics: Iterable[str]) -> tuple:
+    with _lock:
+        return tuple(_versions[topic] for topic in topics)
+
+
+class _Entry:
+    __slots__ = ("versions", "body", "etag", "size")
+
+    def __init__(self, versions, body, etag):
+        self.versions = versions
+        self.body = body
+        self.etag = etag
+        self.size = len(body) + len(etag) + 200  # Rough per-entry overhead
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str, versions: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.versions != versions:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, key: str, entry: _Entry):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            if entry.size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                _key, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = ResponseCache(int(RESPONSE_CACHE_MB * 1024 * 1024))
+
+
+def _key(request: Request) -> str:
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
+
+
+def _response(request: Request, entry: _Entry, status: str) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache", "X-Cache": status}
+    if_none_match = request.headers.get("if-none-match", "")
+    if entry.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def cached(request: Request, topics: Iterable[str], build: Callable):
+    """Serve the request from the cache, or call build() and cache its output.
+
+    build returns JSON-serializable content or a Response (its body is
+    cached as is). Versions are read before build runs, so a write that
+    lands while it runs leaves the new entry already stale.
+    """
+    topics = tuple(topics)
+    key = _key(request)
+    versions = _current(topics)
+    entry = response_cache.get(key, versions)
+    if entry is not None:
+        return _response(request, entry, "HIT")
+
+    content = build()
+    body = content.body if isinstance(content, Response) else dumps(content)
+    entry = _Entry(versions, body, f'W/"{hashlib.sha1(body).hexdigest()}"')
+    response_cache.put(key, entry)
+    return _response(request, entry, "MISS")
@@ -0,0 +1,167 @@
+"""
+Change log for delta sync (GET /api/changes).
+
+A flush hook on SessionLocal records every insert, update and delete of the
+tracked models into change_log, in the same transaction as the change itself.
+Association rows count as a change to their parent: adding a photo to an
+album is an album upsert, new photo metadata a photo upsert.
+
+Clients keep the last cursor they saw and ask for everything after it. Within
+a page the log is compacted to the latest operation per entity, so a photo
+edited ten times is sent once. Committed changes are also pushed to live
+clients through app/events.py.
+
+The cursor only works if log ids become visible in id order. SQLite allows
+one writer at a time, so they do. Postgres assigns ids at insert time, and
+two concurrent transactions can commit them out of order: a client polling
+between the two commits would move its cursor past the lower id and never
+see that change. On Postgres every writing session therefore takes a
+transaction-level advisory lock before its first write (so writers never
+wait on each other's row locks while holding it), which serializes writers
+the way SQLite does.
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import event, func, insert, text
+from sqlalchemy.orm import Session
+
+from app import events, models
+from app.database import SessionLocal
+
+CHANGE_LOG_DAYS = int(os.getenv("CHANGE_LOG_DAYS", "90"))
+CHANGE_LOG_LOCK = 0x63686C67  # Postgres advisory lock key ("chlg")
+
+TRACKED = {
+    models.Photo: "photos",
+    models.Album: "albums",
+    models.Vignette: "vignettes",
+    models.AudioRecording: "audio",
+    models.File: "files",
+}
+
+# Rows whose changes show up in their parent's representation
+PARENTS = {
+    models.AlbumPhoto: ("albums", "album_id"),
+    models.VignettePhoto: ("vignettes", "vignette_id"),
+    models.PhotoMetadata: ("photos", "photo_id"),
+}
+
+
+class CursorExpired(Exception):
+    """The cursor is older than the retained log; the client must reload everything"""
+
+
+def _serialize_writers(session: Session, flush_context, instances):
+    """Postgres: hold the writer lock until commit, so change ids commit in order"""
+    if session.info.get("writer_locked") or not (session.new or session.dirty or session.deleted):
+        return
+    if session.get_bind().dialect.name == "postgresql":
+        session.connection().execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHANGE_LOG_LOCK})
+        session.info["writer_locked"] = True
+
+
+def _record_changes(session: Session, flush_context):
+    ops: Dict[tuple, str] = {}
+
+    def note(entity, entity_id, op):
+        if entity_id is None:
+            return
+        # A delete sticks even if the same flush also touched the row
+        if ops.get((entity, entity_id)) != "delete":
+            ops[(entity, entity_id)] = op
+
+    for obj in list(session.new) + [o for o in session.dirty if session.is_modified(o, include_collections=False)]:
+        if type(obj) in TRACKED:
+            note(TRACKED[type(obj)], obj.id, "upsert")
+        elif type(obj) in PARENTS:
+            entity, column = PARENTS[type(obj)]
+            note(entity, getattr(obj, column), "upsert")
+
+    for obj in session.deleted:
+        if type(obj) in TRACKED:
+            note(TRACKED[type(obj)], obj.id, "delete")
+        elif type(obj) in PARENTS:
+            entity, column = PARENTS[type(obj)]
+            note(entity, getattr(obj, column), "upsert")
+
+    if ops:
+        result = session.connection().execute(
+            insert(models.ChangeLog).returning(
+                models.ChangeLog.id, models.ChangeLog.entity, models.ChangeLog.entity_id, models.ChangeLog.op
+            ),
+            [
+                {"entity": entity, "entity_id": entity_id, "op": op}
+                for (entity, entity_id), op in ops.items()
+            ]
+        )
+        # Announced to live clients once the transaction commits
+        session.info.setdefault("pending_changes", []).extend(
+            {"entity": entity, "id": entity_id, "op": op, "cursor": cursor}
+            for cursor, entity, entity_id, op in result
+        )
+
+
+def _publish_changes(session: Session):
+    session.info.pop("writer_locked", None)
+    pending = session.info.pop("pending_changes", None)
+    if pending:
+        events.broker.publish(pending)
+
+
+def _discard_changes(session: Session):
+    session.info.pop("writer_locked", None)
+    session.info.pop("pending_changes", None)
+
+
+event.listen(SessionLocal, "before_flush", _serialize_writers)
+event.listen(SessionLocal, "after_flush", _record_changes)
+event.listen(SessionLocal, "after_commit", _publish_changes)
+event.listen(SessionLocal, "after_rollback", _discard_changes)
+
+
+def latest_cursor(db: Session) -> int:
+    return db.query(func.max(models.ChangeLog.id)).scalar() or 0
+
+
+def read_changes(db: Session, since: int, limit: int):
+    """Compacted changes after the cursor.
+
+    Returns (cursor, has_more, {entity: {"upserts": [ids], "deletes": [ids]}}).
+    """
+    oldest = db.query(func.min(models.ChangeLog.id)).scalar()
+    if oldest is not None and since < oldest - 1:
+        raise CursorExpired()
+
+    rows = db.query(models.ChangeLog.id, models.ChangeLog.entity, models.ChangeLog.entity_id, models.ChangeLog.op).filter(
+        models.ChangeLog.id > since
+    ).order_by(models.ChangeLog.id).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest: Dict[tuple, str] = {}
+    for _id, entity, entity_id, op in rows:
+        latest[(entity, entity_id)] = op
+
+    changes: Dict[str, Dict[str, list]] = {}
+    for (entity, entity_id), op in latest.items():
+        bucket = changes.setdefault(entity, {"upserts": [], "deletes": []})
+        bucket["upserts" if op == "upsert" else "deletes"].append(entity_id)
+
+    cursor = rows[-1][0] if rows else since
+    return cursor, has_more, changes
+
+
+def prune(db: Session, days: Optional[int] = None) -> int:
+    """Delete log rows older than CHANGE_LOG_DAYS, always keeping the newest row"""
+    cutoff = datetime.now() - timedelta(days=days if days is not None else CHANGE_LOG_DAYS)
+    newest = latest_cursor(db)
+    removed = db.query(models.ChangeLog).filter(
+        models.ChangeLog.created_at < cutoff,
+        models.ChangeLog.id < newest
+    ).delete(synchronize_session=False)
+    db.commit()
+    return removed
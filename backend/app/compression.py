@@ -0,0 +1,195 @@
+"""
+Response compression for the API (JSON lists, CSV, text).
+
+Negotiates zstd, Brotli or gzip from Accept-Encoding, in that order of
+preference (zstd and Brotli only when their packages are installed). Bodies
+below COMPRESS_MIN_SIZE, responses that are already encoded (precompressed
+frontend assets) and media types outside the allowlist (images, audio, ZIP
+exports...) pass through untouched. Streaming responses are compressed chunk
+by chunk with a flush after each one, so clients still receive data as it is
+produced.
+"""
+
+import os
+import zlib
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.static import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+# Bodies larger than this are compressed in a worker thread instead of the event loop
+COMPRESS_THREAD_SIZE = 256 * 1024
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+# Never compressed, even if listed above: must reach the client unbuffered
+SKIP_TYPES = ("text/event-stream",)
+
+
+class _Gzip:
+    def __init__(self):
+        self._c = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=5)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+class _Zstd:
+    def __init__(self):
+        self._c = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._c.compress(data) + self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+def _compressors():
+    available = []
+    if zstandard is not None:
+        available.append(("zstd", _Zstd))
+    if brotli is not None:
+        available.append(("br", _Brotli))
+    available.append(("gzip", _Gzip))
+    return available
+
+
+COMPRESSORS = _compressors()
+
+
+def compress(compressor_class, body: bytes) -> bytes:
+    compressor = compressor_class()
+    return compressor.chunk(body) + compressor.finish()
+
+
+def _is_compressible(content_type: str) -> bool:
+    content_type = content_type.split(";")[0].strip().lower()
+    if not content_type or content_type in SKIP_TYPES:
+        return False
+    return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope))
+        choice = next(((name, cls) for name, cls in COMPRESSORS if name in accepted), None)
+        if choice is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(self.app, choice, self.minimum_size)
+        await responder(scope, receive, send)
+
+
+class _CompressingResponder:
+    def __init__(self, app, choice, minimum_size: int):
+        self.app = app
+        self.encoding, self.compressor_class = choice
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        self.active = None  # None until the first body chunk decides
+        self.compressor = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        self.head = scope["method"] == "HEAD"
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self.start_message = message
+            self.active = (
+                message["status"] == 200
+                and not self.head
+                and "content-encoding" not in headers
+                and _is_compressible(headers.get("content-type", ""))
+                and not (headers.get("content-length", "").isdigit() and int(headers["content-length"]) < self.minimum_size)
+            )
+            if not self.active:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or not self.active:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        headers = MutableHeaders(raw=self.start_message["headers"])
+
+        if self.compressor is None and not more_body:
+            # Whole body in one message: compress it in one go, if worthwhile
+            self.active = False
+            if len(body) < self.minimum_size:
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            if len(body) > COMPRESS_THREAD_SIZE:
+                compressed = await anyio.to_thread.run_sync(compress, self.compressor_class, body)
+            else:
+                compressed = compress(self.compressor_class, body)
+            if len(compressed) < len(body):
+                headers["Content-Encoding"] = self.encoding
+                headers["Content-Length"] = str(len(compressed))
+                body = compressed
+            headers.add_vary_header("Accept-Encoding")
+            await self.send(self.start_message)
+            await self.send({"type": "http.response.body", "body": body})
+            return
+
+        if self.compressor is None:
+            # Streaming: compress and flush chunk by chunk
+            self.compressor = self.compressor_class()
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            await self.send(self.start_message)
+
+        data = self.compressor.chunk(body) if body else b""
+        if not more_body:
+            data += self.compressor.finish()
+        if data or not more_body:
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -1,13 +1,38 @@
 """
 Email utility for sending invite codes and notifications.
 Supports Gmail SMTP for easy setup.
+
+Messages are queued and sent by background worker threads over a small pool
+of persistent SMTP connections, so a request never waits on the STARTTLS and
+login handshake. A batch (e.g. a bulk invite) is sent on a single connection.
+Temporary failures are retried with exponential backoff.
+
+EMAIL_BACKEND=capture keeps sent messages in memory (see `outbox`) instead of
+talking to an SMTP server, for tests and local development.
 """
 
-import smtplib
 import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional
+from typing import List, Optional, Tuple
+
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "2"))
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", "4"))
+EMAIL_RETRY_DELAY = float(os.getenv("EMAIL_RETRY_DELAY", "5"))  # Seconds; doubles per attempt
+EMAIL_IDLE_TIMEOUT = float(os.getenv("EMAIL_IDLE_TIMEOUT", "60"))  # Close pooled connections idle this long
+EMAIL_TIMEOUT = float(os.getenv("EMAIL_TIMEOUT", "30"))
 
 
 def get_email_config():
@@ -25,6 +50,8 @@ def get_email_config():
 
 def is_email_configured():
     """Check if email is properly configured"""
+    if _backend_name() == "capture":
+        return True
     config = get_email_config()
     return all([
         config['smtp_user'],
@@ -33,9 +60,9 @@ def is_email_configured():
     ])
 
 
-def send_invite_email(to_email: str, invite_code: str, recipient_name: Optional[str] = None) -> bool:
+def build_invite_message(to_email: str, invite_code: str, recipient_name: Optional[str] = None) -> MIMEMultipart:
     """
-    Send an invite code email to a user.
+    Build the invite code email for a user.
 
     Args:
         to_email: Recipient email address
@@ -43,13 +70,9 @@ def send_invite_email(to_email: str, invite_code: str, recipient_name: Optional[
         recipient_name: Optional recipient name for personalization
 
     Returns:
-        True if email sent successfully, False otherwise
+        The message, ready for the email backend
     """
 
-    if not is_email_configured():
-        print("[EMAIL] Email not configured. Skipping send.")
-        return False
-
     config = get_email_config()
 
     # Create greeting
@@ -196,32 +219,295 @@ def send_invite_email(to_email: str, invite_code: str, recipient_name: Optional[
     This is an automated email from our Family Tree website.
     """
 
-    try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = f"{config['from_name']} <{config['from_email']}>"
-        msg['To'] = to_email
-
-        # Attach both plain text and HTML versions
-        part1 = MIMEText(text_body, 'plain')
-        part2 = MIMEText(html_body, 'html')
-        msg.attach(part1)
-        msg.attach(part2)
-
-        # Send email
-        print(f"[EMAIL] Connecting to {config['smtp_host']}:{config['smtp_port']}")
-        with smtplib.SMTP(config['smtp_host'], config['smtp_port']) as server:
+    # Create message
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = f"{config['from_name']} <{config['from_email']}>"
+    msg['To'] = to_email
+
+    # Attach both plain text and HTML versions
+    part1 = MIMEText(text_body, 'plain')
+    part2 = MIMEText(html_body, 'html')
+    msg.attach(part1)
+    msg.attach(part2)
+    return msg
+
+
+
+def _backend_name():
+    return os.getenv("EMAIL_BACKEND", "smtp").lower()
+
+
+class _SMTPPool:
+    """Persistent, authenticated SMTP connections shared by the send workers"""
+
+    def __init__(self, size: int):
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        config = get_email_config()
+        log.debug("Connecting to SMTP server", extra={"host": config['smtp_host'], "port": config['smtp_port']})
+        server = smtplib.SMTP(config['smtp_host'], config['smtp_port'], timeout=EMAIL_TIMEOUT)
+        try:
             server.starttls()
             server.login(config['smtp_user'], config['smtp_password'])
-            server.send_message(msg)
+        except Exception:
+            _quit(server)
+            raise
+        return server
+
+    @contextmanager
+    def connection(self):
+        """Borrow a logged-in connection; it is dropped instead of returned if the block raises"""
+        self._slots.acquire()
+        server = None
+        try:
+            with self._lock:
+                while self._idle and server is None:
+                    candidate, last_used = self._idle.pop()
+                    if time.monotonic() - last_used < EMAIL_IDLE_TIMEOUT:
+                        server = candidate
+                    else:
+                        _quit(candidate)
+            if server is None:
+                server = self._connect()
+            try:
+                yield server
+            except Exception:
+                _quit(server)
+                server = None
+                raise
+            finally:
+                if server is not None:
+                    with self._lock:
+                        self._idle.append((server, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _last_used in idle:
+            _quit(server)
+
+
+def _quit(server: smtplib.SMTP):
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx replies (bad recipient, rejected content) won't succeed on retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _msg in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+class SMTPBackend:
+    """Sends over pooled connections; one connection per batch"""
+
+    def __init__(self):
+        self.pool = _SMTPPool(EMAIL_POOL_SIZE)
+
+    def send_messages(self, messages: List[MIMEMultipart]) -> Tuple[list, list]:
+        """Send messages in order on one connection.
+
+        Returns (failed, retry): messages that failed permanently, and the
+        message that hit a temporary error plus everything not yet sent.
+        """
+        failed = []
+        sent = 0
+        try:
+            with self.pool.connection() as server:
+                for msg in messages:
+                    try:
+                        server.send_message(msg)
+                    except Exception as e:
+                        if not _is_permanent(e):
+                            raise
+                        log.warning("Email rejected", extra={"to": msg['To'], "error": str(e)})
+                        failed.append(msg)
+                    sent += 1
+        except Exception as e:
+            if sent == len(messages):
+                return failed, []
+            log.warning("Temporary failure sending email", extra={"to": messages[sent]['To'], "error": str(e)})
+            return failed, messages[sent:]
+        return failed, []
+
+    def close(self):
+        self.pool.close_all()
+
+
+class CaptureBackend:
+    """Keeps messages in `outbox` instead of sending them"""
+
+    def __init__(self):
+        self.outbox: List[MIMEMultipart] = []
+
+    def send_messages(self, messages: List[MIMEMultipart]) -> Tuple[list, list]:
+        self.outbox.extend(messages)
+        return [], []
+
+    def close(self):
+        pass
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The configured backend (EMAIL_BACKEND=smtp|capture), created on first use"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = CaptureBackend() if _backend_name() == "capture" else SMTPBackend()
+        return _backend
+
+
+def outbox() -> List[MIMEMultipart]:
+    """Messages captured by EMAIL_BACKEND=capture"""
+    backend = get_backend()
+    return backend.outbox if isinstance(backend, CaptureBackend) else []
+
+
+class EmailDispatcher:
+    """Background send queue: worker threads send batches, retrying with backoff"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._queue: "queue.Queue" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._pending_retries = 0
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "retried": 0}
+
+    def _start(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._work, name=f"email-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, messages: List[MIMEMultipart]):
+        """Queue messages; each chunk of EMAIL_BATCH_SIZE goes out on one connection"""
+        if not messages:
+            return
+        self._start()
+        with self._lock:
+            self.stats["queued"] += len(messages)
+        for i in range(0, len(messages), EMAIL_BATCH_SIZE):
+            self._queue.put((messages[i:i + EMAIL_BATCH_SIZE], 0))
+
+    def _retry_later(self, messages, attempt):
+        delay = EMAIL_RETRY_DELAY * (2 ** attempt) * random.uniform(0.8, 1.2)
+
+        def requeue():
+            self._queue.put((messages, attempt + 1))
+            with self._lock:
+                self._pending_retries -= 1
+
+        with self._lock:
+            self._pending_retries += 1
+            self.stats["retried"] += len(messages)
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        timer.start()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            messages, attempt = job
+            try:
+                failed, retry = get_backend().send_messages(messages)
+            except Exception:
+                log.exception("Email send worker error")
+                failed, retry = [], messages
+            if retry and attempt >= EMAIL_MAX_RETRIES:
+                log.error("Giving up on emails", extra={"count": len(retry), "attempts": attempt + 1})
+                failed, retry = failed + retry, []
+            with self._lock:
+                self.stats["sent"] += len(messages) - len(failed) - len(retry)
+                self.stats["failed"] += len(failed)
+            if retry:
+                self._retry_later(retry, attempt)
+            self._queue.task_done()
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._queue.qsize() + self._pending_retries
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the queue is empty (scheduled retries included). Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._queue.unfinished_tasks == 0 and self.pending() == 0:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def shutdown(self, timeout: float = 10):
+        """Send what is queued (up to timeout), then stop the workers and close connections"""
+        self.flush(timeout)
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout=1)
+        if _backend is not None:
+            _backend.close()
+
+
+dispatcher = EmailDispatcher(EMAIL_WORKERS)
+
+
+def queue_invite_email(to_email: str, invite_code: str, recipient_name: Optional[str] = None) -> bool:
+    """Queue an invite email for background sending. Returns False if email isn't configured."""
+    return queue_invite_emails([(to_email, invite_code, recipient_name)]) == 1
+
+
+def queue_invite_emails(invites: List[Tuple[str, str, Optional[str]]]) -> int:
+    """Queue invite emails (to_email, invite_code, recipient_name) as one batch; returns how many were queued"""
+    if not is_email_configured():
+        log.info("Email not configured, skipping send")
+        return 0
+    messages = [build_invite_message(*invite) for invite in invites]
+    dispatcher.enqueue(messages)
+    log.info("Invite emails queued", extra={"count": len(messages)})
+    return len(messages)
 
-        print(f"[EMAIL] Successfully sent invite to {to_email}")
-        return True
 
-    except Exception as e:
-        print(f"[EMAIL] Failed to send email to {to_email}: {str(e)}")
+def send_invite_email(to_email: str, invite_code: str, recipient_name: Optional[str] = None) -> bool:
+    """
+    Send an invite code email now, without the queue or retries.
+
+    Returns:
+        True if email sent successfully, False otherwise
+    """
+
+    if not is_email_configured():
+        log.info("Email not configured, skipping send")
+        return False
+
+    msg = build_invite_message(to_email, invite_code, recipient_name)
+    failed, retry = get_backend().send_messages([msg])
+    if failed or retry:
         return False
+    log.info("Invite email sent", extra={"to": to_email})
+    return True
 
 
 def test_email_config():
@@ -0,0 +1,153 @@
+"""
+Live change notifications over server-sent events (GET /api/events).
+
+The change log hook (app/changes.py) publishes {"entity", "id", "op",
+"cursor"} for every committed change. Notifications are deliberately small:
+clients react by pulling /api/changes?since=<their cursor>, which stays the
+source of truth, so a dropped notification never loses data.
+
+Publishing goes through a bus. LocalBus fans out to the subscribers in this
+process and stands in for a shared pub/sub (e.g. Redis) when the app runs
+with several workers: anything with the same publish/subscribe methods can
+replace it.
+
+Every connection has a bounded queue (SSE_QUEUE_SIZE events, SSE_QUEUE_BYTES
+bytes). A client that can't keep up has its backlog dropped and is sent a
+single "resync" event instead, telling it to catch up from the change feed.
+A comment line goes out every SSE_HEARTBEAT seconds to keep proxies from
+closing idle connections.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from typing import Callable, List
+
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "256"))
+SSE_QUEUE_BYTES = int(os.getenv("SSE_QUEUE_BYTES", str(64 * 1024)))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+SSE_MAX_CONNECTIONS = int(os.getenv("SSE_MAX_CONNECTIONS", "200"))
+
+
+class LocalBus:
+    """In-process pub/sub: publish() calls every subscribed callback"""
+
+    def __init__(self):
+        self._subscribers: List[Callable] = []
+        self._lock = threading.Lock()
+
+    def publish(self, messages: List[dict]):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(messages)
+
+    def subscribe(self, callback: Callable):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+
+class Subscription:
+    """One SSE connection's bounded queue, fed from any thread"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.pending: List[str] = []
+        self.pending_bytes = 0
+        self.overflowed = False
+        self.wakeup = asyncio.Event()
+        self.dropped = 0
+
+    def offer(self, frames: List[str]):
+        """Runs on the event loop"""
+        for frame in frames:
+            if self.overflowed:
+                self.dropped += 1
+                continue
+            if len(self.pending) >= SSE_QUEUE_SIZE or self.pending_bytes + len(frame) > SSE_QUEUE_BYTES:
+                # Too far behind: drop the backlog, the client resyncs from the change feed
+                self.dropped += len(self.pending) + 1
+                self.pending.clear()
+                self.pending_bytes = 0
+                self.overflowed = True
+            else:
+                self.pending.append(frame)
+                self.pending_bytes += len(frame)
+        self.wakeup.set()
+
+    def take(self) -> List[str]:
+        frames = self.pending
+        if self.overflowed:
+            frames = ['event: resync\ndata: {}\n\n']
+            self.overflowed = False
+        self.pending = []
+        self.pending_bytes = 0
+        self.wakeup.clear()
+        return frames
+
+
+class Broker:
+    """Fans bus messages out to the SSE connections of this process"""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self._subscriptions: List[Subscription] = []
+        self._lock = threading.Lock()
+        self.bus.subscribe(self._deliver)
+
+    def publish(self, messages: List[dict]):
+        if messages:
+            self.bus.publish(messages)
+
+    def _deliver(self, messages: List[dict]):
+        frames = [
+            f"id: {message['cursor']}\nevent: change\ndata: {json.dumps(message, separators=(',', ':'))}\n\n"
+            for message in messages
+        ]
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, frames)
+            except RuntimeError:  # Loop already closed
+                pass
+
+    def connect(self) -> Subscription:
+        with self._lock:
+            if len(self._subscriptions) >= SSE_MAX_CONNECTIONS:
+                raise OverflowError("Too many live update connections")
+            subscription = Subscription(asyncio.get_running_loop())
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def disconnect(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def connection_count(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
+
+    async def stream(self, subscription: Subscription, cursor: int):
+        """SSE frames for one connection until the client goes away"""
+        try:
+            yield f"retry: 5000\nevent: hello\ndata: {json.dumps({'cursor': cursor})}\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(subscription.wakeup.wait(), timeout=SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield "".join(subscription.take())
+        finally:
+            self.disconnect(subscription)
+
+
+broker = Broker(LocalBus())
@@ -0,0 +1,424 @@
+"""
+Streaming ZIP/TAR export of the family archive, an album or a vignette.
+
+The archive is laid out up front from the database and storage sizes, then
+streamed straight from storage without ever being built on disk or in
+memory: files are read in PART_SIZE pieces, and for cloud storage up to
+FETCH_WORKERS pieces are fetched concurrently (ranged GETs) ahead of the
+writer, so at most a few MB are buffered per download.
+
+    manifest.json                 metadata for everything below
+    photos/<id>_<filename>
+    audio/<id>_<filename>
+    files/<id>_<filename>
+    vignettes/<id>_<title>.txt
+
+TAR exports have a fixed byte layout (no checksums over file contents), so
+they report Content-Length and serve Range requests - an interrupted
+download resumes where it stopped. ZIP exports are streamed with data
+descriptors (ZIP64 when needed) and always start from the beginning.
+"""
+
+import io
+import json
+import os
+import re
+import tarfile
+import hashlib
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from sqlalchemy.orm import Session, selectinload
+
+from app import models, storage
+
+PART_SIZE = int(os.getenv("EXPORT_PART_SIZE", str(1024 * 1024)))
+FETCH_WORKERS = int(os.getenv("EXPORT_FETCH_WORKERS", "4"))
+
+FORMATS = {
+    "zip": "application/zip",
+    "tar": "application/x-tar",
+}
+
+BLOCK = tarfile.BLOCKSIZE
+ZIP_EARLIEST = (1980, 1, 1, 0, 0, 0)  # ZIP timestamps (DOS dates) start in 1980
+
+
+class ExportEntry:
+    """One archive member: generated bytes or a stored file"""
+
+    def __init__(self, name: str, size: int, mtime: float, data: Optional[bytes] = None,
+                 file_path: Optional[str] = None):
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.data = data
+        self.file_path = file_path
+
+
+def safe_name(value: str, fallback: str) -> str:
+    value = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', "_", value or "").strip(" .")
+    return value[:120] or fallback
+
+
+def _timestamp(value) -> float:
+    return value.timestamp() if value else 0.0
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+class _SizeLookup:
+    """File sizes, with one bucket listing per folder instead of a HEAD per object"""
+
+    def __init__(self):
+        self._cloud = {}
+        self._listed = set()
+
+    def __call__(self, file_path: str) -> Optional[int]:
+        if storage.is_cloud_path(file_path):
+            key = storage.object_key(file_path)
+            folder = key.rsplit("/", 1)[0] + "/" if "/" in key else ""
+            if folder not in self._listed:
+                for obj in storage.list_cloud_objects(folder):
+                    self._cloud[obj["key"]] = obj["size"]
+                self._listed.add(folder)
+            return self._cloud.get(key)
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return None
+
+
+class ArchivePlan:
+    """Everything needed to stream an export: its members and manifest"""
+
+    def __init__(self, scope: str):
+        self.scope = scope
+        self.entries: List[ExportEntry] = []
+        self.manifest = {
+            "scope": scope,
+            "albums": [],
+            "vignettes": [],
+            "photos": [],
+            "audio": [],
+            "files": [],
+            "missing": [],
+        }
+        self._sizes = _SizeLookup()
+        self._seen = set()
+        self._photo_ids = set()
+        self._latest_mtime = 0.0
+
+    def _append(self, entry: ExportEntry):
+        self.entries.append(entry)
+        self._latest_mtime = max(self._latest_mtime, entry.mtime)
+
+    def _add_file(self, kind: str, item_id: int, filename: str, file_path: str, created_at) -> Optional[str]:
+        """Add a stored file once; returns its archive name, or None if it's missing from storage"""
+        name = f"{kind}/{item_id}_{safe_name(filename, 'file')}"
+        if name in self._seen:
+            return name
+        size = self._sizes(file_path)
+        if size is None:
+            self.manifest["missing"].append({"type": kind, "id": item_id, "file_path": file_path})
+            return None
+        self._seen.add(name)
+        self._append(ExportEntry(name, size, _timestamp(created_at), file_path=file_path))
+        return name
+
+    def add_photo(self, photo: models.Photo):
+        if photo.id in self._photo_ids:
+            return
+        self._photo_ids.add(photo.id)
+        name = self._add_file("photos", photo.id, photo.filename, photo.file_path, photo.created_at)
+        meta = photo.photo_metadata
+        self.manifest["photos"].append({
+            "id": photo.id,
+            "path": name,
+            "title": photo.title,
+            "description": photo.description,
+            "taken_at": _iso(photo.taken_at),
+            "created_at": _iso(photo.created_at),
+            "uploaded_by": photo.uploaded_by_user.username if photo.uploaded_by_user else None,
+            "people": [tag.person.name for tag in photo.people_tags if tag.person],
+            "metadata": {
+                "width": meta.width,
+                "height": meta.height,
+                "camera_make": meta.camera_make,
+                "camera_model": meta.camera_model,
+                "gps_latitude": meta.gps_latitude,
+                "gps_longitude": meta.gps_longitude,
+            } if meta else None,
+        })
+
+    def add_album(self, db: Session, album: models.Album):
+        photos = db.query(models.Photo).join(
+            models.AlbumPhoto, models.AlbumPhoto.photo_id == models.Photo.id
+        ).options(*_PHOTO_OPTIONS).filter(models.AlbumPhoto.album_id == album.id).order_by(
+            models.Photo.sort_order, models.Photo.id
+        ).all()
+        for photo in photos:
+            self.add_photo(photo)
+        self.manifest["albums"].append({
+            "id": album.id,
+            "name": album.name,
+            "description": album.description,
+            "created_at": _iso(album.created_at),
+            "photo_ids": [photo.id for photo in photos],
+        })
+
+    def add_vignette(self, db: Session, vignette: models.Vignette):
+        links = db.query(models.VignettePhoto).options(
+            selectinload(models.VignettePhoto.photo).options(*_PHOTO_OPTIONS)
+        ).filter(
+            models.VignettePhoto.vignette_id == vignette.id
+        ).order_by(models.VignettePhoto.position).all()
+        for link in links:
+            if link.photo:
+                self.add_photo(link.photo)
+
+        name = f"vignettes/{vignette.id}_{safe_name(vignette.title, 'vignette')}.txt"
+        text = f"{vignette.title}\n\n{vignette.content or ''}\n".encode("utf-8")
+        self._append(ExportEntry(name, len(text), _timestamp(vignette.updated_at or vignette.created_at), data=text))
+        self.manifest["vignettes"].append({
+            "id": vignette.id,
+            "title": vignette.title,
+            "path": name,
+            "author": vignette.author.username if vignette.author else None,
+            "created_at": _iso(vignette.created_at),
+            "updated_at": _iso(vignette.updated_at),
+            "photo_ids": [link.photo_id for link in links],
+        })
+
+    def add_audio(self, audio: models.AudioRecording):
+        name = self._add_file("audio", audio.id, audio.filename, audio.file_path, audio.created_at)
+        self.manifest["audio"].append({
+            "id": audio.id,
+            "path": name,
+            "title": audio.title,
+            "description": audio.description,
+            "duration_seconds": audio.duration_seconds,
+            "author": audio.author.username if audio.author else None,
+            "created_at": _iso(audio.created_at),
+        })
+
+    def add_file(self, file: models.File):
+        name = self._add_file("files", file.id, file.filename, file.file_path, file.created_at)
+        self.manifest["files"].append({
+            "id": file.id,
+            "path": name,
+            "title": file.title,
+            "description": file.description,
+            "file_type": file.file_type,
+            "source": file.source,
+            "created_at": _iso(file.created_at),
+        })
+
+    def finalize(self) -> "ArchivePlan":
+        """Put manifest.json first so it's available before the media in a partial download"""
+        data = json.dumps(self.manifest, indent=2).encode("utf-8")
+        # No export timestamp anywhere, so an unchanged archive is byte-identical
+        # across requests and a resumed download can continue from a new request
+        self.entries.insert(0, ExportEntry("manifest.json", len(data), self._latest_mtime, data=data))
+        return self
+
+    @property
+    def etag(self) -> str:
+        """Identifies this exact byte layout (for If-Range on resumed downloads)"""
+        digest = hashlib.sha256()
+        for entry in self.entries[1:]:
+            digest.update(f"{entry.name}\0{entry.size}\0{int(entry.mtime)}\n".encode("utf-8"))
+        digest.update(self.entries[0].data if self.entries else b"")
+        return f'"{digest.hexdigest()[:32]}"'
+
+
+_PHOTO_OPTIONS = (
+    selectinload(models.Photo.uploaded_by_user),
+    selectinload(models.Photo.photo_metadata),
+    selectinload(models.Photo.people_tags).selectinload(models.PhotoPerson.person),
+)
+
+
+def plan_full(db: Session) -> ArchivePlan:
+    plan = ArchivePlan("full")
+    for album in db.query(models.Album).order_by(models.Album.sort_order, models.Album.id).all():
+        plan.add_album(db, album)
+    for vignette in db.query(models.Vignette).order_by(models.Vignette.sort_order, models.Vignette.id).all():
+        plan.add_vignette(db, vignette)
+    for photo in db.query(models.Photo).options(*_PHOTO_OPTIONS).order_by(models.Photo.id).all():
+        plan.add_photo(photo)  # Photos in no album or vignette
+    for audio in db.query(models.AudioRecording).options(
+        selectinload(models.AudioRecording.author)
+    ).order_by(models.AudioRecording.id).all():
+        plan.add_audio(audio)
+    for file in db.query(models.File).order_by(models.File.id).all():
+        plan.add_file(file)
+    return plan.finalize()
+
+
+def plan_album(db: Session, album: models.Album) -> ArchivePlan:
+    plan = ArchivePlan(f"album:{album.id}")
+    plan.add_album(db, album)
+    return plan.finalize()
+
+
+def plan_vignette(db: Session, vignette: models.Vignette) -> ArchivePlan:
+    plan = ArchivePlan(f"vignette:{vignette.id}")
+    plan.add_vignette(db, vignette)
+    return plan.finalize()
+
+
+# Reading member data
+
+def _file_parts(entry: ExportEntry, start: int, end: int):
+    for offset in range(start, end, PART_SIZE):
+        yield entry.file_path, offset, min(PART_SIZE, end - offset)
+
+
+def _member_items(entry: ExportEntry, start: int, end: int):
+    """Pieces of one member's data in [start, end): bytes, or (file_path, offset, length) to read"""
+    if entry.data is not None:
+        yield entry.data[start:end]
+    else:
+        yield from _file_parts(entry, start, end)
+
+
+def _ready(data: bytes) -> Future:
+    future = Future()
+    future.set_result(data)
+    return future
+
+
+def _fetch(items) -> Iterator:
+    """
+    Resolve (tag, bytes or (file_path, offset, length)) items to (tag, bytes),
+    in order. Cloud parts are fetched up to FETCH_WORKERS at a time ahead of
+    the consumer, which bounds memory to about FETCH_WORKERS * PART_SIZE.
+    """
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, FETCH_WORKERS)) as pool:
+        for tag, payload in items:
+            if isinstance(payload, bytes):
+                pending.append((tag, _ready(payload)))
+            elif storage.is_cloud_path(payload[0]):
+                pending.append((tag, pool.submit(storage.read_range, *payload)))
+            else:
+                pending.append((tag, _ready(storage.read_range(*payload))))
+            while len(pending) >= FETCH_WORKERS:
+                tag, future = pending.popleft()
+                yield tag, future.result()
+        while pending:
+            tag, future = pending.popleft()
+            yield tag, future.result()
+
+
+# TAR: fixed layout, so any byte range can be served
+
+def _tar_header(entry: ExportEntry) -> bytes:
+    info = tarfile.TarInfo(entry.name)
+    info.size = entry.size
+    info.mtime = int(entry.mtime)
+    info.mode = 0o644
+    return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+
+def _tar_segments(plan: ArchivePlan):
+    """(offset, length, bytes or entry) segments covering the whole TAR stream"""
+    offset = 0
+    for entry in plan.entries:
+        header = _tar_header(entry)
+        yield offset, len(header), header
+        offset += len(header)
+        yield offset, entry.size, entry
+        offset += entry.size
+        padding = -entry.size % BLOCK
+        if padding:
+            yield offset, padding, b"\0" * padding
+            offset += padding
+    yield offset, 2 * BLOCK, b"\0" * (2 * BLOCK)
+
+
+def tar_size(plan: ArchivePlan) -> int:
+    return sum(length for _offset, length, _segment in _tar_segments(plan))
+
+
+def stream_tar(plan: ArchivePlan, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """Bytes [start, end) of the TAR archive"""
+    end = tar_size(plan) if end is None else end
+
+    def items():
+        for offset, length, segment in _tar_segments(plan):
+            if offset + length <= start or offset >= end:
+                continue
+            lo = max(start, offset) - offset
+            hi = min(end, offset + length) - offset
+            if isinstance(segment, bytes):
+                yield None, segment[lo:hi]
+            else:
+                for item in _member_items(segment, lo, hi):
+                    yield None, item
+
+    for _tag, data in _fetch(items()):
+        if data:
+            yield data
+
+
+# ZIP: streamed with data descriptors
+
+class _StreamSink(io.RawIOBase):
+    """Unseekable write target for zipfile; collected bytes are drained by the generator"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def _zip_info(entry: ExportEntry) -> zipfile.ZipInfo:
+    # An empty plan's manifest has mtime 0, and scans can carry pre-1980 dates
+    info = zipfile.ZipInfo(entry.name, max(ZIP_EARLIEST, datetime.fromtimestamp(entry.mtime).timetuple()[:6]))
+    info.file_size = entry.size  # Lets zipfile pick ZIP64 for large members
+    # Media is already compressed; only deflate the generated text
+    info.compress_type = zipfile.ZIP_DEFLATED if entry.data is not None else zipfile.ZIP_STORED
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def stream_zip(plan: ArchivePlan) -> Iterator[bytes]:
+    def items():
+        for index, entry in enumerate(plan.entries):
+            yield index, b""  # Opens the member, even when it's empty
+            for item in _member_items(entry, 0, entry.size):
+                yield index, item
+
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, "w") as archive:
+        current = None
+        member = None
+        for index, data in _fetch(items()):
+            if index != current:
+                if member:
+                    member.close()
+                member = archive.open(_zip_info(plan.entries[index]), "w")
+                current = index
+            member.write(data)
+            if len(sink.buffer) >= PART_SIZE:
+                yield sink.drain()
+        if member:
+            member.close()
+    yield sink.drain()
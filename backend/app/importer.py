@@ -0,0 +1,566 @@
+"""
+Bulk import of existing collections from a directory or a ZIP/TAR archive.
+
+Files are classified by extension into Photo, AudioRecording and File rows;
+each folder becomes an album (named after its path below the folders every
+item shares, or after a Google Takeout album metadata.json). Google Takeout
+JSON sidecars (IMG_1234.jpg.json, *.supplemental-metadata.json, truncated
+names) supply descriptions, capture time, GPS and people tags.
+
+HEIC conversion, metadata extraction, hashing and the storage upload run in
+a process pool (ingest.ingest_photo / ingest.ingest_file); the database is
+written from the parent process in batches of COMMIT_EVERY. Workers open
+directory files themselves, but ZIP/TAR members are read by the parent and
+sent over, so the items in flight are bounded by their bytes (WINDOW_BYTES)
+as well as their count. After each
+commit the imported paths are appended to a checkpoint file, so an
+interrupted import picks up where it stopped when re-run on the same source.
+A dry run plans the import and reports it without uploading or writing.
+"""
+
+import hashlib
+import json
+import mimetypes
+import multiprocessing
+import os
+import re
+import shutil
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app import cache, models, ingest
+from app import changes  # noqa: F401 - registers the change log hook for CLI imports
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+PHOTO_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".heif", ".tif", ".tiff", ".bmp"}
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".m4a", ".aac", ".ogg", ".oga", ".opus", ".flac", ".webm"}
+IGNORED_NAMES = {".ds_store", "thumbs.db", "desktop.ini"}
+SIDECAR_MAX_BYTES = 1024 * 1024
+
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", str(os.cpu_count() or 4)))
+COMMIT_EVERY = int(os.getenv("IMPORT_COMMIT_EVERY", "200"))
+WINDOW_BYTES = int(os.getenv("IMPORT_WINDOW_MB", "256")) * 1024 * 1024
+CHECKPOINT_DIR = Path(os.getenv("IMPORT_CHECKPOINT_DIR", "import_checkpoints"))
+MAX_ERRORS_REPORTED = 50
+
+# Takeout truncates long sidecar names, e.g. IMG_1234.jpg.supplemental-metad.json
+_SUPPLEMENTAL = re.compile(r"\.supp?l?e?m?e?n?t?a?l?(-m?e?t?a?d?a?t?a?)?$")
+_DUPLICATE_SUFFIX = re.compile(r"^(.*)(\(\d+\))(\.[^.]+)$")
+
+
+class ArchiveImportError(Exception):
+    pass
+
+
+# Sources
+
+class _DirectorySource:
+    payload_in_memory = False
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.key = f"dir:{root.resolve()}"
+
+    def members(self):
+        for dirpath, _dirnames, filenames in os.walk(self.root):
+            for name in sorted(filenames):
+                path = Path(dirpath) / name
+                yield path.relative_to(self.root).as_posix(), path.stat().st_size
+
+    def read(self, name: str) -> bytes:
+        return (self.root / name).read_bytes()
+
+    def worker_payload(self, name: str):
+        """What a worker process needs to read the file: a path, not the bytes"""
+        return str(self.root / name)
+
+    def close(self):
+        pass
+
+
+class _ZipSource:
+    payload_in_memory = True
+
+    def __init__(self, path: Path):
+        self.archive = zipfile.ZipFile(path)
+        self.key = f"zip:{path.name}:{path.stat().st_size}"
+
+    def members(self):
+        for info in self.archive.infolist():
+            if not info.is_dir():
+                yield info.filename, info.file_size
+
+    def read(self, name: str) -> bytes:
+        return self.archive.read(name)
+
+    def worker_payload(self, name: str):
+        return self.read(name)
+
+    def close(self):
+        self.archive.close()
+
+
+class _TarSource:
+    """Members are read in archive order, which keeps compressed tars a single pass"""
+
+    payload_in_memory = True
+
+    def __init__(self, path: Path):
+        self.archive = tarfile.open(path)
+        self.key = f"tar:{path.name}:{path.stat().st_size}"
+        self._members = {}
+        self._small = {}
+
+    def members(self):
+        for info in self.archive:
+            if not info.isfile():
+                continue
+            self._members[info.name] = info
+            if info.name.lower().endswith(".json") and info.size <= SIDECAR_MAX_BYTES:
+                self._small[info.name] = self.archive.extractfile(info).read()
+            yield info.name, info.size
+
+    def read(self, name: str) -> bytes:
+        if name in self._small:
+            return self._small[name]
+        return self.archive.extractfile(self._members[name]).read()
+
+    def worker_payload(self, name: str):
+        return self.read(name)
+
+    def close(self):
+        self.archive.close()
+
+
+def open_source(path: Path):
+    path = Path(path).expanduser().resolve()
+    if path.is_dir():
+        return _DirectorySource(path)
+    if not path.exists():
+        raise ArchiveImportError(f"{path} not found")
+    if zipfile.is_zipfile(path):
+        return _ZipSource(path)
+    if tarfile.is_tarfile(path):
+        return _TarSource(path)
+    raise ArchiveImportError(f"{path} is not a directory, ZIP or TAR archive")
+
+
+# Planning
+
+def _kind(name: str) -> Optional[str]:
+    path = PurePosixPath(name)
+    if path.name.lower() in IGNORED_NAMES or path.name.startswith("._") or "__MACOSX" in path.parts:
+        return None
+    extension = path.suffix.lower()
+    if extension == ".json":
+        return "sidecar"
+    if extension in PHOTO_EXTENSIONS:
+        return "photo"
+    if extension in AUDIO_EXTENSIONS:
+        return "audio"
+    return "file"
+
+
+def _sidecar_key(json_name: str) -> str:
+    """Media filename a Takeout sidecar describes (possibly truncated)"""
+    base = PurePosixPath(json_name).name[:-len(".json")]
+    return _SUPPLEMENTAL.sub("", base) if "." in base else base
+
+
+def _find_sidecar(media_name: str, sidecars: Dict[str, dict]) -> Optional[dict]:
+    filename = PurePosixPath(media_name).name
+    candidates = [filename]
+    duplicate = _DUPLICATE_SUFFIX.match(filename)
+    if duplicate:  # IMG_1234(1).jpg -> IMG_1234.jpg(1).json
+        candidates.append(f"{duplicate.group(1)}{duplicate.group(3)}{duplicate.group(2)}")
+    for candidate in candidates:
+        if candidate in sidecars:
+            return sidecars[candidate]
+    # Truncated sidecar names are prefixes of the media name
+    for key, sidecar in sidecars.items():
+        if len(key) >= 30 and filename.startswith(key):
+            return sidecar
+    return None
+
+
+def _takeout_fields(sidecar: Optional[dict]) -> dict:
+    if not sidecar:
+        return {}
+    fields = {}
+    if sidecar.get("description"):
+        fields["description"] = sidecar["description"]
+    taken = (sidecar.get("photoTakenTime") or {}).get("timestamp")
+    if taken:
+        try:
+            fields["taken_at"] = datetime.fromtimestamp(int(taken), tz=timezone.utc)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    for key in ("geoDataExif", "geoData"):
+        geo = sidecar.get(key) or {}
+        if geo.get("latitude") or geo.get("longitude"):
+            fields["gps"] = (geo.get("latitude"), geo.get("longitude"), geo.get("altitude"))
+            break
+    people = [person.get("name") for person in sidecar.get("people") or [] if person.get("name")]
+    if people:
+        fields["people"] = people
+    return fields
+
+
+def plan_import(source, with_albums: bool = True, done: Optional[set] = None) -> dict:
+    """
+    Walk the source once and decide what every file becomes.
+
+    Returns:
+        {"items": [{"name", "kind", "size", "album", "fields"}], "ignored", "skipped", "albums"}
+    """
+    done = done or set()
+    media = []
+    sidecars_by_folder: Dict[str, Dict[str, dict]] = {}
+    album_titles: Dict[str, dict] = {}
+    ignored = 0
+
+    for name, size in source.members():
+        kind = _kind(name)
+        if kind is None:
+            ignored += 1
+        elif kind == "sidecar":
+            ignored += 1
+            if size > SIDECAR_MAX_BYTES:
+                continue
+            try:
+                data = json.loads(source.read(name))
+            except (ValueError, UnicodeDecodeError):
+                continue
+            if not isinstance(data, dict):
+                continue
+            folder = str(PurePosixPath(name).parent)
+            if PurePosixPath(name).name == "metadata.json" and "photoTakenTime" not in data:
+                album_titles[folder] = data  # Takeout album metadata
+            else:
+                sidecars_by_folder.setdefault(folder, {})[_sidecar_key(name)] = data
+        else:
+            media.append((name, kind, size))
+
+    # Albums are named by folder path below the folders every item shares
+    folders = [PurePosixPath(name).parent.parts for name, _kind_, _size in media]
+    common = 0
+    if folders:
+        shortest = min(len(parts) for parts in folders)
+        while common < shortest and len({parts[common] for parts in folders}) == 1:
+            common += 1
+
+    items = []
+    skipped = 0
+    albums = set()
+    for (name, kind, size), parts in zip(media, folders):
+        if name in done:
+            skipped += 1
+            continue
+        folder = str(PurePosixPath(name).parent)
+        album = None
+        if with_albums:
+            album = (album_titles.get(folder) or {}).get("title") or " / ".join(parts[common:]) or None
+            if album:
+                albums.add(album)
+        sidecar = _find_sidecar(name, sidecars_by_folder.get(folder, {}))
+        items.append({
+            "name": name,
+            "kind": kind,
+            "size": size,
+            "album": album,
+            "album_description": (album_titles.get(folder) or {}).get("description"),
+            "fields": _takeout_fields(sidecar),
+            "has_sidecar": sidecar is not None,
+        })
+
+    return {"items": items, "ignored": ignored, "skipped": skipped, "albums": sorted(albums)}
+
+
+# Checkpoints
+
+def checkpoint_path(source) -> Path:
+    return CHECKPOINT_DIR / f"{hashlib.sha1(source.key.encode('utf-8')).hexdigest()[:16]}.jsonl"
+
+
+def load_checkpoint(source) -> set:
+    path = checkpoint_path(source)
+    if not path.exists():
+        return set()
+    done = set()
+    with open(path) as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["name"])
+            except (ValueError, KeyError):
+                continue  # Torn final line from a crash
+    return done
+
+
+def _append_checkpoint(source, records: List[dict]):
+    path = checkpoint_path(source)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# Ingest (worker processes)
+
+def _process_item(kind: str, name: str, payload, content_type: Optional[str]) -> dict:
+    """Runs in a worker process: read, convert/hash and upload one file"""
+    filename = PurePosixPath(name).name
+    if isinstance(payload, str):
+        with open(payload, "rb") as f:  # Streamed from disk, not read into memory
+            return _ingest(kind, f, filename, content_type)
+    return _ingest(kind, payload, filename, content_type)
+
+
+def _ingest(kind: str, data, filename: str, content_type: Optional[str]) -> dict:
+    if kind == "photo":
+        return ingest.ingest_photo(data, filename, content_type)
+    return ingest.ingest_file(data, filename, "audio" if kind == "audio" else "files", content_type)
+
+
+# Database rows (parent process)
+
+class _RowBuilder:
+    def __init__(self, db: Session, user: models.User):
+        self.db = db
+        self.user = user
+        self.albums: Dict[str, models.Album] = {}
+        self.people: Dict[str, models.Person] = {}
+
+    def album(self, name: str, description: Optional[str]) -> models.Album:
+        if name not in self.albums:
+            album = self.db.query(models.Album).filter(models.Album.name == name).first()
+            if not album:
+                album = models.Album(name=name, description=description, created_by_id=self.user.id)
+                self.db.add(album)
+            self.albums[name] = album
+        return self.albums[name]
+
+    def person(self, name: str) -> models.Person:
+        if name not in self.people:
+            person = self.db.query(models.Person).filter(models.Person.name == name).first()
+            if not person:
+                person = models.Person(name=name)
+                self.db.add(person)
+            self.people[name] = person
+        return self.people[name]
+
+    def build(self, item: dict, ingested: dict):
+        fields = item["fields"]
+        title = PurePosixPath(item["name"]).name
+        if item["kind"] == "photo":
+            metadata = ingested.get("metadata")
+            if fields.get("taken_at") and not ingested.get("taken_at"):
+                ingested = {**ingested, "taken_at": fields["taken_at"]}
+                if metadata:
+                    metadata["taken_at"] = fields["taken_at"]
+            if fields.get("gps") and metadata and metadata.get("gps_latitude") is None:
+                metadata["gps_latitude"], metadata["gps_longitude"], metadata["gps_altitude"] = fields["gps"]
+            row = ingest.new_photo(
+                ingested,
+                title=title,
+                description=fields.get("description"),
+                uploaded_by_id=self.user.id,
+            )
+            for name in fields.get("people", []):
+                row.people_tags.append(models.PhotoPerson(person=self.person(name)))
+            if item["album"]:
+                row.albums.append(models.AlbumPhoto(album=self.album(item["album"], item["album_description"])))
+        elif item["kind"] == "audio":
+            row = models.AudioRecording(
+                **ingested,
+                title=title,
+                description=fields.get("description"),
+                author_id=self.user.id,
+            )
+        else:
+            row = models.File(
+                **ingested,
+                title=title,
+                description=fields.get("description"),
+                file_type=mimetypes.guess_type(item["name"])[0],
+                source="files",
+                uploaded_by_id=self.user.id,
+            )
+        self.db.add(row)
+        return row
+
+
+def run_import(
+    db: Session,
+    source_path: Path,
+    user: models.User,
+    dry_run: bool = False,
+    with_albums: bool = True,
+    workers: int = IMPORT_WORKERS,
+    restart: bool = False,
+    progress: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """
+    Import a directory or ZIP/TAR archive.
+
+    Args:
+        restart: Ignore the checkpoint and import everything again
+        progress: Optional callback receiving the running report after each batch
+
+    Returns:
+        A report of what was (or, for a dry run, would be) imported
+    """
+    source = open_source(source_path)
+    try:
+        done = set() if restart else load_checkpoint(source)
+        plan = plan_import(source, with_albums, done)
+        items = plan["items"]
+        report = {
+            "source": str(source_path),
+            "dry_run": dry_run,
+            "total": len(items) + plan["skipped"],
+            "photos": sum(1 for item in items if item["kind"] == "photo"),
+            "audio": sum(1 for item in items if item["kind"] == "audio"),
+            "files": sum(1 for item in items if item["kind"] == "file"),
+            "with_sidecar": sum(1 for item in items if item["has_sidecar"]),
+            "bytes": sum(item["size"] for item in items),
+            "albums": plan["albums"],
+            "ignored": plan["ignored"],
+            "skipped": plan["skipped"],
+            "imported": 0,
+            "failed": 0,
+            "errors": [],
+        }
+        if dry_run or not items:
+            return report
+
+        builder = _RowBuilder(db, user)
+        pending_rows = []
+
+        def commit_batch():
+            db.flush()  # Assigns ids without a reload per row after commit
+            records = [{"name": item["name"], "kind": item["kind"], "id": row.id} for item, row in pending_rows]
+            db.commit()
+            cache.bump("photos", "albums")
+            _append_checkpoint(source, records)
+            report["imported"] += len(pending_rows)
+            pending_rows.clear()
+            if progress:
+                progress(report)
+
+        # spawn: workers must not inherit the parent's DB connections or boto3 client
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=context) as pool:
+            in_flight = {}
+            queue = iter(items)
+            next_item = next(queue, None)
+            window = max(1, workers) * 2
+            # Archive members are held in the parent (and the pool's queue) until
+            # their worker finishes, so a few large videos must not fill the window
+            queued_bytes = 0
+
+            def fill_window():
+                nonlocal next_item, queued_bytes
+                while next_item is not None and len(in_flight) < window:
+                    size = next_item["size"] if source.payload_in_memory else 0
+                    # A member bigger than the whole budget still goes, on its own
+                    if in_flight and queued_bytes + size > WINDOW_BYTES:
+                        break
+                    content_type = mimetypes.guess_type(next_item["name"])[0]
+                    future = pool.submit(
+                        _process_item, next_item["kind"], next_item["name"],
+                        source.worker_payload(next_item["name"]), content_type
+                    )
+                    in_flight[future] = (next_item, size)
+                    queued_bytes += size
+                    next_item = next(queue, None)
+
+            fill_window()
+
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    item, size = in_flight.pop(future)
+                    queued_bytes -= size
+                    try:
+                        pending_rows.append((item, builder.build(item, future.result())))
+                    except Exception as e:
+                        report["failed"] += 1
+                        if len(report["errors"]) < MAX_ERRORS_REPORTED:
+                            report["errors"].append({"name": item["name"], "error": str(e)})
+                        log.warning("Failed to import item", extra={"item": item['name'], "error": str(e)})
+                fill_window()
+                if len(pending_rows) >= COMMIT_EVERY:
+                    commit_batch()
+
+        if pending_rows:
+            commit_batch()
+        return report
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        source.close()
+
+
+# Background jobs for the admin API (one at a time)
+
+_job_lock = threading.Lock()
+_job = {"state": "idle"}
+
+
+def job_status() -> dict:
+    with _job_lock:
+        return {**_job, "report": dict(_job["report"]) if _job.get("report") else None}
+
+
+def start_job(source_path: str) -> dict:
+    with _job_lock:
+        if _job.get("state") in ("queued", "running"):
+            raise ArchiveImportError("An import is already running")
+        _job.clear()
+        _job.update({
+            "state": "queued",
+            "source": source_path,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "report": None,
+        })
+        return dict(_job)
+
+
+def _update_job(**fields):
+    with _job_lock:
+        _job.update(fields)
+
+
+def run_job(source_path: str, user_id: int, with_albums: bool = True, cleanup: bool = False):
+    """Background task entry point; cleanup deletes an uploaded archive's staging folder afterwards"""
+    from app.database import SessionLocal
+
+    _update_job(state="running")
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.id == user_id).first()
+        report = run_import(
+            db, Path(source_path), user, with_albums=with_albums,
+            progress=lambda report: _update_job(report=dict(report))
+        )
+        _update_job(state="done", report=report, finished_at=datetime.now().isoformat(timespec="seconds"))
+        log.info("Import finished", extra={"source": str(source_path), "imported": report['imported'], "failed": report['failed']})
+    except Exception as e:
+        _update_job(state="failed", error=str(e), finished_at=datetime.now().isoformat(timespec="seconds"))
+        log.exception("Import failed", extra={"source": str(source_path)})
+    finally:
+        db.close()
+        if cleanup:
+            shutil.rmtree(Path(source_path).parent, ignore_errors=True)
@@ -0,0 +1,135 @@
+"""
+Photo and media ingest shared by uploads and bulk imports.
+
+Nothing here touches the database or the FastAPI app, so these functions
+can run in worker threads (batch uploads) or worker processes (imports).
+"""
+
+import io
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+from PIL import Image
+
+from app import models, storage, phash, metadata
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+
+def _photo_hash(img) -> Optional[str]:
+    """Perceptual hash for duplicate detection; never fails the upload"""
+    try:
+        return phash.dhash(img)
+    except Exception as e:
+        log.warning("Could not compute perceptual hash", extra={"error": str(e)})
+        return None
+
+
+def ingest_photo(
+    file_content: Union[bytes, BinaryIO],
+    original_filename: str,
+    content_type: Optional[str]
+) -> dict:
+    """Convert (HEIC -> JPEG), extract metadata and hash a photo, then upload it to storage
+
+    file_content is the photo's bytes or a seekable file object (e.g. an upload's spooled
+    file), which is read in place and streamed to storage rather than loaded into memory.
+
+    Does not touch the database so it can run in a worker thread or process; returns the
+    fields needed to build the models.Photo row, plus a "metadata" dict for
+    its models.PhotoMetadata row (None if the header couldn't be parsed).
+    """
+    if isinstance(file_content, (bytes, bytearray)):
+        file_content = io.BytesIO(file_content)
+
+    # Get file extension and check if it's HEIC
+    file_extension = Path(original_filename).suffix.lower()
+    is_heic = file_extension in ['.heic', '.heif']
+
+    # Parse the headers once (no pixel decode) for dimensions, EXIF, GPS and camera
+    try:
+        file_content.seek(0)
+        photo_metadata = metadata.extract_photo_metadata(file_content)
+        if photo_metadata["taken_at"]:
+            log.debug("Extracted EXIF date", extra={"taken_at": photo_metadata['taken_at'], "sampled": True})
+    except Exception as e:
+        log.warning("Could not extract photo metadata", extra={"upload_filename": original_filename, "error": str(e)})
+        photo_metadata = None
+
+    photo_hash = None
+
+    # If HEIC, convert to JPEG
+    if is_heic:
+        # Open with Pillow (HEIF opener is registered by app.metadata) and convert to JPEG
+        file_content.seek(0)
+        img = Image.open(file_content)
+
+        # Convert to RGB if necessary (HEIC can have different color modes)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        # Save as JPEG
+        file_extension = '.jpg'
+        unique_filename = f"{uuid.uuid4()}{file_extension}"
+
+        # Save to BytesIO buffer for cloud upload
+        img_buffer = io.BytesIO()
+        img.save(img_buffer, 'JPEG', quality=95)
+        img_buffer.seek(0)
+
+        photo_hash = _photo_hash(img)
+
+        # Upload to cloud storage or local
+        file_url = storage.upload_file(img_buffer, unique_filename, "photos", "image/jpeg")
+        log.info("Converted HEIC to JPEG", extra={"stored_filename": unique_filename, "sampled": True})
+    else:
+        # Save file normally for non-HEIC files
+        unique_filename = f"{uuid.uuid4()}{file_extension}"
+
+        if photo_metadata:
+            file_content.seek(0)
+            photo_hash = _photo_hash(Image.open(file_content))
+
+        # Upload to cloud storage or local
+        file_content.seek(0)
+        file_url = storage.upload_file(
+            file_content,
+            unique_filename,
+            "photos",
+            content_type
+        )
+
+    return {
+        "filename": unique_filename,
+        "file_path": file_url,  # Store URL instead of local path
+        "taken_at": photo_metadata["taken_at"] if photo_metadata else None,
+        "phash": photo_hash,
+        "metadata": photo_metadata,
+    }
+
+
+def new_photo(ingested: dict, **fields) -> models.Photo:
+    """Build a Photo row (and its PhotoMetadata row) from ingest_photo output"""
+    ingested = dict(ingested)
+    photo_metadata = ingested.pop("metadata")
+    db_photo = models.Photo(**ingested, **fields)
+    if photo_metadata:
+        db_photo.photo_metadata = models.PhotoMetadata(**photo_metadata)
+    return db_photo
+
+
+def ingest_file(
+    file_content: Union[bytes, BinaryIO],
+    original_filename: str,
+    folder: str,
+    content_type: Optional[str]
+) -> dict:
+    """Upload an audio recording or file (bytes or a file object) under a unique name;
+    returns filename and file_path"""
+    if isinstance(file_content, (bytes, bytearray)):
+        file_content = io.BytesIO(file_content)
+    unique_filename = f"{uuid.uuid4()}{Path(original_filename).suffix.lower()}"
+    file_url = storage.upload_file(file_content, unique_filename, folder, content_type)
+    return {"filename": unique_filename, "file_path": file_url}
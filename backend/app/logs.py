@@ -0,0 +1,230 @@
+"""
+Structured logging for the app.* modules.
+
+Modules log through `get_logger(__name__)`, passing identifiers as
+fields rather than formatting them into the text:
+
+    log.info("Photo deleted", extra={"photo_id": photo_id})
+
+configure_logging() (called once by main.py) routes app.* records through a
+bounded in-memory queue: the request thread only enqueues, and a background
+listener thread formats and writes them to stdout, one JSON object per line
+(LOG_FORMAT=text gives "[LEVEL logger] message key=value" for development).
+If the queue is full the record is dropped and counted rather than blocking
+the request.
+
+- LOG_LEVEL sets the default level; LOG_LEVELS overrides it per module,
+  e.g. "app.storage=DEBUG,app.email=WARNING".
+- RequestIdMiddleware gives every request an id (the client's X-Request-ID
+  if it sent a sane one), attaches it to each record logged while handling
+  it and returns it in the X-Request-ID response header.
+- Records logged with extra={"sampled": True} are high-volume events: only
+  one in LOG_SAMPLE_EVERY of them is written (per call site). Warnings and
+  errors are never sampled.
+
+Until configure_logging() runs (CLI scripts), app.* records go straight to
+stdout in the text format.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_EVERY = max(1, int(os.getenv("LOG_SAMPLE_EVERY", "10")))
+
+REQUEST_ID_HEADER = b"x-request-id"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+request_id: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="")
+
+stats = {"dropped": 0, "sampled_out": 0}
+
+# Attributes every LogRecord has; anything else on a record came from extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "sampled"}
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRS}
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", ""):
+            entry["request_id"] = record.request_id
+        entry.update(_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        parts = [f"[{record.levelname} {record.name}] {record.getMessage()}"]
+        parts.extend(f"{key}={value}" for key, value in _fields(record).items())
+        if getattr(record, "request_id", ""):
+            parts.append(f"request_id={record.request_id}")
+        line = " ".join(parts)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp the current request id (runs in the calling thread, before queueing)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in `every` records marked sampled=True, counted per call site"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every <= 1 or not getattr(record, "sampled", False) or record.levelno >= logging.WARNING:
+            return True
+        site = (record.name, record.lineno)
+        with self._lock:
+            seen = self._seen.get(site, 0)
+            self._seen[site] = seen + 1
+        if seen % self.every == 0:
+            return True
+        stats["sampled_out"] += 1
+        return False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Non-blocking: drops (and counts) records when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now: args may be mutated later
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            stats["dropped"] += 1
+
+
+_listener = None
+_app_logger = logging.getLogger("app")
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for an app module (importing this module sets up the default output)"""
+    return logging.getLogger(name)
+
+
+def _install_default_handler():
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(TextFormatter())
+    _app_logger.addHandler(handler)
+    _app_logger.setLevel(logging.INFO)
+    _app_logger.propagate = False
+
+
+def _apply_levels():
+    _app_logger.setLevel(LOG_LEVEL)
+    for item in LOG_LEVELS.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+
+def configure_logging():
+    """Switch app.* logging to the queued, structured setup (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JSONFormatter())
+
+    log_queue: "queue.Queue" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(LOG_SAMPLE_EVERY))
+    handler.addFilter(RequestIdFilter())
+
+    for existing in list(_app_logger.handlers):
+        _app_logger.removeHandler(existing)
+    _app_logger.addHandler(handler)
+    _apply_levels()
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out whatever is still queued"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        supplied = ""
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                supplied = value.decode("latin-1")
+                break
+        current = supplied if _VALID_REQUEST_ID.match(supplied) else uuid.uuid4().hex[:16]
+        token = request_id.set(current)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, current.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
+
+
+_install_default_handler()
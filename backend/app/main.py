@@ -1,7 +1,10 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Query, Request, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, RedirectResponse, StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -15,18 +18,43 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-from app.database import get_db, init_db
+from app.database import engine, get_db, init_db, SessionLocal
 from app import models, schemas
 from app import storage
+from app import phash
+from app import resumable
+from app import audio as audio_analysis
+from app import transcode
+from app import backup, media_backup
+from app import export
+from app import ingest
+from app import importer
+from app import static
+from app import compression
+from app import cache
+from app import changes
+from app import events
+from app import metrics
+from app import logs
+from app import queryprofile
+from app import profiler
+from app.serialize import FastJSONResponse, schema_columns, rows_to_dicts, group_by
 from app.auth import (
     get_current_user,
     get_current_admin,
     get_password_hash,
     authenticate_user,
     create_access_token,
+    create_media_token,
+    user_from_token,
+    optional_oauth2_scheme,
     ACCESS_TOKEN_EXPIRE_MINUTES,
+    MEDIA_TOKEN_EXPIRE_MINUTES,
 )
 
+logs.configure_logging()
+log = logs.get_logger(__name__)
+
 app = FastAPI(title="TAG Diary Website API")
 
 # CORS middleware
@@ -46,6 +74,21 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# Compress JSON/text API responses (zstd, Brotli or gzip, as the client accepts)
+app.add_middleware(compression.CompressionMiddleware)
+
+# Request metrics for GET /metrics (added after compression, so timings include it)
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(engine)
+
+# Development/CI: per-request query counts and N+1 detection (X-DB-* headers)
+if queryprofile.QUERY_PROFILE:
+    app.add_middleware(queryprofile.QueryProfileMiddleware)
+    queryprofile.instrument_engine(engine)
+
+# Request id for log correlation (X-Request-ID in and out)
+app.add_middleware(logs.RequestIdMiddleware)
+
 # Create upload directories
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -60,15 +103,35 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 # Serve frontend static files (built React app)
 FRONTEND_BUILD_DIR = Path("../frontend/dist")
 if FRONTEND_BUILD_DIR.exists():
-    print(f"[STARTUP] Serving frontend from {FRONTEND_BUILD_DIR.absolute()}")
-    app.mount("/assets", StaticFiles(directory=str(FRONTEND_BUILD_DIR / "assets")), name="assets")
+    log.info("Serving frontend", extra={"path": str(FRONTEND_BUILD_DIR.absolute())})
+    app.mount("/assets", static.PrecompressedStaticFiles(directory=str(FRONTEND_BUILD_DIR / "assets")), name="assets")
 else:
-    print(f"[STARTUP] Warning: Frontend build directory not found at {FRONTEND_BUILD_DIR.absolute()}")
+    log.warning("Frontend build directory not found", extra={"path": str(FRONTEND_BUILD_DIR.absolute())})
+index_page = static.IndexPage(FRONTEND_BUILD_DIR / "index.html")
 
 
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    profiler.set_loop_thread()
+    if profiler.auto_profiler:
+        profiler.auto_profiler.start()
+    db = SessionLocal()
+    try:
+        removed = changes.prune(db)
+        if removed:
+            log.info("Pruned old change log entries", extra={"removed": removed})
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    from app.email import dispatcher
+    dispatcher.shutdown()
+    if profiler.auto_profiler:
+        profiler.auto_profiler.stop()
+    logs.shutdown_logging()
 
 
 # ONE-TIME SETUP ENDPOINT - DISABLED (admin account created)
@@ -131,7 +194,7 @@ def create_invite_code(
 ):
     """Generate a new invite code (admin only)"""
     import secrets
-    from app.email import send_invite_email
+    from app.email import queue_invite_email
 
     # Generate a secure random code
     code = secrets.token_urlsafe(16)
@@ -151,80 +214,180 @@ def create_invite_code(
     db.commit()
     db.refresh(db_invite)
 
-    # Send email if requested and email is provided
+    # Queue the email if requested; it's sent in the background so a slow
+    # SMTP server never delays the response
     if invite.send_email and invite.email:
-        try:
-            send_invite_email(
-                to_email=invite.email,
-                invite_code=code,
-                recipient_name=invite.recipient_name
-            )
-            print(f"[INVITE] Email sent to {invite.email}")
-        except Exception as e:
-            print(f"[INVITE] Failed to send email: {str(e)}")
-            # Don't fail the whole request if email fails
+        if queue_invite_email(
+            to_email=invite.email,
+            invite_code=code,
+            recipient_name=invite.recipient_name
+        ):
+            log.info("Invite email queued", extra={"invite_id": db_invite.id})
 
     return db_invite
 
 
-@app.get("/api/admin/invite-codes", response_model=List[schemas.InviteCodeWithUser])
-def list_invite_codes(
+@app.post("/api/admin/invite-codes/bulk")
+def create_invite_codes_bulk(
+    invites: schemas.BulkInviteCreate,
+    format: str = "csv",
     current_admin: models.User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """List all invite codes with user information (admin only)"""
-    codes = db.query(models.InviteCode).order_by(models.InviteCode.created_at.desc()).all()
-
-    # Enrich with user information
-    result = []
-    for code in codes:
-        code_dict = {
-            "id": code.id,
-            "code": code.code,
-            "email": code.email,
-            "created_by_id": code.created_by_id,
-            "used_by_id": code.used_by_id,
-            "created_at": code.created_at,
-            "used_at": code.used_at,
-            "expires_at": code.expires_at,
-            "is_used": code.is_used,
-            "used_by_username": None,
-            "used_by_email": None,
-            "used_by_full_name": None,
+    """Generate invite codes for many recipients at once (admin only)
+
+    All codes are inserted in one statement and committed together; emails
+    are queued as a single batch. Returns a CSV of name/email/code, or the
+    created codes as JSON with ?format=json.
+    """
+    import csv
+    import secrets
+    from sqlalchemy import insert
+    from app.email import queue_invite_emails
+
+    if format not in ("csv", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'json'")
+
+    # Skip repeated addresses so nobody gets two codes
+    recipients = []
+    seen = set()
+    for recipient in invites.recipients:
+        key = recipient.email.lower() if recipient.email else None
+        if key and key in seen:
+            continue
+        seen.add(key)
+        recipients.append(recipient)
+
+    expires_at = None
+    if invites.expires_in_days:
+        expires_at = datetime.now() + timedelta(days=invites.expires_in_days)
+
+    rows = [
+        {
+            "code": secrets.token_urlsafe(16),
+            "email": recipient.email,
+            "created_by_id": current_admin.id,
+            "expires_at": expires_at,
+            "is_used": False,
         }
+        for recipient in recipients
+    ]
+    codes = db.scalars(insert(models.InviteCode).returning(models.InviteCode), rows).all()
+    db.commit()
+    log.info("Invite codes created in bulk", extra={"count": len(codes)})
+
+    emailed = 0
+    if invites.send_email:
+        emailed = queue_invite_emails([
+            (recipient.email, row["code"], recipient.name)
+            for recipient, row in zip(recipients, rows)
+            if recipient.email
+        ])
+
+    if format == "json":
+        return [schemas.InviteCode.model_validate(code) for code in codes]
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["name", "email", "code", "expires_at", "emailed"])
+    for recipient, row in zip(recipients, rows):
+        writer.writerow([
+            recipient.name or "",
+            recipient.email or "",
+            row["code"],
+            expires_at.date().isoformat() if expires_at else "",
+            "yes" if emailed and recipient.email else "no",
+        ])
+    filename = f"invite_codes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    return Response(
+        content=out.getvalue(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 
-        # Get user info if code was used
-        if code.used_by_id:
-            user = db.query(models.User).filter(models.User.id == code.used_by_id).first()
-            if user:
-                code_dict["used_by_username"] = user.username
-                code_dict["used_by_email"] = user.email
-                code_dict["used_by_full_name"] = user.full_name
+INVITE_STATUSES = ("used", "expired", "open", "unused")
+
+
+@app.get("/api/admin/invite-codes", response_model=List[schemas.InviteCodeWithUser])
+def list_invite_codes(
+    response: Response,
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    current_admin: models.User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """List invite codes with user information (admin only)
 
-        result.append(code_dict)
+    Filter with ?status=used|expired|open|unused (unused = open or expired).
+    Page with skip/limit (everything without a limit); the total matching
+    count is in X-Total-Count.
+    """
+    if status is not None and status not in INVITE_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(INVITE_STATUSES)}")
+
+    InviteCode = models.InviteCode
+    query = db.query(
+        InviteCode.id,
+        InviteCode.code,
+        InviteCode.email,
+        InviteCode.created_by_id,
+        InviteCode.used_by_id,
+        InviteCode.created_at,
+        InviteCode.used_at,
+        InviteCode.expires_at,
+        func.coalesce(InviteCode.is_used, False).label("is_used"),
+        models.User.username.label("used_by_username"),
+        models.User.email.label("used_by_email"),
+        models.User.full_name.label("used_by_full_name"),
+    ).outerjoin(models.User, models.User.id == InviteCode.used_by_id)
+
+    if status:
+        used = func.coalesce(InviteCode.is_used, False)
+        now = datetime.now()
+        if status == "used":
+            query = query.filter(used.is_(True))
+        elif status == "expired":
+            query = query.filter(used.is_(False), InviteCode.expires_at < now)
+        elif status == "open":
+            query = query.filter(used.is_(False), (InviteCode.expires_at.is_(None)) | (InviteCode.expires_at >= now))
+        else:
+            query = query.filter(used.is_(False))
 
-    return result
+    response.headers["X-Total-Count"] = str(query.order_by(None).count())
+    query = query.order_by(InviteCode.created_at.desc(), InviteCode.id.desc()).offset(skip)
+    rows = (query.limit(limit) if limit is not None else query).all()
+    return [row._mapping for row in rows]
 
 
 @app.get("/api/admin/users")
 def list_users(
+    response: Response,
+    skip: int = 0,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
     current_admin: models.User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """List all registered users (admin only)"""
-    users = db.query(models.User).order_by(models.User.created_at.desc()).all()
+    """List registered users with the invite code they joined with (admin only)
 
-    return [
-        {
-            "id": user.id,
-            "username": user.username,
-            "full_name": user.full_name,
-            "email": user.email,
-            "is_admin": user.is_admin,
-            "created_at": user.created_at
-        }
-        for user in users
-    ]
+    Page with skip/limit (everything without a limit); the total count is in
+    X-Total-Count.
+    """
+    query = db.query(
+        models.User.id,
+        models.User.username,
+        models.User.full_name,
+        models.User.email,
+        models.User.is_admin,
+        models.User.created_at,
+        models.InviteCode.code.label("invite_code"),
+    ).outerjoin(models.InviteCode, models.InviteCode.used_by_id == models.User.id)
+
+    response.headers["X-Total-Count"] = str(db.query(func.count(models.User.id)).scalar())
+    query = query.order_by(models.User.created_at.desc(), models.User.id.desc()).offset(skip)
+    rows = (query.limit(limit) if limit is not None else query).all()
+    return [dict(row._mapping) for row in rows]
 
 
 @app.delete("/api/admin/invite-codes/{code_id}")
@@ -262,6 +425,7 @@ def delete_user(
     # This ensures referential integrity
     db.delete(user)
     db.commit()
+    cache.bump_all()
     return {"message": "User deleted successfully"}
 
 
@@ -285,6 +449,39 @@ def get_mistagged_files(
     }
 
 
+@app.get("/api/admin/duplicate-photos")
+def get_duplicate_photos(
+    threshold: int = Query(phash.DEFAULT_THRESHOLD, ge=0, le=phash.MAX_THRESHOLD),
+    current_admin: models.User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """List clusters of near-duplicate photos by perceptual hash (admin only)
+
+    threshold is the max number of differing hash bits (0 = visually identical,
+    at most phash.MAX_THRESHOLD).
+    Photos without a hash yet are skipped - run backfill_photo_hashes.py for those.
+    """
+    hashes = db.query(models.Photo.id, models.Photo.phash).filter(
+        models.Photo.phash.isnot(None)
+    ).all()
+    clusters = phash.find_duplicate_clusters(hashes, threshold)
+
+    photo_ids = [photo_id for cluster in clusters for photo_id in cluster]
+    photos_by_id = {
+        photo.id: photo
+        for photo in db.query(models.Photo).filter(models.Photo.id.in_(photo_ids)).all()
+    } if photo_ids else {}
+
+    return {
+        "count": len(clusters),
+        "hashed_count": len(hashes),
+        "clusters": [
+            [schemas.Photo.model_validate(photos_by_id[photo_id]) for photo_id in cluster]
+            for cluster in clusters
+        ]
+    }
+
+
 @app.post("/api/admin/fix-file-sources")
 def fix_file_sources(
     current_admin: models.User = Depends(get_current_admin),
@@ -351,32 +548,36 @@ async def upload_background(
     )
     db.add(bg_image)
     db.commit()
+    cache.bump("background")
     db.refresh(bg_image)
 
     return bg_image
 
 
 @app.get("/api/background")
-def get_active_background(db: Session = Depends(get_db)):
+def get_active_background(request: Request, db: Session = Depends(get_db)):
     """Get the currently active background image (public)"""
-    bg = db.query(models.BackgroundImage).filter(
-        models.BackgroundImage.is_active == True
-    ).first()
+    def build():
+        bg = db.query(models.BackgroundImage).filter(
+            models.BackgroundImage.is_active == True
+        ).first()
 
-    if not bg:
-        return None
+        if not bg:
+            return None
 
-    # Return the actual file_path which contains either R2 URL or local path
-    if bg.file_path.startswith('http'):
-        url = bg.file_path
-    else:
-        # For local files, ensure the path starts with /
-        url = f"/{bg.file_path}" if not bg.file_path.startswith('/') else bg.file_path
+        # Return the actual file_path which contains either R2 URL or local path
+        if bg.file_path.startswith('http'):
+            url = bg.file_path
+        else:
+            # For local files, ensure the path starts with /
+            url = f"/{bg.file_path}" if not bg.file_path.startswith('/') else bg.file_path
 
-    return {
-        "id": bg.id,
-        "url": url
-    }
+        return {
+            "id": bg.id,
+            "url": url
+        }
+
+    return cache.cached(request, ("background",), build)
 
 
 @app.delete("/api/admin/background/{bg_id}")
@@ -394,76 +595,103 @@ def delete_background(
     try:
         storage.delete_file(bg.file_path)
     except Exception as e:
-        print(f"[DELETE BACKGROUND] Error deleting file: {str(e)}")
+        log.warning("Could not delete background image file", extra={"error": str(e)})
 
     # Delete from database
     db.delete(bg)
     db.commit()
+    cache.bump("background")
     return {"message": "Background deleted"}
 
 
 # Database Backup routes (admin only)
-@app.post("/api/admin/backup")
-def create_backup(current_admin: models.User = Depends(get_current_admin)):
-    """Create a database backup (admin only)"""
-    import sqlite3
-    from datetime import datetime
-
-    DB_PATH = Path("tag_diary.db")
-    BACKUP_DIR = Path("backups")
-    BACKUP_DIR.mkdir(exist_ok=True)
-
-    if not DB_PATH.exists():
-        raise HTTPException(status_code=404, detail="Database not found")
+@app.post("/api/admin/backup", status_code=202)
+def create_backup(
+    background_tasks: BackgroundTasks,
+    current_admin: models.User = Depends(get_current_admin)
+):
+    """Start a database backup in the background (admin only)
 
+    SQLite is copied in paced page batches into an incremental snapshot;
+    Postgres gets a streamed, compressed pg_dump. Follow progress with
+    GET /api/admin/backup/status or its /stream (SSE) variant.
+    """
     try:
-        # Create timestamp for backup filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"tag_diary_backup_{timestamp}.db"
-        backup_path = BACKUP_DIR / backup_filename
-
-        # Use SQLite backup API for safe backup
-        source_conn = sqlite3.connect(str(DB_PATH))
-        backup_conn = sqlite3.connect(str(backup_path))
-
-        with backup_conn:
-            source_conn.backup(backup_conn)
-
-        source_conn.close()
-        backup_conn.close()
-
-        backup_size = backup_path.stat().st_size
-
-        return {
-            "message": "Backup created successfully",
-            "filename": backup_filename,
-            "size": backup_size,
-            "timestamp": timestamp
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Backup failed: {str(e)}")
+        job = backup.start_job()
+    except backup.BackupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    background_tasks.add_task(backup.run_job)
+    return {"message": "Backup started", **job}
+
+
+@app.get("/api/admin/backup/status")
+def backup_status(current_admin: models.User = Depends(get_current_admin)):
+    """Current or last backup job: state, progress and result (admin only)"""
+    return backup.job_status()
+
+
+@app.get("/api/admin/backup/status/stream")
+async def stream_backup_status(current_admin: models.User = Depends(get_current_admin)):
+    """Server-sent events with backup progress until the job finishes (admin only)"""
+    import json
+    import asyncio
+
+    async def events():
+        last = None
+        while True:
+            status = backup.job_status()
+            if status != last:
+                yield f"data: {json.dumps(status)}\n\n"
+                last = status
+            if status.get("state") not in ("queued", "running"):
+                break
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/api/admin/backups")
 def list_backups(current_admin: models.User = Depends(get_current_admin)):
     """List all available backups (admin only)"""
-    BACKUP_DIR = Path("backups")
+    backups = [
+        {
+            "filename": snapshot["id"],
+            "size": snapshot["size"],
+            "stored_bytes": snapshot["stored_bytes"],
+            "created": snapshot["created_at"],
+            "type": "incremental",
+        }
+        for snapshot in backup.list_snapshots()
+    ]
 
-    if not BACKUP_DIR.exists():
-        return {"backups": []}
+    # Postgres logical dumps
+    backups.extend(
+        {
+            "filename": dump["filename"],
+            "size": dump["stored_bytes"],
+            "stored_bytes": dump["stored_bytes"],
+            "created": dump["created_at"],
+            "type": "dump",
+        }
+        for dump in backup.list_dumps()
+    )
 
-    backup_files = sorted(
-        BACKUP_DIR.glob("tag_diary_backup_*.db"),
+    # Full-copy backups made before incremental snapshots
+    for backup_file in sorted(
+        backup.BACKUP_DIR.glob("tag_diary_backup_*.db"),
         key=lambda p: p.stat().st_mtime,
         reverse=True
-    )
-
-    backups = []
-    for backup_file in backup_files:
+    ):
         backups.append({
             "filename": backup_file.name,
             "size": backup_file.stat().st_size,
-            "created": datetime.fromtimestamp(backup_file.stat().st_mtime).isoformat()
+            "created": datetime.fromtimestamp(backup_file.stat().st_mtime).isoformat(),
+            "type": "full",
         })
 
     return {"backups": backups}
@@ -474,24 +702,84 @@ def download_backup(
     filename: str,
     current_admin: models.User = Depends(get_current_admin)
 ):
-    """Download a specific backup file (admin only)"""
-    BACKUP_DIR = Path("backups")
-    backup_path = BACKUP_DIR / filename
+    """Download a backup (admin only)
+
+    filename is a snapshot id (rebuilt on the fly into a plain SQLite file),
+    a full-copy .db backup or a compressed Postgres dump.
+    """
+    import tempfile
+    from starlette.background import BackgroundTask
 
     # Security: ensure filename doesn't contain path traversal
     if ".." in filename or "/" in filename:
         raise HTTPException(status_code=400, detail="Invalid filename")
 
-    if not backup_path.exists():
-        raise HTTPException(status_code=404, detail="Backup not found")
+    if ".sql." in filename:
+        try:
+            dump_path = backup.dump_path(filename)
+        except backup.BackupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return FileResponse(path=str(dump_path), filename=filename, media_type="application/octet-stream")
+
+    if filename.endswith(".db"):
+        backup_path = backup.BACKUP_DIR / filename
+        if not backup_path.exists():
+            raise HTTPException(status_code=404, detail="Backup not found")
+        return FileResponse(
+            path=str(backup_path),
+            filename=filename,
+            media_type="application/x-sqlite3"
+        )
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        backup.restore_snapshot(filename, Path(tmp_path))
+    except backup.BackupError as e:
+        os.remove(tmp_path)
+        raise HTTPException(status_code=404, detail=str(e))
 
     return FileResponse(
-        path=str(backup_path),
-        filename=filename,
-        media_type="application/x-sqlite3"
+        path=tmp_path,
+        filename=f"tag_diary_backup_{filename}.db",
+        media_type="application/x-sqlite3",
+        background=BackgroundTask(os.remove, tmp_path)
     )
 
 
+def _run_media_backup():
+    """Background task: media snapshot + retention (can take a while on a first run)"""
+    try:
+        snapshot = media_backup.create_snapshot(prune=True)
+        retention = snapshot['retention']
+        log.info("Media snapshot created", extra={
+            "snapshot_id": snapshot['id'],
+            "changed_files": snapshot['changed_files'],
+            "stored_bytes": snapshot['stored_bytes'],
+            "removed_snapshots": len(retention['removed_snapshots']),
+        })
+    except Exception:
+        log.exception("Media backup failed")
+
+
+@app.post("/api/admin/media-backup", status_code=202)
+def create_media_backup(
+    background_tasks: BackgroundTasks,
+    current_admin: models.User = Depends(get_current_admin)
+):
+    """Start an incremental snapshot of uploads/ or the bucket (admin only)"""
+    if media_backup.is_running():
+        raise HTTPException(status_code=409, detail="A media backup is already running")
+    background_tasks.add_task(_run_media_backup)
+    return {"message": "Media backup started", "source": media_backup.default_source()}
+
+
+@app.get("/api/admin/media-backups")
+def list_media_backups(current_admin: models.User = Depends(get_current_admin)):
+    """List media library snapshots (admin only)"""
+    return {"running": media_backup.is_running(), "backups": media_backup.list_snapshots()}
+
+
 # Authentication routes
 @app.post("/api/auth/register", response_model=schemas.User)
 def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
@@ -559,11 +847,8 @@ def login(
     password: str = Form(...),
     db: Session = Depends(get_db)
 ):
-    print(f"[LOGIN] Attempt for username: '{username}'")
-
     # Validate input
     if not username or not password:
-        print(f"[LOGIN] Failed - Missing credentials")
         raise HTTPException(
             status_code=400,
             detail="Username and password are required"
@@ -571,13 +856,13 @@ def login(
 
     user = authenticate_user(db, username, password)
     if not user:
-        print(f"[LOGIN] Failed - Invalid credentials for username: '{username}'")
+        log.info("Login failed", extra={"username": username})
         raise HTTPException(
             status_code=401,
             detail="Incorrect username or password"
         )
 
-    print(f"[LOGIN] Success for username: '{username}'")
+    log.info("Login succeeded", extra={"username": username, "sampled": True})
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -701,7 +986,7 @@ def auth_health(db: Session = Depends(get_db)):
             "user_count": user_count
         }
     except Exception as e:
-        print(f"[HEALTH CHECK] Database error: {str(e)}")
+        log.error("Health check database error", extra={"error": str(e)})
         return {
             "status": "error",
             "database": "disconnected",
@@ -720,8 +1005,6 @@ def initialize_first_admin(user: schemas.UserInitialize, db: Session = Depends(g
             detail="Database already has users. Use regular registration."
         )
 
-    print(f"[INIT] Creating first admin user: {user.username}")
-
     # Create first admin user
     db_user = models.User(
         username=user.username,
@@ -736,7 +1019,7 @@ def initialize_first_admin(user: schemas.UserInitialize, db: Session = Depends(g
     db.commit()
     db.refresh(db_user)
 
-    print(f"[INIT] First admin user created successfully: {user.username}")
+    log.info("First admin user created", extra={"username": user.username})
     return db_user
 
 
@@ -761,7 +1044,7 @@ def request_password_reset(
 
     # In a real application, you would send an email here
     # For development/testing, we'll return the token
-    print(f"[PASSWORD RESET] Token for {user.email}: {reset_token}")
+    log.info("Password reset requested", extra={"user_id": user.id})
 
     return {
         "message": "If an account exists with this email, a reset link has been sent.",
@@ -855,6 +1138,7 @@ def create_vignette(
                 db.add(vignette_photo)
 
     db.commit()
+    cache.bump("vignettes")
     db.refresh(db_vignette)
 
     # Load photos for response - manually build the list for serialization
@@ -874,65 +1158,54 @@ def create_vignette(
     }
 
 
-@app.get("/api/vignettes", response_model=List[schemas.Vignette])
-def get_vignettes(
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    # Show all vignettes to all users (family website - shared content)
+def _vignette_rows(db: Session, vignette_ids: Optional[List[int]] = None) -> List[dict]:
+    """Vignettes (all, or the given ids) as dicts with their photos, in two queries"""
     # Sort by sort_order (ascending), then by created_at (desc) as fallback
-    vignettes = db.query(models.Vignette).order_by(
+    query = select(*schema_columns(schemas.Vignette, models.Vignette), models.Vignette.sort_order).order_by(
         models.Vignette.sort_order.asc(),
         models.Vignette.created_at.desc()
-    ).all()
+    )
+    photo_query = (
+        select(models.VignettePhoto.vignette_id, *schema_columns(schemas.Photo, models.Photo))
+        .join(models.Photo, models.Photo.id == models.VignettePhoto.photo_id)
+        .order_by(models.VignettePhoto.vignette_id, models.VignettePhoto.position)
+    )
+    if vignette_ids is not None:
+        query = query.where(models.Vignette.id.in_(vignette_ids))
+        photo_query = photo_query.where(models.VignettePhoto.vignette_id.in_(vignette_ids))
 
-    # Add photos to each vignette - return as dictionaries
-    result = []
+    vignettes = rows_to_dicts(db.execute(query))
+    photos = group_by(rows_to_dicts(db.execute(photo_query)), "vignette_id") if vignettes else {}
     for vignette in vignettes:
-        vignette_photos = db.query(models.VignettePhoto).filter(
-            models.VignettePhoto.vignette_id == vignette.id
-        ).order_by(models.VignettePhoto.position).all()
-        result.append({
-            "id": vignette.id,
-            "title": vignette.title,
-            "content": vignette.content,
-            "author_id": vignette.author_id,
-            "created_at": vignette.created_at,
-            "updated_at": vignette.updated_at,
-            "photos": [vp.photo for vp in vignette_photos]
-        })
+        vignette["photos"] = photos.get(vignette["id"], [])
+    return vignettes
 
-    return result
+
+@app.get("/api/vignettes", response_model=List[schemas.Vignette])
+def get_vignettes(
+    request: Request,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Show all vignettes to all users (family website - shared content)
+    return cache.cached(request, ("vignettes", "photos"), lambda: _vignette_rows(db))
 
 
 @app.get("/api/vignettes/{vignette_id}", response_model=schemas.Vignette)
 def get_vignette(
     vignette_id: int,
+    request: Request,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     # Show all vignettes to all users (family website - shared content)
-    vignette = db.query(models.Vignette).filter(
-        models.Vignette.id == vignette_id
-    ).first()
-    if not vignette:
-        raise HTTPException(status_code=404, detail="Vignette not found")
-
-    # Load photos for this vignette
-    vignette_photos = db.query(models.VignettePhoto).filter(
-        models.VignettePhoto.vignette_id == vignette.id
-    ).order_by(models.VignettePhoto.position).all()
+    def build():
+        vignettes = _vignette_rows(db, [vignette_id])
+        if not vignettes:
+            raise HTTPException(status_code=404, detail="Vignette not found")
+        return vignettes[0]
 
-    # Return a dictionary instead of SQLAlchemy object to avoid relationship issues
-    return {
-        "id": vignette.id,
-        "title": vignette.title,
-        "content": vignette.content,
-        "author_id": vignette.author_id,
-        "created_at": vignette.created_at,
-        "updated_at": vignette.updated_at,
-        "photos": [vp.photo for vp in vignette_photos]
-    }
+    return cache.cached(request, ("vignettes", "photos"), build)
 
 
 @app.put("/api/vignettes/{vignette_id}", response_model=schemas.Vignette)
@@ -971,6 +1244,7 @@ def update_vignette(
             )
             db.add(vignette_photo)
         db.commit()
+    cache.bump("vignettes")
 
     db.refresh(db_vignette)
 
@@ -1014,6 +1288,7 @@ def patch_vignette(
         db_vignette.created_at = vignette.created_at
 
     db.commit()
+    cache.bump("vignettes")
     db.refresh(db_vignette)
     return db_vignette
 
@@ -1024,13 +1299,10 @@ def delete_vignette(
     current_admin: models.User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    print(f"[DELETE VIGNETTE] Attempt to delete vignette ID: {vignette_id} by admin: {current_admin.username}")
-
     vignette = db.query(models.Vignette).filter(
         models.Vignette.id == vignette_id
     ).first()
     if not vignette:
-        print(f"[DELETE VIGNETTE] Vignette {vignette_id} not found")
         raise HTTPException(status_code=404, detail="Vignette not found")
 
     # Delete associated vignette_photos first
@@ -1040,16 +1312,26 @@ def delete_vignette(
     for vp in vignette_photos:
         db.delete(vp)
 
-    print(f"[DELETE VIGNETTE] Deleted {len(vignette_photos)} associated photos")
-
     # Now delete the vignette
     db.delete(vignette)
     db.commit()
+    cache.bump("vignettes")
 
-    print(f"[DELETE VIGNETTE] Successfully deleted vignette {vignette_id}")
+    log.info("Vignette deleted", extra={
+        "vignette_id": vignette_id, "photo_links": len(vignette_photos), "admin": current_admin.username
+    })
     return {"message": "Vignette deleted"}
 
 
+def _apply_sort_order(db: Session, model, orders: List[dict]):
+    """Set sort_order from [{"id", "sort_order"}, ...], loading the rows in one query"""
+    rows = {row.id: row for row in db.query(model).filter(model.id.in_([item["id"] for item in orders]))}
+    for item in orders:
+        row = rows.get(item["id"])
+        if row:
+            row.sort_order = item["sort_order"]
+
+
 @app.post("/api/vignettes/reorder")
 def reorder_vignettes(
     vignette_orders: List[dict],
@@ -1061,12 +1343,10 @@ def reorder_vignettes(
     Expects: [{"id": 1, "sort_order": 0}, {"id": 2, "sort_order": 1}, ...]
     """
     try:
-        for item in vignette_orders:
-            vignette = db.query(models.Vignette).filter(models.Vignette.id == item["id"]).first()
-            if vignette:
-                vignette.sort_order = item["sort_order"]
+        _apply_sort_order(db, models.Vignette, vignette_orders)
 
         db.commit()
+        cache.bump("vignettes")
         return {"message": "Vignettes reordered successfully"}
     except Exception as e:
         db.rollback()
@@ -1074,6 +1354,10 @@ def reorder_vignettes(
 
 
 # Photo routes
+PHOTO_BATCH_WORKERS = int(os.getenv("PHOTO_BATCH_WORKERS", "4"))
+PHOTO_BATCH_MAX_FILES = int(os.getenv("PHOTO_BATCH_MAX_FILES", "500"))
+
+
 @app.post("/api/photos", response_model=schemas.Photo)
 def upload_photo(
     file: UploadFile = File(...),
@@ -1082,107 +1366,102 @@ def upload_photo(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    from PIL import Image
-    import io
-    from datetime import datetime
-
-    # Get file extension and check if it's HEIC
-    file_extension = Path(file.filename).suffix.lower()
-    is_heic = file_extension in ['.heic', '.heif']
-
-    # Variable to store extracted photo date
-    photo_taken_at = None
-
-    # If HEIC, convert to JPEG
-    if is_heic:
-        from pillow_heif import register_heif_opener
-
-        # Register HEIF opener with Pillow
-        register_heif_opener()
-
-        # Read the uploaded HEIC file
-        file_content = file.file.read()
-
-        # Open with Pillow and convert to JPEG
-        img = Image.open(io.BytesIO(file_content))
+    ingested = ingest.ingest_photo(file.file, file.filename, file.content_type)
 
-        # Extract EXIF data before conversion
-        try:
-            exif = img.getexif()
-            if exif:
-                # EXIF tag 36867 is DateTimeOriginal (when photo was taken)
-                # EXIF tag 306 is DateTime (when photo was last modified)
-                date_taken = exif.get(36867) or exif.get(306)
-                if date_taken:
-                    # Parse EXIF date format: "YYYY:MM:DD HH:MM:SS"
-                    photo_taken_at = datetime.strptime(date_taken, "%Y:%m:%d %H:%M:%S")
-                    print(f"[UPLOAD PHOTO] Extracted EXIF date: {photo_taken_at}")
-        except Exception as e:
-            print(f"[UPLOAD PHOTO] Could not extract EXIF date: {str(e)}")
-
-        # Convert to RGB if necessary (HEIC can have different color modes)
-        if img.mode not in ('RGB', 'L'):
-            img = img.convert('RGB')
+    # Create database record
+    db_photo = ingest.new_photo(
+        ingested,
+        title=title or file.filename,
+        description=description,
+        uploaded_by_id=current_user.id,
+    )
+    db.add(db_photo)
+    db.commit()
+    cache.bump("photos")
+    db.refresh(db_photo)
+    return db_photo
 
-        # Save as JPEG
-        file_extension = '.jpg'
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
 
-        # Save to BytesIO buffer for cloud upload
-        img_buffer = io.BytesIO()
-        img.save(img_buffer, 'JPEG', quality=95)
-        img_buffer.seek(0)
+@app.post("/api/photos/batch", response_model=schemas.PhotoBatchResult)
+def upload_photos_batch(
+    files: List[UploadFile] = File(...),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Upload many photos in one multipart request
 
-        # Upload to cloud storage or local
-        file_url = storage.upload_file(img_buffer, unique_filename, "photos", "image/jpeg")
-        print(f"[UPLOAD PHOTO] Converted HEIC to JPEG: {unique_filename}")
-    else:
-        # Save file normally for non-HEIC files
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
+    Conversion, EXIF extraction and storage uploads run concurrently on a
+    bounded pool (PHOTO_BATCH_WORKERS); all rows are inserted in a single
+    transaction. A file that fails is reported in its own result item and
+    does not fail the rest of the batch.
+    """
+    from concurrent.futures import ThreadPoolExecutor
 
-        # Read file content to extract EXIF
-        file_content = file.file.read()
+    if len(files) > PHOTO_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files in one batch (max {PHOTO_BATCH_MAX_FILES})"
+        )
 
-        # Try to extract EXIF data from the image
+    def ingest_one(file: UploadFile):
         try:
-            img = Image.open(io.BytesIO(file_content))
-            exif = img.getexif()
-            if exif:
-                # EXIF tag 36867 is DateTimeOriginal (when photo was taken)
-                # EXIF tag 306 is DateTime (when photo was last modified)
-                date_taken = exif.get(36867) or exif.get(306)
-                if date_taken:
-                    # Parse EXIF date format: "YYYY:MM:DD HH:MM:SS"
-                    photo_taken_at = datetime.strptime(date_taken, "%Y:%m:%d %H:%M:%S")
-                    print(f"[UPLOAD PHOTO] Extracted EXIF date: {photo_taken_at}")
+            # Each part is already spooled to disk by the multipart parser; stream it from there
+            return ingest.ingest_photo(file.file, file.filename, file.content_type), None
         except Exception as e:
-            print(f"[UPLOAD PHOTO] Could not extract EXIF date: {str(e)}")
+            log.warning("Failed to ingest photo", extra={"upload_filename": file.filename, "error": str(e)})
+            return None, str(e)
+
+    with ThreadPoolExecutor(max_workers=PHOTO_BATCH_WORKERS) as pool:
+        outcomes = list(pool.map(ingest_one, files))
+
+    db_photos = {}
+    for idx, (file, (ingested, error)) in enumerate(zip(files, outcomes)):
+        if ingested:
+            db_photos[idx] = ingest.new_photo(
+                ingested,
+                title=file.filename,
+                uploaded_by_id=current_user.id,
+            )
 
-        # Upload to cloud storage or local
-        file_url = storage.upload_file(
-            io.BytesIO(file_content),
-            unique_filename,
-            "photos",
-            file.content_type
+    try:
+        db.add_all(db_photos.values())
+        db.flush()
+        photo_ids = {idx: db_photo.id for idx, db_photo in db_photos.items()}
+        db.commit()
+        cache.bump("photos")
+    except Exception as e:
+        db.rollback()
+        # Nothing was recorded, so don't leave orphaned objects in storage
+        for db_photo in db_photos.values():
+            try:
+                storage.delete_file(db_photo.file_path)
+            except Exception as cleanup_error:
+                log.warning("Failed to delete unsaved photo", extra={"file_path": db_photo.file_path, "error": str(cleanup_error)})
+        raise HTTPException(status_code=500, detail=f"Failed to save photos: {str(e)}")
+
+    # The commit expired every row; read them all back in one query, not one per photo
+    photos = {}
+    if photo_ids:
+        rows = db.execute(
+            select(*schema_columns(schemas.Photo, models.Photo)).where(models.Photo.id.in_(photo_ids.values()))
         )
+        photos = {row["id"]: row for row in rows_to_dicts(rows)}
 
-    # Create database record
-    db_photo = models.Photo(
-        filename=unique_filename,
-        file_path=file_url,  # Store URL instead of local path
-        title=title or file.filename,
-        description=description,
-        uploaded_by_id=current_user.id,
-        taken_at=photo_taken_at,
-    )
-    db.add(db_photo)
-    db.commit()
-    db.refresh(db_photo)
-    return db_photo
+    results = []
+    for idx, (file, (ingested, error)) in enumerate(zip(files, outcomes)):
+        if idx in photo_ids:
+            results.append({"filename": file.filename, "status": "ok", "photo": photos[photo_ids[idx]]})
+        else:
+            results.append({"filename": file.filename, "status": "error", "error": error})
+
+    uploaded = len(db_photos)
+    log.info("Photo batch uploaded", extra={"uploaded": uploaded, "files": len(files), "username": current_user.username})
+    return {"uploaded": uploaded, "failed": len(files) - uploaded, "results": results}
 
 
 @app.get("/api/photos", response_model=List[schemas.Photo])
 def get_photos(
+    request: Request,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db),
     skip: int = 0,
@@ -1190,11 +1469,16 @@ def get_photos(
 ):
     # Show all photos to all users (family website - shared content)
     # Sort by sort_order (ascending), then by created_at (desc) as fallback
-    photos = db.query(models.Photo).order_by(
-        models.Photo.sort_order.asc(),
-        models.Photo.created_at.desc()
-    ).offset(skip).limit(limit).all()
-    return photos
+    def build():
+        photos = db.execute(
+            select(*schema_columns(schemas.Photo, models.Photo), models.Photo.sort_order).order_by(
+                models.Photo.sort_order.asc(),
+                models.Photo.created_at.desc()
+            ).offset(skip).limit(limit)
+        )
+        return FastJSONResponse(rows_to_dicts(photos))
+
+    return cache.cached(request, ("photos",), build)
 
 
 @app.get("/api/photos/{photo_id}")
@@ -1212,20 +1496,32 @@ def get_photo_file(
     return FileResponse(photo.file_path)
 
 
+@app.get("/api/photos/{photo_id}/metadata", response_model=schemas.PhotoMetadata)
+def get_photo_metadata(
+    photo_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Parsed dimensions, orientation, camera and GPS info for a photo"""
+    photo_metadata = db.query(models.PhotoMetadata).filter(
+        models.PhotoMetadata.photo_id == photo_id
+    ).first()
+    if not photo_metadata:
+        raise HTTPException(status_code=404, detail="Photo metadata not found")
+    return photo_metadata
+
+
 @app.delete("/api/photos/{photo_id}")
 def delete_photo(
     photo_id: int,
     current_admin: models.User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    print(f"[DELETE PHOTO] Attempt to delete photo ID: {photo_id} by admin: {current_admin.username}")
-
     photo = db.query(models.Photo).filter(
         models.Photo.id == photo_id
     ).first()
 
     if not photo:
-        print(f"[DELETE PHOTO] Photo {photo_id} not found")
         raise HTTPException(status_code=404, detail="Photo not found")
 
     # Delete all related records first (to avoid foreign key constraint errors)
@@ -1236,7 +1532,6 @@ def delete_photo(
     ).all()
     for ap in album_photos:
         db.delete(ap)
-    print(f"[DELETE PHOTO] Deleted {len(album_photos)} album associations")
 
     # Delete from vignette_photos
     vignette_photos = db.query(models.VignettePhoto).filter(
@@ -1244,7 +1539,11 @@ def delete_photo(
     ).all()
     for vp in vignette_photos:
         db.delete(vp)
-    print(f"[DELETE PHOTO] Deleted {len(vignette_photos)} vignette associations")
+
+    # Delete parsed metadata
+    db.query(models.PhotoMetadata).filter(
+        models.PhotoMetadata.photo_id == photo_id
+    ).delete(synchronize_session=False)
 
     # Delete from photo_people
     photo_people = db.query(models.PhotoPerson).filter(
@@ -1252,21 +1551,26 @@ def delete_photo(
     ).all()
     for pp in photo_people:
         db.delete(pp)
-    print(f"[DELETE PHOTO] Deleted {len(photo_people)} people tags")
 
     # Delete the physical file from cloud or local storage
     try:
         storage.delete_file(photo.file_path)
-        print(f"[DELETE PHOTO] Deleted file: {photo.file_path}")
     except Exception as e:
-        print(f"[DELETE PHOTO] Error deleting file: {str(e)}")
+        log.warning("Could not delete photo file", extra={"photo_id": photo_id, "error": str(e)})
         # Continue with database deletion even if file deletion fails
 
     # Delete from database
     db.delete(photo)
     db.commit()
-
-    print(f"[DELETE PHOTO] Successfully deleted photo {photo_id}")
+    cache.bump("photos")
+
+    log.info("Photo deleted", extra={
+        "photo_id": photo_id,
+        "album_links": len(album_photos),
+        "vignette_links": len(vignette_photos),
+        "people_tags": len(photo_people),
+        "admin": current_admin.username,
+    })
     return {"message": "Photo deleted successfully"}
 
 
@@ -1294,6 +1598,7 @@ def update_photo(
         photo.taken_at = photo_update.taken_at
 
     db.commit()
+    cache.bump("photos")
     db.refresh(photo)
     return photo
 
@@ -1309,12 +1614,10 @@ def reorder_photos(
     Expects: [{"id": 1, "sort_order": 0}, {"id": 2, "sort_order": 1}, ...]
     """
     try:
-        for item in photo_orders:
-            photo = db.query(models.Photo).filter(models.Photo.id == item["id"]).first()
-            if photo:
-                photo.sort_order = item["sort_order"]
+        _apply_sort_order(db, models.Photo, photo_orders)
 
         db.commit()
+        cache.bump("photos")
         return {"message": "Photos reordered successfully"}
     except Exception as e:
         db.rollback()
@@ -1351,65 +1654,78 @@ def create_album(
                 db.add(album_photo)
     
     db.commit()
+    cache.bump("albums")
     return db_album
 
 
+def _album_rows(db: Session, album_ids: Optional[List[int]] = None) -> List[dict]:
+    """Albums (all, or the given ids) as dicts with photo counts, in one query"""
+    # Photo counts for every album in one grouped subquery
+    counts = select(
+        models.AlbumPhoto.album_id,
+        func.count(models.AlbumPhoto.id).label("photo_count")
+    ).group_by(models.AlbumPhoto.album_id).subquery()
+
+    # Sort by sort_order (ascending), then by created_at (desc) as fallback
+    query = (
+        select(
+            *schema_columns(schemas.Album, models.Album),
+            func.coalesce(counts.c.photo_count, 0).label("photo_count"),
+            models.Album.sort_order
+        )
+        .outerjoin(counts, counts.c.album_id == models.Album.id)
+        .order_by(models.Album.sort_order.asc(), models.Album.created_at.desc())
+    )
+    if album_ids is not None:
+        query = query.where(models.Album.id.in_(album_ids))
+    return rows_to_dicts(db.execute(query))
+
+
 @app.get("/api/albums", response_model=List[schemas.Album])
 def get_albums(
+    request: Request,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     # Show all albums to all users (family website - shared content)
-    # Sort by sort_order (ascending), then by created_at (desc) as fallback
-    albums = db.query(models.Album).order_by(
-        models.Album.sort_order.asc(),
-        models.Album.created_at.desc()
-    ).all()
-
-    # Add photo count to each album
-    for album in albums:
-        photo_count = db.query(models.AlbumPhoto).filter(
-            models.AlbumPhoto.album_id == album.id
-        ).count()
-        album.photo_count = photo_count
-
-    return albums
+    return cache.cached(request, ("albums", "photos"), lambda: FastJSONResponse(_album_rows(db)))
 
 
 @app.get("/api/albums/{album_id}")
 def get_album(
     album_id: int,
+    request: Request,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     # Show all albums to all users (family website - shared content)
-    album = db.query(models.Album).filter(
-        models.Album.id == album_id
-    ).first()
-
-    if not album:
-        raise HTTPException(status_code=404, detail="Album not found")
-
-    # Get all photos in the album
-    album_photos = db.query(models.AlbumPhoto).filter(
-        models.AlbumPhoto.album_id == album_id
-    ).all()
+    def build():
+        album = db.query(models.Album).filter(
+            models.Album.id == album_id
+        ).first()
+
+        if not album:
+            raise HTTPException(status_code=404, detail="Album not found")
+
+        # Get all photos in the album, in the order they were added
+        photos = rows_to_dicts(db.execute(
+            select(*schema_columns(schemas.Photo, models.Photo))
+            .join(models.AlbumPhoto, models.AlbumPhoto.photo_id == models.Photo.id)
+            .where(models.AlbumPhoto.album_id == album_id)
+            .order_by(models.AlbumPhoto.id)
+        ))
 
-    photos = []
-    for ap in album_photos:
-        photo = db.query(models.Photo).filter(models.Photo.id == ap.photo_id).first()
-        if photo:
-            photos.append(photo)
+        return {
+            "id": album.id,
+            "name": album.name,
+            "description": album.description,
+            "created_by_id": album.created_by_id,
+            "created_at": album.created_at,
+            "photo_count": len(photos),
+            "photos": photos
+        }
 
-    return {
-        "id": album.id,
-        "name": album.name,
-        "description": album.description,
-        "created_by_id": album.created_by_id,
-        "created_at": album.created_at,
-        "photo_count": len(photos),
-        "photos": photos
-    }
+    return cache.cached(request, ("albums", "photos"), build)
 
 
 @app.post("/api/albums/{album_id}/photos/{photo_id}")
@@ -1453,6 +1769,7 @@ def add_photo_to_album(
     )
     db.add(album_photo)
     db.commit()
+    cache.bump("albums")
 
     return {"message": "Photo added to album"}
 
@@ -1484,6 +1801,7 @@ def remove_photo_from_album(
 
     db.delete(album_photo)
     db.commit()
+    cache.bump("albums")
 
     return {"message": "Photo removed from album"}
 
@@ -1510,6 +1828,7 @@ def delete_album(
     # Delete the album
     db.delete(album)
     db.commit()
+    cache.bump("albums")
 
     return {"message": "Album deleted successfully"}
 
@@ -1525,12 +1844,10 @@ def reorder_albums(
     Expects: [{"id": 1, "sort_order": 0}, {"id": 2, "sort_order": 1}, ...]
     """
     try:
-        for item in album_orders:
-            album = db.query(models.Album).filter(models.Album.id == item["id"]).first()
-            if album:
-                album.sort_order = item["sort_order"]
+        _apply_sort_order(db, models.Album, album_orders)
 
         db.commit()
+        cache.bump("albums")
         return {"message": "Albums reordered successfully"}
     except Exception as e:
         db.rollback()
@@ -1579,22 +1896,216 @@ async def upload_album_background(
     # Update album with new background image URL
     album.background_image = file_url
     db.commit()
+    cache.bump("albums")
     db.refresh(album)
 
     return {"message": "Background uploaded successfully", "background_image": file_url}
 
 
+# People tagging routes
+PEOPLE_PAGE_MAX = 200
+
+
+def _photos_with_people(db: Session, person_ids: List[int], cursor: Optional[int], limit: int):
+    """Keyset page of photos tagged with every person in person_ids (newest id first)
+
+    A single person is a plain index range scan on (person_id, photo_id).
+    Several people are intersected in SQL by grouping the matching tag rows
+    per photo and keeping photos that matched all of them, so the work is
+    bounded by the tag rows of the requested people, not the archive size.
+    """
+    person_ids = sorted(set(person_ids))
+    limit = max(1, min(limit, PEOPLE_PAGE_MAX))
+
+    tagged = db.query(models.PhotoPerson.photo_id).filter(
+        models.PhotoPerson.person_id.in_(person_ids)
+    )
+    if cursor is not None:
+        tagged = tagged.filter(models.PhotoPerson.photo_id < cursor)
+    if len(person_ids) > 1:
+        tagged = tagged.group_by(models.PhotoPerson.photo_id).having(
+            func.count(func.distinct(models.PhotoPerson.person_id)) == len(person_ids)
+        )
+
+    photo_ids = [
+        row[0] for row in tagged.order_by(models.PhotoPerson.photo_id.desc()).limit(limit).all()
+    ]
+    if not photo_ids:
+        return {"photos": [], "next_cursor": None}
+
+    photos = db.query(models.Photo).filter(
+        models.Photo.id.in_(photo_ids)
+    ).order_by(models.Photo.id.desc()).all()
+
+    return {
+        "photos": photos,
+        "next_cursor": photo_ids[-1] if len(photo_ids) == limit else None,
+    }
+
+
+@app.post("/api/people", response_model=schemas.Person)
+def create_person(
+    person: schemas.PersonCreate,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    db_person = models.Person(name=person.name)
+    db.add(db_person)
+    db.commit()
+    db.refresh(db_person)
+    return db_person
+
+
+@app.get("/api/people", response_model=List[schemas.Person])
+def get_people(
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return db.query(models.Person).order_by(models.Person.name.asc()).all()
+
+
+@app.delete("/api/people/{person_id}")
+def delete_person(
+    person_id: int,
+    current_admin: models.User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Delete a person and all of their photo tags (admin only)"""
+    person = db.query(models.Person).filter(models.Person.id == person_id).first()
+    if not person:
+        raise HTTPException(status_code=404, detail="Person not found")
+
+    db.query(models.PhotoPerson).filter(
+        models.PhotoPerson.person_id == person_id
+    ).delete(synchronize_session=False)
+    db.delete(person)
+    db.commit()
+    return {"message": "Person deleted"}
+
+
+@app.post("/api/people/tags")
+def tag_people(
+    tags: schemas.PhotoPeopleTags,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Tag every given person on every given photo. Existing tags are left alone.
+
+    Expects: {"photo_ids": [1, 2, 3], "person_ids": [4, 5]}
+    """
+    photo_ids = {
+        row[0] for row in db.query(models.Photo.id).filter(models.Photo.id.in_(set(tags.photo_ids))).all()
+    }
+    person_ids = {
+        row[0] for row in db.query(models.Person.id).filter(models.Person.id.in_(set(tags.person_ids))).all()
+    }
+    if len(photo_ids) != len(set(tags.photo_ids)):
+        raise HTTPException(status_code=404, detail="One or more photos not found")
+    if len(person_ids) != len(set(tags.person_ids)):
+        raise HTTPException(status_code=404, detail="One or more people not found")
+
+    existing = set(
+        db.query(models.PhotoPerson.photo_id, models.PhotoPerson.person_id).filter(
+            models.PhotoPerson.photo_id.in_(photo_ids),
+            models.PhotoPerson.person_id.in_(person_ids)
+        ).all()
+    )
+    new_tags = [
+        {"photo_id": photo_id, "person_id": person_id}
+        for photo_id in photo_ids
+        for person_id in person_ids
+        if (photo_id, person_id) not in existing
+    ]
+    if new_tags:
+        db.bulk_insert_mappings(models.PhotoPerson, new_tags)
+    db.commit()
+
+    return {"message": f"Added {len(new_tags)} tags", "added_count": len(new_tags)}
+
+
+@app.post("/api/people/untag")
+def untag_people(
+    tags: schemas.PhotoPeopleTags,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Remove every given person from every given photo
+
+    Expects: {"photo_ids": [1, 2, 3], "person_ids": [4, 5]}
+    """
+    removed = db.query(models.PhotoPerson).filter(
+        models.PhotoPerson.photo_id.in_(set(tags.photo_ids)),
+        models.PhotoPerson.person_id.in_(set(tags.person_ids))
+    ).delete(synchronize_session=False)
+    db.commit()
+
+    return {"message": f"Removed {removed} tags", "removed_count": removed}
+
+
+@app.get("/api/people/by-photo", response_model=List[schemas.PhotoPeople])
+def get_people_by_photo(
+    photo_ids: List[int] = Query(...),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Batch lookup of the people tagged on each photo, e.g. ?photo_ids=1&photo_ids=2"""
+    rows = db.query(models.PhotoPerson.photo_id, models.Person).join(
+        models.Person, models.Person.id == models.PhotoPerson.person_id
+    ).filter(
+        models.PhotoPerson.photo_id.in_(set(photo_ids))
+    ).order_by(models.Person.name.asc()).all()
+
+    people_by_photo = {photo_id: [] for photo_id in dict.fromkeys(photo_ids)}
+    for photo_id, person in rows:
+        people_by_photo[photo_id].append(person)
+
+    return [
+        {"photo_id": photo_id, "people": people}
+        for photo_id, people in people_by_photo.items()
+    ]
+
+
+@app.get("/api/people/photos", response_model=schemas.PhotoPage)
+def get_photos_with_people(
+    person_ids: List[int] = Query(...),
+    cursor: Optional[int] = None,
+    limit: int = 50,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Photos containing ALL of the given people, e.g. ?person_ids=1&person_ids=2
+
+    Pass the returned next_cursor back as cursor to fetch the next page.
+    """
+    return _photos_with_people(db, person_ids, cursor, limit)
+
+
+@app.get("/api/people/{person_id}/photos", response_model=schemas.PhotoPage)
+def get_person_photos(
+    person_id: int,
+    cursor: Optional[int] = None,
+    limit: int = 50,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Photos a person is tagged in, newest first, with keyset paging via next_cursor"""
+    person = db.query(models.Person).filter(models.Person.id == person_id).first()
+    if not person:
+        raise HTTPException(status_code=404, detail="Person not found")
+
+    return _photos_with_people(db, [person_id], cursor, limit)
+
+
 # Audio recording routes
 @app.post("/api/audio", response_model=schemas.AudioRecording)
 async def upload_audio(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: Optional[str] = Form(None),
     description: Optional[str] = Form(None),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    print(f"[UPLOAD AUDIO] User: {current_user.username}, Filename: {file.filename}, Content-Type: {file.content_type}")
-
     # Handle file extension - use .webm if no extension or if it's a blob
     file_extension = Path(file.filename).suffix if file.filename else '.webm'
     if not file_extension or file_extension == '':
@@ -1610,8 +2121,6 @@ async def upload_audio(
 
     unique_filename = f"{uuid.uuid4()}{file_extension}"
 
-    print(f"[UPLOAD AUDIO] Uploading: {unique_filename}")
-
     try:
         # Read file content
         file_content = await file.read()
@@ -1625,8 +2134,6 @@ async def upload_audio(
             file.content_type
         )
 
-        print(f"[UPLOAD AUDIO] File uploaded successfully, size: {file_size} bytes")
-
         db_audio = models.AudioRecording(
             filename=unique_filename,
             file_path=file_url,
@@ -1638,10 +2145,16 @@ async def upload_audio(
         db.commit()
         db.refresh(db_audio)
 
-        print(f"[UPLOAD AUDIO] Database record created, ID: {db_audio.id}")
+        log.info("Audio uploaded", extra={
+            "audio_id": db_audio.id, "size": file_size, "content_type": file.content_type, "username": current_user.username
+        })
+
+        # Duration and waveform peaks are filled in after the response is sent
+        background_tasks.add_task(audio_analysis.analyse_recording_task, db_audio.id)
+        background_tasks.add_task(transcode.transcode_recording_task, db_audio.id)
         return db_audio
     except Exception as e:
-        print(f"[UPLOAD AUDIO] Error: {str(e)}")
+        log.exception("Audio upload failed", extra={"upload_filename": file.filename})
         raise HTTPException(status_code=500, detail=f"Failed to save audio file: {str(e)}")
 
 
@@ -1651,16 +2164,25 @@ def get_audio_recordings(
     db: Session = Depends(get_db)
 ):
     # Show all audio recordings to all users (family website - shared content)
-    recordings = db.query(models.AudioRecording).order_by(models.AudioRecording.created_at.desc()).all()
-    return recordings
+    recordings = db.execute(
+        select(*schema_columns(schemas.AudioRecording, models.AudioRecording))
+        .order_by(models.AudioRecording.created_at.desc())
+    )
+    return FastJSONResponse(rows_to_dicts(recordings))
 
 
 @app.get("/api/audio/{audio_id}")
 def get_audio_file(
     audio_id: int,
+    request: Request,
+    rendition: str = "auto",
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """Serve a recording, preferring a transcoded streaming rendition when one exists
+
+    rendition: "auto" (negotiate from Accept), "original", "opus", "aac" or "hls"
+    """
     # Show all audio recordings to all users (family website - shared content)
     audio = db.query(models.AudioRecording).filter(
         models.AudioRecording.id == audio_id
@@ -1668,12 +2190,152 @@ def get_audio_file(
     if not audio:
         raise HTTPException(status_code=404, detail="Audio recording not found")
 
+    chosen = transcode.pick_rendition(audio.renditions, request.headers.get("accept"), rendition)
+    if rendition not in ("auto", "original") and not chosen:
+        raise HTTPException(status_code=404, detail=f"Rendition '{rendition}' not available")
+
+    if chosen and chosen.kind == "hls":
+        # Segment URIs in the playlist are relative, so serve it from the segment route
+        return RedirectResponse(_hls_playlist_url(audio_id, chosen, current_user))
+
+    file_path = chosen.file_path if chosen else audio.file_path
+    if file_path.startswith('http'):
+        return RedirectResponse(file_path)
+
     return FileResponse(
-        audio.file_path,
+        file_path,
+        media_type=chosen.mime_type if chosen else None,
         headers={
             "Cache-Control": "no-cache, no-store, must-revalidate",
             "Pragma": "no-cache",
-            "Expires": "0"
+            "Expires": "0",
+            "Vary": "Accept",
+        }
+    )
+
+
+@app.get("/api/audio/{audio_id}/renditions", response_model=List[schemas.AudioRendition])
+def get_audio_renditions(
+    audio_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Transcoded versions available for a recording"""
+    return db.query(models.AudioRendition).filter(
+        models.AudioRendition.audio_id == audio_id
+    ).all()
+
+
+# HLS: native players (Safari, iOS) load the playlist and segments themselves
+# and can't send an Authorization header, so playlist URLs carry a media token
+# scoped to the one recording, and the playlist passes it on to its segments.
+def _hls_scope(audio_id: int) -> str:
+    return f"hls:{audio_id}"
+
+
+def _hls_playlist_url(audio_id: int, hls: models.AudioRendition, user: models.User) -> str:
+    playlist_name = hls.file_path.rsplit('/', 1)[-1].split('?')[0]
+    token = create_media_token(user.username, _hls_scope(audio_id))
+    return f"/api/audio/{audio_id}/hls/{playlist_name}?token={token}"
+
+
+def get_hls_user(
+    audio_id: int,
+    token: Optional[str] = None,
+    bearer: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> models.User:
+    """The Bearer user, or the one a ?token= media token for this recording was issued to"""
+    user = user_from_token(db, token, _hls_scope(audio_id)) if token else None
+    if user is None and bearer:
+        user = user_from_token(db, bearer)
+    if user is None:
+        metrics.auth_rejected_tokens.inc()
+        raise HTTPException(status_code=401, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+
+@app.get("/api/audio/{audio_id}/hls-url")
+def get_audio_hls_url(
+    audio_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Signed playlist URL for <audio src> in browsers that play HLS natively"""
+    hls = db.query(models.AudioRendition).filter(
+        models.AudioRendition.audio_id == audio_id,
+        models.AudioRendition.kind == "hls"
+    ).first()
+    if not hls:
+        raise HTTPException(status_code=404, detail="Rendition 'hls' not available")
+    return {"url": _hls_playlist_url(audio_id, hls, current_user), "expires_in": MEDIA_TOKEN_EXPIRE_MINUTES * 60}
+
+
+@app.get("/api/audio/{audio_id}/hls/{name}")
+def get_audio_hls_file(
+    audio_id: int,
+    name: str,
+    token: Optional[str] = None,
+    current_user: models.User = Depends(get_hls_user),
+    db: Session = Depends(get_db)
+):
+    """HLS playlist or segment for a long recording (Bearer header or ?token=)"""
+    hls = db.query(models.AudioRendition).filter(
+        models.AudioRendition.audio_id == audio_id,
+        models.AudioRendition.kind == "hls"
+    ).first()
+    stem = Path(hls.file_path).stem if hls else None
+    # Only the playlist and its own segments (no path traversal)
+    if not hls or not (name == f"{stem}.m3u8" or (name.startswith(f"{stem}_") and name.endswith(".ts") and "/" not in name)):
+        raise HTTPException(status_code=404, detail="HLS file not found")
+
+    try:
+        content = storage.read_file(transcode.hls_sibling_path(hls.file_path, name))
+    except Exception:
+        raise HTTPException(status_code=404, detail="HLS file not found")
+
+    if name.endswith(".m3u8"):
+        # Hand the media token on to every segment URI
+        token = token or create_media_token(current_user.username, _hls_scope(audio_id))
+        lines = content.decode("utf-8", "replace").splitlines()
+        content = "\n".join(
+            f"{line}?token={token}" if line and not line.startswith("#") else line
+            for line in lines
+        ) + "\n"
+        return Response(content=content, media_type=hls.mime_type, headers={"Cache-Control": "private, no-store"})
+
+    return Response(
+        content=content,
+        media_type="video/mp2t",
+        headers={"Cache-Control": "private, max-age=86400"}
+    )
+
+
+@app.get("/api/audio/{audio_id}/peaks")
+def get_audio_peaks(
+    audio_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Precomputed waveform peaks: a small binary body of unsigned bytes (0-255), one per bucket"""
+    analysis = db.query(models.AudioAnalysis).filter(
+        models.AudioAnalysis.audio_id == audio_id
+    ).first()
+    if not analysis or not analysis.peaks_path:
+        raise HTTPException(status_code=404, detail="Waveform not available")
+
+    try:
+        peaks = storage.read_file(analysis.peaks_path)
+    except Exception as e:
+        log.warning("Could not read waveform peaks", extra={"audio_id": audio_id, "error": str(e)})
+        raise HTTPException(status_code=404, detail="Waveform not available")
+
+    return Response(
+        content=peaks,
+        media_type="application/octet-stream",
+        headers={
+            "Cache-Control": "private, max-age=86400",
+            "X-Peak-Count": str(len(peaks)),
         }
     )
 
@@ -1717,29 +2379,39 @@ def delete_audio(
     current_admin: models.User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    print(f"[DELETE AUDIO] Attempt to delete audio ID: {audio_id} by admin: {current_admin.username}")
-
     audio = db.query(models.AudioRecording).filter(
         models.AudioRecording.id == audio_id
     ).first()
 
     if not audio:
-        print(f"[DELETE AUDIO] Audio recording {audio_id} not found")
         raise HTTPException(status_code=404, detail="Audio recording not found")
 
+    # Delete transcoded renditions
+    for audio_rendition in audio.renditions:
+        transcode.delete_rendition_files(audio_rendition)
+        db.delete(audio_rendition)
+
+    # Delete waveform sidecar and analysis
+    analysis = db.query(models.AudioAnalysis).filter(
+        models.AudioAnalysis.audio_id == audio_id
+    ).first()
+    if analysis:
+        if analysis.peaks_path:
+            storage.delete_file(analysis.peaks_path)
+        db.delete(analysis)
+
     # Delete the physical file from cloud or local storage
     try:
         storage.delete_file(audio.file_path)
-        print(f"[DELETE AUDIO] Deleted file: {audio.file_path}")
     except Exception as e:
-        print(f"[DELETE AUDIO] Error deleting file: {str(e)}")
+        log.warning("Could not delete audio file", extra={"audio_id": audio_id, "error": str(e)})
         # Continue with database deletion even if file deletion fails
 
     # Delete from database
     db.delete(audio)
     db.commit()
 
-    print(f"[DELETE AUDIO] Successfully deleted audio recording {audio_id}")
+    log.info("Audio recording deleted", extra={"audio_id": audio_id, "admin": current_admin.username})
     return {"message": "Audio recording deleted successfully"}
 
 
@@ -1753,26 +2425,20 @@ async def upload_file(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    print(f"[UPLOAD FILE] User: {current_user.username}, Filename: {file.filename}, Source: {source}")
-
     try:
         file_extension = Path(file.filename).suffix
         unique_filename = f"{uuid.uuid4()}{file_extension}"
-        print(f"[UPLOAD FILE] Generated filename: {unique_filename}")
 
         # Read file content
         file_content = await file.read()
-        print(f"[UPLOAD FILE] File read, size: {len(file_content)} bytes")
 
         # Upload to cloud storage or local filesystem
-        print(f"[UPLOAD FILE] Uploading to storage...")
         file_url = storage.upload_file(
             io.BytesIO(file_content),
             unique_filename,
             "files",
             file.content_type
         )
-        print(f"[UPLOAD FILE] Upload successful, URL: {file_url}")
 
         db_file = models.File(
             filename=unique_filename,
@@ -1786,13 +2452,12 @@ async def upload_file(
         db.add(db_file)
         db.commit()
         db.refresh(db_file)
-        print(f"[UPLOAD FILE] Database record created, ID: {db_file.id}")
+        log.info("File uploaded", extra={
+            "file_id": db_file.id, "size": len(file_content), "source": source, "username": current_user.username
+        })
         return db_file
     except Exception as e:
-        print(f"[UPLOAD FILE] Error: {str(e)}")
-        print(f"[UPLOAD FILE] Error type: {type(e)}")
-        import traceback
-        print(f"[UPLOAD FILE] Traceback: {traceback.format_exc()}")
+        log.exception("File upload failed", extra={"upload_filename": file.filename, "source": source})
         raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
 
 
@@ -1803,11 +2468,11 @@ def get_files(
     db: Session = Depends(get_db)
 ):
     # Filter files by source if provided
-    query = db.query(models.File)
+    query = select(*schema_columns(schemas.File, models.File))
     if source:
-        query = query.filter(models.File.source == source)
-    files = query.order_by(models.File.created_at.desc()).all()
-    return files
+        query = query.where(models.File.source == source)
+    files = db.execute(query.order_by(models.File.created_at.desc()))
+    return FastJSONResponse(rows_to_dicts(files))
 
 
 @app.get("/api/files/{file_id}")
@@ -1903,48 +2568,569 @@ def delete_file(
     current_admin: models.User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    print(f"[DELETE FILE] Attempt to delete file ID: {file_id} by admin: {current_admin.username}")
-
     file = db.query(models.File).filter(
         models.File.id == file_id
     ).first()
 
     if not file:
-        print(f"[DELETE FILE] File {file_id} not found")
         raise HTTPException(status_code=404, detail="File not found")
 
     # Delete the physical file from cloud or local storage
     try:
         storage.delete_file(file.file_path)
-        print(f"[DELETE FILE] Deleted file: {file.file_path}")
     except Exception as e:
-        print(f"[DELETE FILE] Error deleting file: {str(e)}")
+        log.warning("Could not delete stored file", extra={"file_id": file_id, "error": str(e)})
         # Continue with database deletion even if file deletion fails
 
     # Delete from database
     db.delete(file)
     db.commit()
 
-    print(f"[DELETE FILE] Successfully deleted file {file_id}")
+    log.info("File deleted", extra={"file_id": file_id, "admin": current_admin.username})
     return {"message": "File deleted successfully"}
 
 
+# Resumable upload routes (large audio recordings and files, see app/resumable.py)
+def _get_upload_session(db: Session, upload_id: str, user: models.User) -> models.UploadSession:
+    session = db.query(models.UploadSession).filter(
+        models.UploadSession.id == upload_id,
+        models.UploadSession.user_id == user.id
+    ).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+
+def _upload_status(session: models.UploadSession) -> dict:
+    return {
+        "upload_id": session.id,
+        "kind": session.kind,
+        "total_size": session.total_size,
+        "chunk_size": session.chunk_size,
+        "max_parallel": resumable.MAX_PARALLEL,
+        "received_bytes": sum(chunk.size for chunk in session.chunks),
+        "missing_offsets": resumable.missing_offsets(session),
+    }
+
+
+@app.post("/api/uploads", response_model=schemas.UploadSessionStatus)
+def create_upload_session(
+    upload: schemas.UploadSessionCreate,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Start a resumable upload for an audio recording or file"""
+    if upload.kind not in resumable.KIND_FOLDERS:
+        raise HTTPException(status_code=400, detail=f"Unknown upload kind '{upload.kind}'")
+    if upload.total_size < 0 or upload.total_size > resumable.MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=400, detail="Invalid upload size")
+
+    expired = resumable.expire_stale_sessions(db)
+    if expired:
+        log.info("Discarded abandoned uploads", extra={"count": expired})
+
+    file_extension = Path(upload.filename).suffix or ('.webm' if upload.kind == "audio" else '')
+    unique_filename = f"{uuid.uuid4()}{file_extension}"
+
+    session = models.UploadSession(
+        id=uuid.uuid4().hex,
+        kind=upload.kind,
+        filename=unique_filename,
+        original_filename=upload.filename,
+        content_type=upload.content_type,
+        total_size=upload.total_size,
+        chunk_size=resumable.effective_chunk_size(),
+        title=upload.title,
+        description=upload.description,
+        source=upload.source,
+        user_id=current_user.id,
+    )
+    session.s3_upload_id = storage.begin_multipart_upload(
+        unique_filename, resumable.KIND_FOLDERS[upload.kind], upload.content_type
+    )
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+
+    log.info("Upload session started", extra={
+        "upload_id": session.id, "kind": upload.kind, "size": upload.total_size, "username": current_user.username
+    })
+    return _upload_status(session)
+
+
+@app.get("/api/uploads/{upload_id}", response_model=schemas.UploadSessionStatus)
+def get_upload_session(
+    upload_id: str,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Which chunks have arrived; resume by sending the missing offsets"""
+    return _upload_status(_get_upload_session(db, upload_id, current_user))
+
+
+@app.put("/api/uploads/{upload_id}", response_model=schemas.UploadSessionStatus)
+async def upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Store one chunk (raw request body) at the given byte offset. Re-sending a chunk replaces it."""
+    # Async only to stream the body: file and database work runs in the threadpool
+    session = await run_in_threadpool(_get_upload_session, db, upload_id, current_user)
+
+    if offset < 0 or offset % session.chunk_size or offset >= max(session.total_size, 1):
+        raise HTTPException(status_code=400, detail=f"Offset must be a multiple of {session.chunk_size} within the upload")
+    expected_size = resumable.expected_chunk_size(session, offset)
+
+    # Stream the body to the staging area instead of buffering it in memory. The
+    # temp name is unique: a client may re-send a chunk while the first attempt
+    # is still arriving.
+    part_path = resumable.chunk_path(session.id, offset)
+    tmp_path = part_path.with_name(f"{part_path.stem}.{uuid.uuid4().hex}.tmp")
+
+    def open_tmp():
+        tmp_path.parent.mkdir(parents=True, exist_ok=True)
+        return open(tmp_path, "wb")
+
+    etag = None
+    size = 0
+    try:
+        f = await run_in_threadpool(open_tmp)
+        try:
+            async for data in request.stream():
+                size += len(data)
+                if size > expected_size:
+                    break
+                await run_in_threadpool(f.write, data)
+        finally:
+            await run_in_threadpool(f.close)
+
+        if size != expected_size:
+            raise HTTPException(status_code=400, detail=f"Chunk at offset {offset} must be exactly {expected_size} bytes")
+
+        if session.s3_upload_id:
+            def send_part():
+                with open(tmp_path, "rb") as part:
+                    return storage.upload_part(
+                        session.s3_upload_id,
+                        session.filename,
+                        resumable.KIND_FOLDERS[session.kind],
+                        offset // session.chunk_size + 1,
+                        part
+                    )
+            etag = await run_in_threadpool(send_part)
+        else:
+            await run_in_threadpool(os.replace, tmp_path, part_path)
+    finally:
+        await run_in_threadpool(tmp_path.unlink, missing_ok=True)
+
+    def record_chunk():
+        def upsert():
+            chunk = db.query(models.UploadChunk).filter(
+                models.UploadChunk.session_id == session.id,
+                models.UploadChunk.offset == offset
+            ).first()
+            if chunk:
+                chunk.size = size
+                chunk.etag = etag
+            else:
+                db.add(models.UploadChunk(session_id=session.id, offset=offset, size=size, etag=etag))
+
+        upsert()
+        try:
+            db.commit()
+        except IntegrityError:
+            # The same chunk was re-sent concurrently and the other request added the row first
+            db.rollback()
+            upsert()
+            db.commit()
+        db.refresh(session)
+        return _upload_status(session)
+
+    return await run_in_threadpool(record_chunk)
+
+
+@app.post("/api/uploads/{upload_id}/complete")
+def complete_upload_session(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Assemble all chunks and create the AudioRecording or File record"""
+    session = _get_upload_session(db, upload_id, current_user)
+
+    missing = resumable.missing_offsets(session)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Upload incomplete, {len(missing)} chunks missing")
+
+    folder = resumable.KIND_FOLDERS[session.kind]
+    chunks = sorted(session.chunks, key=lambda chunk: chunk.offset)
+    try:
+        if session.s3_upload_id:
+            file_url = storage.complete_multipart_upload(
+                session.s3_upload_id, session.filename, folder, [chunk.etag for chunk in chunks]
+            )
+        else:
+            file_url = storage.assemble_local(
+                [resumable.chunk_path(session.id, chunk.offset) for chunk in chunks],
+                session.filename,
+                folder
+            )
+    except Exception as e:
+        log.exception("Failed to assemble upload", extra={"upload_id": session.id})
+        raise HTTPException(status_code=500, detail=f"Failed to assemble upload: {str(e)}")
+
+    if session.kind == "audio":
+        record = models.AudioRecording(
+            filename=session.filename,
+            file_path=file_url,
+            title=session.title or session.original_filename or f"Recording {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+            description=session.description,
+            author_id=current_user.id,
+        )
+    else:
+        record = models.File(
+            filename=session.filename,
+            file_path=file_url,
+            title=session.title or session.original_filename,
+            description=session.description,
+            file_type=session.content_type,
+            source=session.source,
+            uploaded_by_id=current_user.id,
+        )
+    db.add(record)
+
+    # The multipart upload is already complete, nothing left to abort
+    session.s3_upload_id = None
+    resumable.discard_session(db, session)
+    db.commit()
+    db.refresh(record)
+
+    log.info("Upload session completed", extra={"upload_id": upload_id, "kind": session.kind, "record_id": record.id})
+    if session.kind == "audio":
+        background_tasks.add_task(audio_analysis.analyse_recording_task, record.id)
+        background_tasks.add_task(transcode.transcode_recording_task, record.id)
+        return {"kind": "audio", "audio": schemas.AudioRecording.model_validate(record)}
+    return {"kind": "file", "file": schemas.File.model_validate(record)}
+
+
+@app.delete("/api/uploads/{upload_id}")
+def abort_upload_session(
+    upload_id: str,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Cancel an upload and discard any chunks already sent"""
+    session = _get_upload_session(db, upload_id, current_user)
+    resumable.discard_session(db, session)
+    db.commit()
+    return {"message": "Upload cancelled"}
+
+
+# Export routes (streaming ZIP/TAR, see app/export.py)
+def _parse_range(range_header: str, total: int):
+    """(start, end) byte range, end exclusive, from a single-range "bytes=" header"""
+    units, _, spec = range_header.partition("=")
+    if units.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else total
+        else:
+            start = max(0, total - int(last))
+            end = total
+    except ValueError:
+        return None
+    if start >= total or start >= end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{total}"}
+        )
+    return start, min(end, total)
+
+
+def _export_response(request: Request, plan: export.ArchivePlan, format: str, basename: str):
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}' (use zip or tar)")
+
+    basename = basename.encode("ascii", "ignore").decode() or "export"
+    headers = {"Content-Disposition": f'attachment; filename="{basename}.{format}"'}
+    if format == "zip":
+        return StreamingResponse(export.stream_zip(plan), media_type=export.FORMATS["zip"], headers=headers)
+
+    total = export.tar_size(plan)
+    etag = plan.etag
+    headers.update({"Accept-Ranges": "bytes", "ETag": etag})
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = _parse_range(range_header, total)
+
+    if not byte_range:
+        headers["Content-Length"] = str(total)
+        return StreamingResponse(export.stream_tar(plan), media_type=export.FORMATS["tar"], headers=headers)
+
+    start, end = byte_range
+    headers.update({
+        "Content-Range": f"bytes {start}-{end - 1}/{total}",
+        "Content-Length": str(end - start),
+    })
+    return StreamingResponse(
+        export.stream_tar(plan, start, end),
+        status_code=206,
+        media_type=export.FORMATS["tar"],
+        headers=headers
+    )
+
+
+@app.get("/api/export")
+def export_archive(
+    request: Request,
+    format: str = "zip",
+    current_admin: models.User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Download the whole family archive with a JSON manifest (admin only)"""
+    plan = export.plan_full(db)
+    return _export_response(request, plan, format, "family_archive")
+
+
+@app.get("/api/albums/{album_id}/export")
+def export_album(
+    album_id: int,
+    request: Request,
+    format: str = "zip",
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Download an album's photos with a JSON manifest"""
+    album = db.query(models.Album).filter(models.Album.id == album_id).first()
+    if not album:
+        raise HTTPException(status_code=404, detail="Album not found")
+    plan = export.plan_album(db, album)
+    return _export_response(request, plan, format, export.safe_name(album.name, f"album_{album.id}"))
+
+
+@app.get("/api/vignettes/{vignette_id}/export")
+def export_vignette(
+    vignette_id: int,
+    request: Request,
+    format: str = "zip",
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Download a vignette's text and photos with a JSON manifest"""
+    vignette = db.query(models.Vignette).filter(models.Vignette.id == vignette_id).first()
+    if not vignette:
+        raise HTTPException(status_code=404, detail="Vignette not found")
+    plan = export.plan_vignette(db, vignette)
+    return _export_response(request, plan, format, export.safe_name(vignette.title, f"vignette_{vignette.id}"))
+
+
+# Bulk import routes (admin only, see app/importer.py)
+@app.post("/api/admin/import")
+def import_archive(
+    background_tasks: BackgroundTasks,
+    response: Response,
+    path: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    dry_run: bool = Form(False),
+    albums: bool = Form(True),
+    current_admin: models.User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Import a server-side directory/archive (path) or an uploaded ZIP/TAR (file)
+
+    A dry run returns the plan straight away; a real import runs in the
+    background (GET /api/admin/import/status) and can be re-run to resume.
+    """
+    if bool(path) == bool(file):
+        raise HTTPException(status_code=400, detail="Provide either path or file")
+
+    if file:
+        # Keep the uploaded name: the checkpoint is keyed on name + size so a re-upload resumes
+        source_path = resumable.STAGING_DIR / f"import_{uuid.uuid4().hex}" / Path(file.filename).name
+        source_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(source_path, "wb") as out:
+            shutil.copyfileobj(file.file, out, 1024 * 1024)
+    else:
+        source_path = Path(path)
+
+    if dry_run:
+        try:
+            return importer.run_import(db, source_path, current_admin, dry_run=True, with_albums=albums)
+        except importer.ArchiveImportError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            if file:
+                shutil.rmtree(source_path.parent, ignore_errors=True)
+
+    try:
+        importer.open_source(source_path).close()
+        job = importer.start_job(str(source_path))
+    except importer.ArchiveImportError as e:
+        if file:
+            shutil.rmtree(source_path.parent, ignore_errors=True)
+        raise HTTPException(status_code=409 if "running" in str(e) else 400, detail=str(e))
+
+    background_tasks.add_task(importer.run_job, str(source_path), current_admin.id, albums, bool(file))
+    response.status_code = 202
+    return {"message": "Import started", **job}
+
+
+@app.get("/api/admin/import/status")
+def import_status(current_admin: models.User = Depends(get_current_admin)):
+    """Current or last import job with its running report (admin only)"""
+    return importer.job_status()
+
+
+# Change feed (delta sync, see app/changes.py)
+def _change_rows(db: Session, entity: str, ids: List[int]) -> List[dict]:
+    """Current representation of changed rows, in the same shape as the list endpoints"""
+    if entity == "albums":
+        return _album_rows(db, ids)
+    if entity == "vignettes":
+        return _vignette_rows(db, ids)
+    model, schema = {
+        "photos": (models.Photo, schemas.Photo),
+        "audio": (models.AudioRecording, schemas.AudioRecording),
+        "files": (models.File, schemas.File),
+    }[entity]
+    columns = schema_columns(schema, model)
+    if hasattr(model, "sort_order"):
+        columns.append(model.sort_order)
+    return rows_to_dicts(db.execute(select(*columns).where(model.id.in_(ids))))
+
+
+@app.get("/api/changes")
+def get_changes(
+    since: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=5000),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Photos, albums, vignettes, audio and files changed after a cursor
+
+    Without since, returns just the current cursor: load the collections, then
+    poll with ?since=<cursor>. Each entity lists full rows to upsert and ids to
+    delete; keep calling with the returned cursor while has_more is true.
+    410 means the cursor is older than the retained log - reload everything.
+    """
+    if since is None:
+        return {"cursor": changes.latest_cursor(db), "has_more": False, "changes": {}}
+
+    try:
+        cursor, has_more, changed = changes.read_changes(db, since, limit)
+    except changes.CursorExpired:
+        raise HTTPException(status_code=410, detail="Cursor expired; reload everything")
+
+    result = {}
+    for entity, ops in changed.items():
+        rows = _change_rows(db, entity, ops["upserts"]) if ops["upserts"] else []
+        # Rows that were upserted and then deleted beyond this page are gone now
+        found = {row["id"] for row in rows}
+        deletes = ops["deletes"] + [entity_id for entity_id in ops["upserts"] if entity_id not in found]
+        result[entity] = {"upserts": rows, "deletes": deletes}
+
+    return FastJSONResponse({"cursor": cursor, "has_more": has_more, "changes": result})
+
+
+# Live updates (server-sent events, see app/events.py)
+@app.get("/api/events")
+async def live_events(
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Server-sent events announcing each committed change: {entity, id, op, cursor}
+
+    Starts with a "hello" event carrying the current change feed cursor.
+    On a "resync" event (the client fell behind) or after reconnecting,
+    catch up with GET /api/changes?since=<last cursor seen>.
+    """
+    cursor = changes.latest_cursor(db)
+    db.close()  # Don't hold a pooled connection for the life of the stream
+    try:
+        subscription = events.broker.connect()
+    except OverflowError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return StreamingResponse(
+        events.broker.stream(subscription, cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/admin/profile")
+async def capture_profile(
+    seconds: float = Query(10, gt=0, le=profiler.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(profiler.PROFILE_INTERVAL_MS, ge=1, le=1000),
+    idle: bool = False,
+    current_admin: models.User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Sample every thread's stack for `seconds` (admin only)
+
+    Returns collapsed stacks ("thread;frame;frame count" per line) for
+    flamegraph.pl or speedscope. idle=true keeps threads that are waiting
+    for work. One capture runs at a time (409 while busy).
+    """
+    db.close()  # Don't hold a pooled connection for the capture window
+    try:
+        result = await profiler.capture_async(seconds, interval_ms, idle)
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    log.info("Profile captured", extra={"seconds": round(result.elapsed, 2), "samples": result.samples, "admin": current_admin.username})
+    filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+    return Response(
+        content=result.collapsed(),
+        media_type="text/plain",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Profile-Samples": str(result.samples),
+            "X-Profile-Seconds": f"{result.elapsed:.2f}",
+        }
+    )
+
+
+@app.get("/api/admin/profiles")
+def list_saved_profiles(current_admin: models.User = Depends(get_current_admin)):
+    """Captures recorded automatically when request p99 went over PROFILE_AUTO_P99, newest first"""
+    return profiler.list_saved()
+
+
+@app.get("/api/admin/profiles/{name}")
+def download_saved_profile(name: str, current_admin: models.User = Depends(get_current_admin)):
+    path = profiler.saved_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=path.name)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    """Prometheus text exposition (loopback only, unless METRICS_TOKEN is set and sent)"""
+    if not metrics.authorized(request):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # Catch-all route to serve React app for client-side routing
 # This MUST be at the end of all routes
 @app.get("/{full_path:path}")
-async def serve_frontend(full_path: str):
+async def serve_frontend(full_path: str, request: Request):
     """Serve the React frontend for all non-API routes"""
     # If path starts with /api, it's already handled above, return 404
     if full_path.startswith("api/"):
         raise HTTPException(status_code=404, detail="API endpoint not found")
 
     # Serve index.html for all other routes (React Router will handle them)
-    index_path = FRONTEND_BUILD_DIR / "index.html"
-    if index_path.exists():
-        return FileResponse(index_path)
-    else:
-        raise HTTPException(
-            status_code=503,
-            detail="Frontend not built. Run 'cd frontend && npm run build' first."
-        )
-
+    return index_page.response(request)
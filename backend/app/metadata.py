@@ -0,0 +1,129 @@
+"""
+Photo metadata extraction (dimensions, orientation, capture date, camera, GPS).
+
+Pillow's Image.open() only parses the file header, so everything here comes
+from the container/EXIF headers without decoding any pixels. JPEG headers sit
+at the start of the file, which lets backfills read just the first
+HEADER_BYTES of each original (see storage.read_file).
+"""
+
+import io
+from datetime import datetime
+from typing import BinaryIO, Optional, Union
+
+from PIL import Image, ExifTags
+from pillow_heif import register_heif_opener
+
+register_heif_opener()
+
+# Enough for the EXIF block (incl. embedded thumbnail) and JPEG frame header
+HEADER_BYTES = 256 * 1024
+
+# EXIF tags
+TAG_MAKE = 271
+TAG_MODEL = 272
+TAG_ORIENTATION = 274
+TAG_DATETIME = 306
+TAG_DATETIME_ORIGINAL = 36867
+TAG_LENS_MODEL = 42036
+
+# GPS IFD tags
+GPS_LATITUDE_REF = 1
+GPS_LATITUDE = 2
+GPS_LONGITUDE_REF = 3
+GPS_LONGITUDE = 4
+GPS_ALTITUDE_REF = 5
+GPS_ALTITUDE = 6
+
+
+def _clean(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip("\x00 ").strip()
+    return value or None
+
+
+def _parse_exif_date(value) -> Optional[datetime]:
+    """Parse EXIF date format: "YYYY:MM:DD HH:MM:SS" """
+    value = _clean(value)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def _gps_degrees(dms, ref) -> Optional[float]:
+    """Convert an EXIF (degrees, minutes, seconds) tuple to signed decimal degrees"""
+    try:
+        degrees = float(dms[0]) + float(dms[1]) / 60 + float(dms[2]) / 3600
+    except (TypeError, ValueError, IndexError, ZeroDivisionError):
+        return None
+    if _clean(ref) in ('S', 'W'):
+        degrees = -degrees
+    return round(degrees, 7)
+
+
+def extract_from_image(img) -> dict:
+    """Metadata from an already-opened (not yet decoded) Pillow image"""
+    width, height = img.size
+    metadata = {
+        "format": img.format,
+        "width": width,
+        "height": height,
+        "orientation": None,
+        "taken_at": None,
+        "camera_make": None,
+        "camera_model": None,
+        "lens_model": None,
+        "gps_latitude": None,
+        "gps_longitude": None,
+        "gps_altitude": None,
+    }
+
+    exif = img.getexif()
+    if not exif:
+        return metadata
+
+    exif_ifd = exif.get_ifd(ExifTags.IFD.Exif)
+    gps_ifd = exif.get_ifd(ExifTags.IFD.GPSInfo)
+
+    orientation = exif.get(TAG_ORIENTATION)
+    metadata["orientation"] = int(orientation) if orientation else None
+    # DateTimeOriginal (when photo was taken) normally lives in the Exif IFD;
+    # fall back to DateTime (when photo was last modified)
+    metadata["taken_at"] = (
+        _parse_exif_date(exif_ifd.get(TAG_DATETIME_ORIGINAL) or exif.get(TAG_DATETIME_ORIGINAL))
+        or _parse_exif_date(exif.get(TAG_DATETIME))
+    )
+    metadata["camera_make"] = _clean(exif.get(TAG_MAKE))
+    metadata["camera_model"] = _clean(exif.get(TAG_MODEL))
+    metadata["lens_model"] = _clean(exif_ifd.get(TAG_LENS_MODEL))
+
+    if gps_ifd:
+        if GPS_LATITUDE in gps_ifd and GPS_LONGITUDE in gps_ifd:
+            metadata["gps_latitude"] = _gps_degrees(gps_ifd[GPS_LATITUDE], gps_ifd.get(GPS_LATITUDE_REF))
+            metadata["gps_longitude"] = _gps_degrees(gps_ifd[GPS_LONGITUDE], gps_ifd.get(GPS_LONGITUDE_REF))
+        if GPS_ALTITUDE in gps_ifd:
+            try:
+                altitude = float(gps_ifd[GPS_ALTITUDE])
+                metadata["gps_altitude"] = -altitude if gps_ifd.get(GPS_ALTITUDE_REF) in (1, b'\x01') else altitude
+            except (TypeError, ValueError, ZeroDivisionError):
+                pass
+
+    return metadata
+
+
+def extract_photo_metadata(file_content: Union[bytes, BinaryIO]) -> dict:
+    """
+    Extract metadata from image bytes (a full file or just its header), or from
+    a seekable file object (only the headers are read from it).
+
+    Raises:
+        Exception if the bytes can't be parsed as an image
+    """
+    if isinstance(file_content, (bytes, bytearray)):
+        file_content = io.BytesIO(file_content)
+    with Image.open(file_content) as img:
+        return extract_from_image(img)
@@ -0,0 +1,383 @@
+"""
+Prometheus-style metrics, served as text at GET /metrics.
+
+Instrumentation is plain counters, gauges and histograms kept in memory
+(no client library needed): each update is a dict lookup and an add under a
+lock. Hooks:
+
+- MetricsMiddleware: per-route request counts and latency, requests in
+  flight, request body bytes (uploads) and DB queries per request. Routes
+  are labelled by their path template ("/api/photos/{photo_id}"), never
+  the raw URL, so label cardinality stays bounded.
+- instrument_engine(): counts SQL statements, attributed to the request
+  that ran them (sync endpoints run in the threadpool with a copy of the
+  request's context, which shares the same counter).
+- storage.py: `timed_storage` around each operation, labelled local or s3.
+- auth.py: login outcomes and rejected tokens.
+- Scrape-time collectors: response cache hit/miss, threadpool usage, email
+  queue, live update connections and discarded log records.
+
+/metrics is only answered for loopback clients, or for anyone sending
+`Authorization: Bearer <METRICS_TOKEN>` when METRICS_TOKEN is set.
+"""
+
+import bisect
+import contextvars
+import functools
+import hmac
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import anyio.to_thread
+from sqlalchemy import event
+
+from app.logs import get_logger, stats as log_stats
+
+log = get_logger(__name__)
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket counts (last slot is +Inf), then sum
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def merged(self, include: Callable[[tuple], bool] = lambda labels: True) -> List[int]:
+        """Per-bucket counts (not cumulative, +Inf last) summed over the label sets include() accepts"""
+        totals = [0] * (len(self.buckets) + 1)
+        with self._lock:
+            for labels, (counts, _total) in self._values.items():
+                if include(labels):
+                    totals = [a + b for a, b in zip(totals, counts)]
+        return totals
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._values.items())
+        lines = self._header()
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func: Callable[[], None]) -> Callable[[], None]:
+        """Run func before every scrape (to refresh gauges read from elsewhere)"""
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> bytes:
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                log.exception("Metrics collector failed", extra={"collector": collect.__name__})
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+registry = Registry()
+
+# HTTP
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "Time from request to last response byte", ("method", "route")))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being handled (includes live update streams)"))
+upload_bytes = registry.register(Counter(
+    "http_request_body_bytes_total", "Request body bytes received (uploads)", ("route",)))
+
+# Database
+db_queries = registry.register(Counter(
+    "db_queries_total", "SQL statements executed"))
+db_queries_per_request = registry.register(Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",), QUERY_COUNT_BUCKETS))
+
+# Storage
+storage_latency = registry.register(Histogram(
+    "storage_operation_duration_seconds", "Storage operation latency", ("backend", "operation")))
+storage_errors = registry.register(Counter(
+    "storage_operation_errors_total", "Storage operations that raised", ("backend", "operation")))
+
+# Auth
+auth_logins = registry.register(Counter(
+    "auth_login_attempts_total", "Password logins by outcome", ("result",)))
+auth_rejected_tokens = registry.register(Counter(
+    "auth_rejected_tokens_total", "Requests refused because of an invalid or expired token"))
+
+# Threadpool (sync endpoints, run_in_threadpool)
+threadpool_busy = registry.register(Gauge(
+    "threadpool_busy_threads", "Worker threads in use at scrape time"))
+threadpool_peak = registry.register(Gauge(
+    "threadpool_busy_threads_peak", "Most worker threads in use at any request start since the last scrape"))
+threadpool_size = registry.register(Gauge(
+    "threadpool_max_threads", "Worker thread limit"))
+
+# Response cache
+cache_lookups = registry.register(Gauge(
+    "response_cache_lookups", "Response cache lookups since startup", ("result",)))
+cache_hit_ratio = registry.register(Gauge(
+    "response_cache_hit_ratio", "Share of response cache lookups that were hits"))
+cache_bytes = registry.register(Gauge(
+    "response_cache_bytes", "Approximate memory held by the response cache"))
+
+# Background work
+email_messages = registry.register(Gauge(
+    "email_messages", "Invite emails handled by the dispatcher since startup", ("state",)))
+email_pending = registry.register(Gauge(
+    "email_queue_pending", "Invite emails waiting to be sent"))
+sse_connections = registry.register(Gauge(
+    "sse_connections", "Open live update (server-sent events) connections"))
+log_records = registry.register(Gauge(
+    "log_records_discarded", "Log records not written since startup", ("reason",)))
+
+
+# Per-request query counter: a one-item list so the threadpool's context copy shares it
+_query_count: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("query_count", default=None)
+_peak_busy = [0]
+
+
+def instrument_engine(engine):
+    """Count every SQL statement run through engine"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        db_queries.inc()
+        counter = _query_count.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+def _limiter():
+    try:
+        return anyio.to_thread.current_default_thread_limiter()
+    except RuntimeError:  # No event loop in this thread
+        return None
+
+
+def _route_label(scope) -> str:
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    labels = _route_labels(scope["app"])
+    return labels.get(endpoint, "unmatched")
+
+
+@functools.lru_cache(maxsize=4)
+def _route_labels(app) -> dict:
+    """endpoint -> path template, for routes and mounts"""
+    labels = {}
+    for route in app.routes:
+        target = getattr(route, "endpoint", None) or getattr(route, "app", None)
+        if target is not None:
+            labels.setdefault(target, route.path)
+    return labels
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = [500]
+        received = [0]
+        counter = [0]
+        token = _query_count.set(counter)
+
+        limiter = _limiter()
+        if limiter is not None and limiter.borrowed_tokens > _peak_busy[0]:
+            _peak_busy[0] = limiter.borrowed_tokens
+
+        async def receive_counted():
+            message = await receive()
+            if message["type"] == "http.request":
+                received[0] += len(message.get("body", b""))
+            return message
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive_counted, send_with_status)
+        finally:
+            http_in_flight.dec()
+            _query_count.reset(token)
+            route = _route_label(scope)
+            method = scope["method"]
+            http_requests.inc(method, route, str(status[0]))
+            http_latency.observe(method, route, value=time.perf_counter() - start)
+            db_queries_per_request.observe(route, value=counter[0])
+            if received[0]:
+                upload_bytes.inc(route, amount=received[0])
+
+
+def timed_storage(operation: str, path_arg: bool = True):
+    """Record latency (and errors) of a storage function.
+
+    The backend label is s3 when the call goes to the bucket: decided from
+    the first argument (a stored path or URL) when path_arg is set, otherwise
+    from whether cloud storage is configured.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            from app import storage
+            if path_arg and args and isinstance(args[0], str):
+                backend = "s3" if storage.is_cloud_path(args[0]) else "local"
+            else:
+                backend = "s3" if storage.is_cloud_storage_configured() else "local"
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                storage_errors.inc(backend, operation)
+                raise
+            finally:
+                storage_latency.observe(backend, operation, value=time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+@registry.collector
+def _collect_threadpool():
+    limiter = _limiter()
+    if limiter is None:
+        return
+    threadpool_busy.set(value=limiter.borrowed_tokens)
+    threadpool_size.set(value=limiter.total_tokens)
+    threadpool_peak.set(value=max(_peak_busy[0], limiter.borrowed_tokens))
+    _peak_busy[0] = 0
+
+
+@registry.collector
+def _collect_cache():
+    from app.cache import response_cache
+    stats = dict(response_cache.stats)
+    cache_lookups.set("hit", value=stats["hits"])
+    cache_lookups.set("miss", value=stats["misses"])
+    cache_lookups.set("eviction", value=stats["evictions"])
+    lookups = stats["hits"] + stats["misses"]
+    cache_hit_ratio.set(value=stats["hits"] / lookups if lookups else 0)
+    cache_bytes.set(value=response_cache.size)
+
+
+@registry.collector
+def _collect_background():
+    from app.email import dispatcher
+    from app.events import broker
+    for state, count in dict(dispatcher.stats).items():
+        email_messages.set(state, value=count)
+    email_pending.set(value=dispatcher.pending())
+    sse_connections.set(value=broker.connection_count())
+    log_records.set("queue_full", value=log_stats["dropped"])
+    log_records.set("sampled_out", value=log_stats["sampled_out"])
+
+
+def authorized(request) -> bool:
+    """Loopback clients, or a matching METRICS_TOKEN bearer token"""
+    if METRICS_TOKEN:
+        supplied = request.headers.get("authorization", "")
+        return hmac.compare_digest(supplied.encode(), f"Bearer {METRICS_TOKEN}".encode())
+    return request.client is not None and request.client.host in ("127.0.0.1", "::1")
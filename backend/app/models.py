@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Text, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -76,11 +76,35 @@ class Photo(Base):
     uploaded_by_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     taken_at = Column(DateTime(timezone=True))
     sort_order = Column(Integer, default=0, index=True)
+    phash = Column(String(16), nullable=True, index=True)  # Perceptual hash (dHash, hex) for near-duplicate detection
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     uploaded_by_user = relationship("User", back_populates="photos")
     albums = relationship("AlbumPhoto", back_populates="photo")
     people_tags = relationship("PhotoPerson", back_populates="photo")
+    photo_metadata = relationship("PhotoMetadata", back_populates="photo", uselist=False)
+
+
+class PhotoMetadata(Base):
+    """Parsed header/EXIF metadata so features don't need to re-read image bytes"""
+    __tablename__ = "photo_metadata"
+
+    id = Column(Integer, primary_key=True, index=True)
+    photo_id = Column(Integer, ForeignKey("photos.id"), nullable=False, unique=True, index=True)
+    format = Column(String)  # e.g. JPEG, PNG, HEIF (of the original upload)
+    width = Column(Integer)
+    height = Column(Integer)
+    orientation = Column(Integer)  # EXIF orientation, 1-8
+    taken_at = Column(DateTime(timezone=True))
+    camera_make = Column(String)
+    camera_model = Column(String, index=True)
+    lens_model = Column(String)
+    gps_latitude = Column(Float)
+    gps_longitude = Column(Float)
+    gps_altitude = Column(Float)
+    extracted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    photo = relationship("Photo", back_populates="photo_metadata")
 
 
 class Album(Base):
@@ -121,6 +145,12 @@ class Person(Base):
 
 class PhotoPerson(Base):
     __tablename__ = "photo_people"
+    __table_args__ = (
+        # Covering indexes for both lookup directions; person-first also backs
+        # the GROUP BY used by multi-person intersection queries
+        Index("ix_photo_people_person_photo", "person_id", "photo_id", unique=True),
+        Index("ix_photo_people_photo_person", "photo_id", "person_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     photo_id = Column(Integer, ForeignKey("photos.id"), nullable=False)
@@ -143,6 +173,44 @@ class AudioRecording(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     author = relationship("User", back_populates="audio_recordings")
+    analysis = relationship("AudioAnalysis", back_populates="audio", uselist=False)
+    renditions = relationship("AudioRendition", back_populates="audio")
+
+
+class AudioAnalysis(Base):
+    """Header-probed stream info and precomputed waveform peaks for a recording"""
+    __tablename__ = "audio_analysis"
+
+    id = Column(Integer, primary_key=True, index=True)
+    audio_id = Column(Integer, ForeignKey("audio_recordings.id"), nullable=False, unique=True, index=True)
+    codec = Column(String)
+    bitrate = Column(Integer)  # bits per second
+    sample_rate = Column(Integer)
+    channels = Column(Integer)
+    peaks_path = Column(String, nullable=True)  # Sidecar file of peak_count unsigned bytes
+    peak_count = Column(Integer, nullable=True)
+    analysed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    audio = relationship("AudioRecording", back_populates="analysis")
+
+
+class AudioRendition(Base):
+    """A transcoded streaming version of a recording (see app/transcode.py)"""
+    __tablename__ = "audio_renditions"
+    __table_args__ = (
+        Index("ix_audio_renditions_audio_kind", "audio_id", "kind", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    audio_id = Column(Integer, ForeignKey("audio_recordings.id"), nullable=False)
+    kind = Column(String, nullable=False)  # "opus", "aac" or "hls"
+    file_path = Column(String, nullable=False)  # For "hls", the playlist; segments sit next to it
+    mime_type = Column(String)
+    bitrate = Column(Integer)  # Target bits per second
+    size = Column(BigInteger)  # Total bytes (all segments for "hls")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    audio = relationship("AudioRecording", back_populates="renditions")
 
 
 class File(Base):
@@ -171,3 +239,55 @@ class BackgroundImage(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     is_active = Column(Boolean, default=True)  # Only one should be active at a time
 
+
+
+class UploadSession(Base):
+    """A resumable (chunked) upload in progress for an audio recording or file"""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String, primary_key=True, index=True)  # Random token, also used as staging dir name
+    kind = Column(String, nullable=False)  # "audio" or "file"
+    filename = Column(String, nullable=False)  # Unique storage filename
+    original_filename = Column(String)
+    content_type = Column(String)
+    total_size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    title = Column(String)
+    description = Column(Text)
+    source = Column(String)  # File.source for kind == "file"
+    s3_upload_id = Column(String, nullable=True)  # Set when chunks go straight to S3 multipart
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    chunks = relationship("UploadChunk", back_populates="session", cascade="all, delete-orphan")
+
+
+class UploadChunk(Base):
+    __tablename__ = "upload_chunks"
+    __table_args__ = (
+        Index("ix_upload_chunks_session_offset", "session_id", "offset", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, ForeignKey("upload_sessions.id"), nullable=False, index=True)
+    offset = Column(BigInteger, nullable=False)
+    size = Column(Integer, nullable=False)
+    etag = Column(String, nullable=True)  # S3 part ETag (cloud storage only)
+
+    session = relationship("UploadSession", back_populates="chunks")
+
+
+class ChangeLog(Base):
+    """One row per created/updated/deleted photo, album, vignette, recording or file.
+
+    The autoincrement id is the cursor clients pass to GET /api/changes
+    (ids commit in order: see the writer lock in app/changes.py).
+    Written by the flush hook in app/changes.py.
+    """
+    __tablename__ = "change_log"
+
+    id = Column(Integer, primary_key=True, index=True)
+    entity = Column(String, nullable=False)  # "photos", "albums", "vignettes", "audio", "files"
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)  # "upsert" or "delete"
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
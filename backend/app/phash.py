@@ -0,0 +1,130 @@
+"""
+Perceptual hashing for near-duplicate photo detection.
+
+Each photo gets a 64-bit difference hash (dHash) stored as 16 hex characters.
+Resized or re-encoded copies of the same picture (e.g. HEIC and JPEG uploads)
+end up a few bits apart, while unrelated pictures differ in ~32 bits.
+
+Clusters are found with a multi-index Hamming lookup instead of comparing
+every pair: the hash is split into (threshold + r) chunks, and by the
+pigeonhole principle two hashes within `threshold` bits must agree exactly
+on at least r of them. Every combination of r chunks is used as a bucket
+key and only photos sharing a bucket are compared. r = 1 is fastest for
+small thresholds; above that the one-chunk buckets get too big (at 50k
+photos, threshold 6 compares ~16M pairs) and keying on pairs of chunks
+keeps them small.
+
+The threshold is capped at MAX_THRESHOLD: the work grows quickly with it
+(50k random hashes: ~0.3s at 4, ~1s at 6), and beyond ~8 bits unrelated
+pictures start to match anyway.
+"""
+
+from collections import defaultdict
+from itertools import combinations
+from typing import Dict, Iterable, List, Tuple
+
+HASH_SIZE = 8  # 8x8 = 64-bit hash
+DEFAULT_THRESHOLD = 4  # Max differing bits to still count as a duplicate
+MAX_THRESHOLD = 6
+
+
+def dhash(img) -> str:
+    """
+    Compute the 64-bit difference hash of a Pillow image.
+
+    Returns:
+        16-character hex string
+    """
+    # For JPEGs, draft() lets the decoder downscale while decoding
+    # instead of materialising the full-resolution image first
+    try:
+        img.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+    except Exception:
+        pass
+
+    small = img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE))
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+
+    return f"{value:016x}"
+
+
+def hamming(a: str, b: str) -> int:
+    """Number of differing bits between two hex hashes"""
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def _chunk_masks(chunks: int) -> List[Tuple[int, int]]:
+    """Split 64 bits into `chunks` (shift, mask) pairs of near-equal width"""
+    bits = HASH_SIZE * HASH_SIZE
+    masks = []
+    start = 0
+    for i in range(chunks):
+        width = bits // chunks + (1 if i < bits % chunks else 0)
+        masks.append((start, (1 << width) - 1))
+        start += width
+    return masks
+
+
+def find_duplicate_clusters(
+    hashes: Iterable[Tuple[int, str]],
+    threshold: int = DEFAULT_THRESHOLD
+) -> List[List[int]]:
+    """
+    Group ids whose hashes are within `threshold` bits of each other.
+
+    Args:
+        hashes: (id, hex hash) pairs
+        threshold: Max Hamming distance for two photos to be linked
+
+    Returns:
+        Clusters of two or more ids, each sorted, largest cluster first
+    """
+    threshold = max(0, min(threshold, MAX_THRESHOLD))
+    items = [(item_id, int(value, 16)) for item_id, value in hashes if value]
+    values = [value for _, value in items]
+
+    # Union-find over item positions
+    parent = list(range(len(items)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    agree = 1 if threshold <= DEFAULT_THRESHOLD else 2
+    for chunks in combinations(_chunk_masks(threshold + agree), agree):
+        key_mask = 0
+        for shift, mask in chunks:
+            key_mask |= mask << shift
+
+        buckets: Dict[int, List[int]] = defaultdict(list)
+        for pos, value in enumerate(values):
+            buckets[value & key_mask].append(pos)
+
+        # Only photos sharing these chunks exactly are compared bit-for-bit
+        for bucket in buckets.values():
+            if len(bucket) < 2:
+                continue
+            for i, pos_a in enumerate(bucket):
+                value_a = values[pos_a]
+                for pos_b in bucket[i + 1:]:
+                    if (value_a ^ values[pos_b]).bit_count() <= threshold:
+                        root_a, root_b = find(pos_a), find(pos_b)
+                        if root_a != root_b:
+                            parent[root_a] = root_b
+
+    clusters: Dict[int, List[int]] = {}
+    for pos, (item_id, _) in enumerate(items):
+        clusters.setdefault(find(pos), []).append(item_id)
+
+    return sorted(
+        (sorted(ids) for ids in clusters.values() if len(ids) > 1),
+        key=lambda ids: (-len(ids), ids[0])
+    )
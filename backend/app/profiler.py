@@ -0,0 +1,259 @@
+"""
+Sampling profiler for finding where request time goes in production.
+
+A sampler thread snapshots the stack of every thread (sys._current_frames)
+every PROFILE_INTERVAL_MS and counts identical stacks. Nothing is hooked
+into the code being profiled, so the cost is the sampler's own work, paid
+only while a capture runs. Stacks are rooted at the kind of thread they came
+from: "event-loop" (async endpoints, middleware), "threadpool" (sync
+endpoints and run_in_threadpool work such as Pillow, bcrypt and storage
+I/O), or the thread's own name (email workers, backups...). Threads that
+are just waiting for work are left out unless idle=True.
+
+Output is the collapsed-stack format ("root;frame;frame count" per line)
+read by flamegraph.pl, speedscope and inferno.
+
+Admins capture on demand with GET /api/admin/profile?seconds=N. With
+PROFILE_AUTO_P99 set, a monitor checks request latency every
+PROFILE_AUTO_CHECK seconds (from the /metrics histograms, live update
+streams excluded) and when the p99 goes over the threshold it records a
+PROFILE_AUTO_SECONDS capture to PROFILE_DIR, at most once per
+PROFILE_AUTO_COOLDOWN seconds.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from app import metrics
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", Path(__file__).resolve().parent.parent / "profiles"))
+PROFILE_AUTO_P99 = float(os.getenv("PROFILE_AUTO_P99", "0"))  # Seconds; 0 disables
+PROFILE_AUTO_SECONDS = float(os.getenv("PROFILE_AUTO_SECONDS", "10"))
+PROFILE_AUTO_CHECK = float(os.getenv("PROFILE_AUTO_CHECK", "30"))
+PROFILE_AUTO_COOLDOWN = float(os.getenv("PROFILE_AUTO_COOLDOWN", "600"))
+PROFILE_AUTO_MIN_REQUESTS = 20  # Don't judge a p99 on fewer requests than this
+PROFILE_KEEP = 20  # Saved automatic captures
+
+# Leaf frames of a thread that is waiting for work, not doing any
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("selectors.py", "poll"),
+    ("runners.py", "run"),  # uvloop: the loop itself has no Python frames
+}
+# Route label of the live update stream: open for minutes by design, not slow
+_EXCLUDED_ROUTES = {"/api/events"}
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+_capture_lock = threading.Lock()
+_loop_thread_id: Optional[int] = None
+
+
+def set_loop_thread():
+    """Remember the event loop's thread (call from the loop, at startup)"""
+    global _loop_thread_id
+    _loop_thread_id = threading.get_ident()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    parts = Path(code.co_filename).parts[-2:]
+    return f"{code.co_name} ({'/'.join(parts)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _thread_label(ident: int, names: dict) -> str:
+    if ident == _loop_thread_id:
+        return "event-loop"
+    name = names.get(ident, "unknown")
+    if name.startswith("AnyIO worker thread"):
+        return "threadpool"
+    return name.replace(";", ":").replace(" ", "_")
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (Path(code.co_filename).name, code.co_name) in _IDLE_LEAVES
+
+
+class Capture:
+    def __init__(self, interval: float, include_idle: bool):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.0
+
+    def sample(self, skip: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip or (not self.include_idle and _is_idle(frame)):
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(_frame_label(frame))
+                frame = frame.f_back
+            frames.append(_thread_label(ident, names))
+            self.stacks[";".join(reversed(frames))] += 1
+        self.samples += 1
+
+    def run(self, seconds: float):
+        """Sample on the calling thread for seconds"""
+        me = threading.get_ident()
+        self.started = time.time()
+        start = time.perf_counter()
+        deadline = start + seconds
+        next_tick = start
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if now >= next_tick:
+                self.sample(me)
+                next_tick += self.interval
+                if next_tick < now:  # Fell behind: skip missed ticks rather than bursting
+                    next_tick = now + self.interval
+            time.sleep(max(0.0, min(next_tick, deadline) - time.perf_counter()))
+        self.elapsed = time.perf_counter() - start
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def capture(seconds: float, interval_ms: float = PROFILE_INTERVAL_MS, include_idle: bool = False) -> Capture:
+    """Profile every thread for seconds (blocking). One capture at a time: raises ProfilerBusy"""
+    seconds = max(0.1, min(seconds, PROFILE_MAX_SECONDS))
+    interval = max(1.0, interval_ms) / 1000
+    if not _capture_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already being captured")
+    try:
+        result = Capture(interval, include_idle)
+        result.run(seconds)
+        return result
+    finally:
+        _capture_lock.release()
+
+
+async def capture_async(seconds: float, interval_ms: float = PROFILE_INTERVAL_MS, include_idle: bool = False) -> Capture:
+    """capture() on its own thread, awaited without blocking the event loop or taking a threadpool slot"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def target():
+        try:
+            result = capture(seconds, interval_ms, include_idle)
+        except Exception as e:
+            loop.call_soon_threadsafe(future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(future.set_result, result)
+
+    threading.Thread(target=target, name="profiler", daemon=True).start()
+    return await future
+
+
+# Saved captures (automatic triggers)
+
+def save(result: Capture, prefix: str) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / f"{prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+    path.write_text(result.collapsed())
+    for old in list_saved()[PROFILE_KEEP:]:
+        (PROFILE_DIR / old["name"]).unlink(missing_ok=True)
+    return path
+
+
+def list_saved() -> List[dict]:
+    """Saved captures, newest first"""
+    if not PROFILE_DIR.exists():
+        return []
+    files = sorted(PROFILE_DIR.glob("*.folded"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [
+        {"name": path.name, "size": path.stat().st_size,
+         "created_at": datetime.fromtimestamp(path.stat().st_mtime).isoformat(timespec="seconds")}
+        for path in files
+    ]
+
+
+def saved_path(name: str) -> Optional[Path]:
+    path = PROFILE_DIR / Path(name).name
+    return path if path.suffix == ".folded" and path.exists() else None
+
+
+# Automatic capture on slow p99
+
+def p99_seconds(bucket_counts: List[int]) -> Optional[float]:
+    """Upper bound of the latency bucket holding the 99th percentile, None if too few requests"""
+    total = sum(bucket_counts)
+    if total < PROFILE_AUTO_MIN_REQUESTS:
+        return None
+    bounds = list(metrics.http_latency.buckets) + [float("inf")]
+    cumulative = 0
+    for bound, count in zip(bounds, bucket_counts):
+        cumulative += count
+        if cumulative >= 0.99 * total:
+            return bound
+    return bounds[-1]
+
+
+class AutoProfiler:
+    """Watches request latency and records a capture when the p99 goes over the threshold"""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_capture = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="auto-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _latency_counts(self) -> List[int]:
+        return metrics.http_latency.merged(lambda labels: labels[1] not in _EXCLUDED_ROUTES)
+
+    def _watch(self):
+        previous = self._latency_counts()
+        while not self._stop.wait(PROFILE_AUTO_CHECK):
+            current = self._latency_counts()
+            p99 = p99_seconds([now - before for now, before in zip(current, previous)])
+            previous = current
+            if p99 is None or p99 <= self.threshold:
+                continue
+            if time.monotonic() - self._last_capture < PROFILE_AUTO_COOLDOWN:
+                continue
+            self._last_capture = time.monotonic()
+            try:
+                path = save(capture(PROFILE_AUTO_SECONDS), "auto")
+                log.warning("Request p99 over threshold, profile captured", extra={
+                    "p99_seconds": p99, "threshold": self.threshold, "profile": path.name
+                })
+            except ProfilerBusy:
+                pass
+            except Exception:
+                log.exception("Automatic profile capture failed")
+            previous = self._latency_counts()
+
+
+auto_profiler = AutoProfiler(PROFILE_AUTO_P99) if PROFILE_AUTO_P99 > 0 else None
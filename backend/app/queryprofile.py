@@ -0,0 +1,164 @@
+"""
+SQL query profiler and N+1 detector (development and CI).
+
+With QUERY_PROFILE=true every API response carries:
+
+    X-DB-Queries:  statements executed while handling the request
+    X-DB-Time-Ms:  time spent in the database driver
+    X-DB-Repeated: statement shapes run QUERY_PROFILE_REPEAT or more times
+
+A shape is the SQL text with literals and IN-list lengths normalized, so a
+query issued once per row of a loop (the classic N+1) shows up as one shape
+with a high count. Requests with repeated shapes are also logged as
+warnings, with the offending SQL.
+
+`profile_queries()` does the same for code that runs outside a request
+(scripts, the importer) and `query_budget()` turns it into a check that
+raises QueryBudgetExceeded; check_query_budgets.py runs the main endpoints
+against their budgets for CI.
+
+Off by default: the engine hooks are only installed when profiling is on.
+"""
+
+import contextvars
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+QUERY_PROFILE = os.getenv("QUERY_PROFILE", "false").lower() == "true"
+QUERY_PROFILE_REPEAT = int(os.getenv("QUERY_PROFILE_REPEAT", "5"))
+
+_PLACEHOLDER = r"(?:\?|%\(\w+\)s|%s|:\w+|\$\?)"
+_IN_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """SQL with literals replaced and IN (...) lists collapsed"""
+    shape = _LITERAL.sub("?", statement)
+    shape = _IN_LIST.sub("(?)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryProfile:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int = QUERY_PROFILE_REPEAT) -> List[Tuple[str, int]]:
+        """Shapes executed at least threshold times, most frequent first"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def headers(self) -> List[Tuple[bytes, bytes]]:
+        return [
+            (b"x-db-queries", str(self.count).encode()),
+            (b"x-db-time-ms", f"{self.seconds * 1000:.1f}".encode()),
+            (b"x-db-repeated", str(len(self.repeated())).encode()),
+        ]
+
+
+_current: contextvars.ContextVar[Optional[QueryProfile]] = contextvars.ContextVar("query_profile", default=None)
+_instrumented = set()
+
+
+def instrument_engine(engine):
+    """Time every statement and attribute it to the active profile, if any"""
+    if id(engine) in _instrumented:
+        return
+    _instrumented.add(id(engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        profile = _current.get()
+        if profile is not None:
+            profile.record(statement, time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+@contextmanager
+def profile_queries():
+    """Collect the statements run in this context (and threads it hands work to)"""
+    profile = QueryProfile()
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: int, max_repeats: Optional[int] = None):
+    """Raise QueryBudgetExceeded if the block runs more than max_queries statements,
+    or any one shape more than max_repeats times"""
+    with profile_queries() as profile:
+        yield profile
+    check_budget(profile, max_queries, max_repeats)
+
+
+def check_budget(profile: QueryProfile, max_queries: int, max_repeats: Optional[int] = None):
+    problems = []
+    if profile.count > max_queries:
+        problems.append(f"{profile.count} queries (budget {max_queries})")
+    if max_repeats is not None:
+        problems.extend(
+            f"{count}x {shape}" for shape, count in profile.shapes.most_common() if count > max_repeats
+        )
+    if problems:
+        raise QueryBudgetExceeded("; ".join(problems))
+
+
+class QueryProfileMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        with profile_queries() as profile:
+            async def send_with_profile(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + profile.headers()
+                await send(message)
+
+            await self.app(scope, receive, send_with_profile)
+
+        repeated = profile.repeated()
+        if repeated:
+            log.warning("Repeated queries (possible N+1)", extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "queries": profile.count,
+                "repeated": [{"count": count, "sql": shape[:300]} for shape, count in repeated[:5]],
+            })
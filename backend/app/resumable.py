@@ -0,0 +1,86 @@
+"""
+Resumable chunked uploads for large audio recordings and files.
+
+Protocol:
+    1. POST   /api/uploads                  -> upload_id, chunk_size, max_parallel
+    2. PUT    /api/uploads/{id}?offset=N     body = bytes [N, N + chunk_size)
+       Chunks may be sent in any order and up to max_parallel at a time.
+    3. GET    /api/uploads/{id}              -> offsets received so far; after a dropped
+       connection the client re-sends only the missing ones
+    4. POST   /api/uploads/{id}/complete     -> assembles the chunks and creates the
+       AudioRecording / File row
+
+Chunks are staged on local disk, or sent straight to S3/R2 as multipart parts
+when cloud storage is configured so finalizing is a server-side assemble.
+"""
+
+import os
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from app import models, storage
+
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+MAX_PARALLEL = int(os.getenv("UPLOAD_MAX_PARALLEL", "4"))
+MAX_UPLOAD_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", str(5 * 1024 * 1024 * 1024)))
+SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "48"))
+
+# Kept outside uploads/ so half-finished chunks are never publicly served
+STAGING_DIR = Path(os.getenv("UPLOAD_STAGING_DIR", "upload_staging"))
+
+# Upload kind -> storage folder
+KIND_FOLDERS = {
+    "audio": "audio",
+    "file": "files",
+}
+
+
+def effective_chunk_size() -> int:
+    """Chunk size for new sessions (S3 rejects parts under 5 MB except the last)"""
+    if storage.is_cloud_storage_configured():
+        return max(CHUNK_SIZE, storage.S3_MIN_PART_SIZE)
+    return CHUNK_SIZE
+
+
+def staging_dir(upload_id: str) -> Path:
+    return STAGING_DIR / upload_id
+
+
+def chunk_path(upload_id: str, offset: int) -> Path:
+    return staging_dir(upload_id) / f"{offset:020d}.part"
+
+
+def expected_offsets(session: models.UploadSession) -> List[int]:
+    return list(range(0, session.total_size, session.chunk_size)) or [0]
+
+
+def expected_chunk_size(session: models.UploadSession, offset: int) -> int:
+    return min(session.chunk_size, session.total_size - offset)
+
+
+def missing_offsets(session: models.UploadSession) -> List[int]:
+    received = {chunk.offset for chunk in session.chunks}
+    return [offset for offset in expected_offsets(session) if offset not in received]
+
+
+def discard_session(db: Session, session: models.UploadSession):
+    """Drop a session's staged chunks, cloud parts and rows (caller commits)"""
+    if session.s3_upload_id:
+        storage.abort_multipart_upload(session.s3_upload_id, session.filename, KIND_FOLDERS[session.kind])
+    shutil.rmtree(staging_dir(session.id), ignore_errors=True)
+    db.delete(session)  # Chunk rows go with it (delete-orphan cascade)
+
+
+def expire_stale_sessions(db: Session) -> int:
+    """Discard sessions abandoned for longer than SESSION_TTL_HOURS"""
+    cutoff = datetime.utcnow() - timedelta(hours=SESSION_TTL_HOURS)
+    stale = db.query(models.UploadSession).filter(
+        models.UploadSession.created_at < cutoff
+    ).all()
+    for session in stale:
+        discard_session(db, session)
+    return len(stale)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -87,6 +87,37 @@ class Photo(PhotoBase):
         from_attributes = True
 
 
+class PhotoMetadata(BaseModel):
+    photo_id: int
+    format: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    orientation: Optional[int] = None
+    taken_at: Optional[datetime] = None
+    camera_make: Optional[str] = None
+    camera_model: Optional[str] = None
+    lens_model: Optional[str] = None
+    gps_latitude: Optional[float] = None
+    gps_longitude: Optional[float] = None
+    gps_altitude: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+
+class PhotoBatchItem(BaseModel):
+    filename: Optional[str] = None
+    status: str  # "ok" or "error"
+    photo: Optional[Photo] = None
+    error: Optional[str] = None
+
+
+class PhotoBatchResult(BaseModel):
+    uploaded: int
+    failed: int
+    results: List[PhotoBatchItem] = []
+
+
 class AlbumBase(BaseModel):
     name: str
     description: Optional[str] = None
@@ -118,14 +149,34 @@ class PersonBase(BaseModel):
     name: str
 
 
+class PersonCreate(PersonBase):
+    pass
+
+
 class Person(PersonBase):
     id: int
     created_at: datetime
-    
+
     class Config:
         from_attributes = True
 
 
+class PhotoPeopleTags(BaseModel):
+    """Bulk tag/untag request: every person is applied to every photo"""
+    photo_ids: List[int]
+    person_ids: List[int]
+
+
+class PhotoPeople(BaseModel):
+    photo_id: int
+    people: List[Person] = []
+
+
+class PhotoPage(BaseModel):
+    photos: List['Photo'] = []
+    next_cursor: Optional[int] = None
+
+
 class AudioRecordingBase(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -146,6 +197,16 @@ class AudioRecording(AudioRecordingBase):
         from_attributes = True
 
 
+class AudioRendition(BaseModel):
+    kind: str
+    mime_type: Optional[str] = None
+    bitrate: Optional[int] = None
+    size: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+
 class FileBase(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -172,6 +233,26 @@ class File(FileBase):
         from_attributes = True
 
 
+class UploadSessionCreate(BaseModel):
+    kind: str  # "audio" or "file"
+    filename: str
+    total_size: int
+    content_type: Optional[str] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    source: Optional[str] = "vignettes"  # Only used for kind == "file"
+
+
+class UploadSessionStatus(BaseModel):
+    upload_id: str
+    kind: str
+    total_size: int
+    chunk_size: int
+    max_parallel: int
+    received_bytes: int
+    missing_offsets: List[int] = []
+
+
 class PasswordResetRequest(BaseModel):
     email: EmailStr
 
@@ -193,6 +274,17 @@ class InviteCodeCreate(BaseModel):
     recipient_name: Optional[str] = None
 
 
+class InviteRecipient(BaseModel):
+    email: Optional[EmailStr] = None
+    name: Optional[str] = None
+
+
+class BulkInviteCreate(BaseModel):
+    recipients: List[InviteRecipient] = Field(..., min_length=1, max_length=1000)
+    expires_in_days: Optional[int] = 30
+    send_email: bool = False
+
+
 class InviteCode(BaseModel):
     id: int
     code: str
@@ -241,4 +333,5 @@ class BackgroundImage(BaseModel):
 # Update forward references
 Vignette.model_rebuild()
 AlbumWithPhotos.model_rebuild()
+PhotoPage.model_rebuild()
 
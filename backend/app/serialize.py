@@ -0,0 +1,61 @@
+"""
+Fast path for large JSON list responses.
+
+List endpoints select only the columns their response schema declares
+(`schema_columns`), turn the rows into plain dicts and hand them to
+`FastJSONResponse`, which encodes with orjson when it is installed. Returning
+a Response directly skips FastAPI's per-object Pydantic validation; the rows
+come straight from the database, whose columns the schemas mirror. The
+`response_model` on the route is kept for the OpenAPI docs.
+
+See benchmark_serialization.py for the numbers.
+"""
+
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib encoder
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def schema_columns(schema, model) -> list:
+    """The model columns for every field of a response schema, labelled by field name"""
+    return [getattr(model, name).label(name) for name in schema.model_fields if name in model.__table__.c]
+
+
+def rows_to_dicts(result) -> List[Dict[str, Any]]:
+    """Plain dicts from a column-projection result"""
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+def group_by(rows: Iterable[Dict[str, Any]], key: str) -> Dict[Any, List[Dict[str, Any]]]:
+    """Group rows by one column, dropping that column from each row"""
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(row.pop(key), []).append(row)
+    return groups
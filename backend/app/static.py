@@ -0,0 +1,185 @@
+"""
+Serving the built React frontend (frontend/dist).
+
+- /assets files are fingerprinted by Vite (index-3f9a1c2b.js), so they get a
+  year-long immutable Cache-Control. Brotli/gzip variants written at build
+  time by precompress_frontend.py (index-3f9a1c2b.js.br / .gz) are served
+  when the browser accepts them.
+- index.html is kept in memory (reloaded when the file changes) with an ETag
+  and must be revalidated on every navigation, so a new deploy is picked up
+  immediately.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+import threading
+from pathlib import Path
+
+import anyio
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip variants only
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Vite names build output <name>-<8 char hash>.<ext>
+FINGERPRINT = re.compile(r"-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$")
+
+COMPRESSIBLE = {".js", ".mjs", ".css", ".html", ".svg", ".json", ".map", ".txt", ".xml", ".ico", ".wasm"}
+MIN_COMPRESS_SIZE = 1024
+
+# Preference order when the browser accepts several
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepted_encodings(headers: Headers) -> set:
+    """Encodings the client accepts (ignores q-values except q=0)"""
+    accepted = set()
+    for item in headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def _media_type(path: str) -> str:
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+    return media_type
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that prefers .br/.gz siblings and sets cache headers by fingerprint"""
+
+    async def get_response(self, path: str, scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if not stat_result or not stat.S_ISREG(stat_result.st_mode):
+            raise HTTPException(status_code=404)
+
+        request_headers = Headers(scope=scope)
+        headers = {
+            "Cache-Control": IMMUTABLE if FINGERPRINT.search(path) else REVALIDATE,
+        }
+        if Path(path).suffix.lower() in COMPRESSIBLE:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request_headers)
+            for encoding, suffix in ENCODINGS:
+                if encoding not in accepted:
+                    continue
+                variant_path, variant_stat = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                if variant_stat and stat.S_ISREG(variant_stat.st_mode):
+                    full_path, stat_result = variant_path, variant_stat
+                    headers["Content-Encoding"] = encoding
+                    break
+
+        response = FileResponse(
+            full_path,
+            stat_result=stat_result,
+            media_type=_media_type(path),
+            headers=headers,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class IndexPage:
+    """index.html held in memory, with precomputed compressed bodies and an ETag"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._bodies = {}
+        self._etag = None
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return True
+        with self._lock:
+            if mtime != self._mtime:
+                body = self.path.read_bytes()
+                bodies = {"identity": body, "gzip": gzip.compress(body, 9)}
+                if brotli is not None:
+                    bodies["br"] = brotli.compress(body, quality=11)
+                self._bodies = bodies
+                self._etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+                self._mtime = mtime
+        return True
+
+    def response(self, request: Request) -> Response:
+        if not self._load():
+            raise HTTPException(
+                status_code=503,
+                detail="Frontend not built. Run 'cd frontend && npm run build' first."
+            )
+
+        headers = {"ETag": self._etag, "Cache-Control": REVALIDATE, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if self._etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        accepted = accepted_encodings(request.headers)
+        encoding = next((name for name, _suffix in ENCODINGS if name in accepted and name in self._bodies), None)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(
+            content=self._bodies[encoding or "identity"],
+            media_type="text/html",
+            headers=headers,
+        )
+
+
+def precompress(build_dir: Path, force: bool = False) -> dict:
+    """Write .gz (and .br, if the brotli package is installed) next to every compressible file.
+
+    Variants newer than their source are kept unless force is set; variants
+    that don't make the file smaller are not written.
+    """
+    totals = {"files": 0, "written": 0, "bytes": 0, "gzip_bytes": 0, "br_bytes": 0}
+    for path in sorted(build_dir.rglob("*")):
+        if not path.is_file() or path.suffix.lower() not in COMPRESSIBLE:
+            continue
+        size = path.stat().st_size
+        if size < MIN_COMPRESS_SIZE:
+            continue
+        totals["files"] += 1
+        totals["bytes"] += size
+        data = None
+        for encoding, suffix in ENCODINGS:
+            if encoding == "br" and brotli is None:
+                continue
+            variant = path.with_name(path.name + suffix)
+            if not force and variant.exists() and variant.stat().st_mtime >= path.stat().st_mtime:
+                totals[f"{encoding}_bytes"] += variant.stat().st_size
+                continue
+            if data is None:
+                data = path.read_bytes()
+            compressed = brotli.compress(data, quality=11) if encoding == "br" else gzip.compress(data, 9, mtime=0)
+            if len(compressed) >= size:
+                variant.unlink(missing_ok=True)
+                continue
+            variant.write_bytes(compressed)
+            totals["written"] += 1
+            totals[f"{encoding}_bytes"] += len(compressed)
+    return totals
@@ -4,12 +4,19 @@ Falls back to local filesystem if cloud storage is not configured.
 """
 
 import os
+import shutil
 import boto3
+from functools import lru_cache
 from botocore.exceptions import ClientError
 from botocore.client import Config
-from typing import Optional, BinaryIO
+from typing import List, Optional, BinaryIO
 from pathlib import Path
 
+from app.metrics import timed_storage
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
 
 def get_storage_config():
     """Get storage configuration from environment variables"""
@@ -37,19 +44,24 @@ def is_cloud_storage_configured():
 
 
 def get_s3_client():
-    """Get configured S3 client"""
+    """Get configured S3 client (shared; boto3 clients are thread-safe)"""
     config = get_storage_config()
+    return _s3_client(config['endpoint_url'], config['access_key'], config['secret_key'])
 
+
+@lru_cache(maxsize=4)
+def _s3_client(endpoint_url, access_key, secret_key):
     return boto3.client(
         's3',
-        endpoint_url=config['endpoint_url'],
-        aws_access_key_id=config['access_key'],
-        aws_secret_access_key=config['secret_key'],
+        endpoint_url=endpoint_url,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
         config=Config(signature_version='s3v4'),
         region_name='auto'  # R2 uses 'auto'
     )
 
 
+@timed_storage("upload", path_arg=False)
 def upload_file(
     file_data: BinaryIO,
     filename: str,
@@ -101,22 +113,28 @@ def _upload_to_cloud(
     try:
         # Upload to S3/R2
         s3_client.put_object(**upload_args)
-
-        # Return public URL
-        if config['public_url']:
-            return f"{config['public_url']}/{s3_key}"
-        else:
-            # Generate presigned URL (temporary)
-            return s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': config['bucket_name'], 'Key': s3_key},
-                ExpiresIn=31536000  # 1 year
-            )
+        return _cloud_url(s3_client, s3_key)
     except ClientError as e:
-        print(f"[STORAGE] Failed to upload to cloud: {e}")
+        log.error("Failed to upload to cloud", extra={"key": s3_key, "error": str(e)})
         raise Exception(f"Failed to upload file: {str(e)}")
 
 
+def _cloud_url(s3_client, s3_key: str) -> str:
+    """Public URL for an object, or a long-lived presigned URL if no public URL is configured"""
+    config = get_storage_config()
+
+    # Return public URL
+    if config['public_url']:
+        return f"{config['public_url']}/{s3_key}"
+    else:
+        # Generate presigned URL (temporary)
+        return s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': config['bucket_name'], 'Key': s3_key},
+            ExpiresIn=31536000  # 1 year
+        )
+
+
 def _upload_to_local(file_data: BinaryIO, filename: str, folder: str) -> str:
     """Upload file to local filesystem (fallback)"""
     upload_dir = Path("uploads") / folder
@@ -126,13 +144,139 @@ def _upload_to_local(file_data: BinaryIO, filename: str, folder: str) -> str:
 
     with open(file_path, "wb") as f:
         if hasattr(file_data, 'read'):
-            f.write(file_data.read())
+            shutil.copyfileobj(file_data, f)
         else:
             f.write(file_data)
 
     return str(file_path)
 
 
+@timed_storage("download")
+def download_file(file_path_or_url: str, dest_path: str) -> None:
+    """Stream a stored file to a local path without holding it in memory"""
+
+    if is_cloud_storage_configured() and file_path_or_url.startswith('http'):
+        config = get_storage_config()
+        try:
+            get_s3_client().download_file(config['bucket_name'], _s3_key_from_url(file_path_or_url), dest_path)
+        except ClientError as e:
+            log.error("Failed to download from cloud", extra={"error": str(e)})
+            raise Exception(f"Failed to download file: {str(e)}")
+    else:
+        shutil.copyfile(file_path_or_url, dest_path)
+
+
+# Multipart uploads (used by resumable uploads)
+#
+# With cloud storage each chunk becomes an S3 multipart part, and completing
+# the upload is a server-side assemble - the bytes never pass through here
+# again. Locally, chunks are concatenated straight into the uploads/ folder.
+
+S3_MIN_PART_SIZE = 5 * 1024 * 1024  # S3/R2 minimum for every part except the last
+
+
+def begin_multipart_upload(filename: str, folder: str, content_type: Optional[str] = None) -> Optional[str]:
+    """
+    Start a multipart upload.
+
+    Returns:
+        The S3 UploadId, or None when using local storage (nothing to start)
+    """
+
+    if not is_cloud_storage_configured():
+        return None
+
+    config = get_storage_config()
+    args = {'Bucket': config['bucket_name'], 'Key': f"{folder}/{filename}"}
+    if content_type:
+        args['ContentType'] = content_type
+
+    try:
+        return get_s3_client().create_multipart_upload(**args)['UploadId']
+    except ClientError as e:
+        log.error("Failed to start multipart upload", extra={"error": str(e)})
+        raise Exception(f"Failed to start upload: {str(e)}")
+
+
+@timed_storage("upload_part", path_arg=False)
+def upload_part(upload_id: str, filename: str, folder: str, part_number: int, file_data: BinaryIO) -> str:
+    """Upload one part of a cloud multipart upload, returning its ETag"""
+    config = get_storage_config()
+
+    try:
+        response = get_s3_client().upload_part(
+            Bucket=config['bucket_name'],
+            Key=f"{folder}/{filename}",
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=file_data,
+        )
+        return response['ETag']
+    except ClientError as e:
+        log.error("Failed to upload part", extra={"part_number": part_number, "error": str(e)})
+        raise Exception(f"Failed to upload part: {str(e)}")
+
+
+@timed_storage("complete_multipart", path_arg=False)
+def complete_multipart_upload(upload_id: str, filename: str, folder: str, etags: List[str]) -> str:
+    """
+    Assemble uploaded parts (in order) into the final object.
+
+    Returns:
+        URL to access the uploaded file
+    """
+    config = get_storage_config()
+    s3_client = get_s3_client()
+    s3_key = f"{folder}/{filename}"
+
+    try:
+        s3_client.complete_multipart_upload(
+            Bucket=config['bucket_name'],
+            Key=s3_key,
+            UploadId=upload_id,
+            MultipartUpload={
+                'Parts': [{'ETag': etag, 'PartNumber': i + 1} for i, etag in enumerate(etags)]
+            },
+        )
+        return _cloud_url(s3_client, s3_key)
+    except ClientError as e:
+        log.error("Failed to complete multipart upload", extra={"error": str(e)})
+        raise Exception(f"Failed to complete upload: {str(e)}")
+
+
+def abort_multipart_upload(upload_id: str, filename: str, folder: str) -> bool:
+    """Discard a cloud multipart upload and any parts already stored"""
+    config = get_storage_config()
+
+    try:
+        get_s3_client().abort_multipart_upload(
+            Bucket=config['bucket_name'],
+            Key=f"{folder}/{filename}",
+            UploadId=upload_id,
+        )
+        return True
+    except ClientError as e:
+        log.warning("Failed to abort multipart upload", extra={"error": str(e)})
+        return False
+
+
+@timed_storage("assemble", path_arg=False)
+def assemble_local(part_paths: List[Path], filename: str, folder: str) -> str:
+    """Concatenate staged chunk files (in order) into the local uploads folder"""
+    upload_dir = Path("uploads") / folder
+    upload_dir.mkdir(parents=True, exist_ok=True)
+
+    file_path = upload_dir / filename
+
+    with open(file_path, "wb") as out:
+        for part_path in part_paths:
+            with open(part_path, "rb") as part:
+                shutil.copyfileobj(part, out, 1024 * 1024)
+
+    return str(file_path)
+
+
+@timed_storage("delete")
 def delete_file(file_path_or_url: str) -> bool:
     """
     Delete a file from cloud storage or local filesystem.
@@ -150,23 +294,28 @@ def delete_file(file_path_or_url: str) -> bool:
         return _delete_from_local(file_path_or_url)
 
 
+def _s3_key_from_url(file_url: str) -> str:
+    """Extract the S3 key (folder/filename) from a public or presigned URL"""
+    config = get_storage_config()
+    if config['public_url'] and file_url.startswith(config['public_url']):
+        return file_url.replace(f"{config['public_url']}/", "")
+    # Try to extract from presigned URL
+    return file_url.split('/')[-2] + '/' + file_url.split('/')[-1].split('?')[0]
+
+
 def _delete_from_cloud(file_url: str) -> bool:
     """Delete file from cloud storage"""
     config = get_storage_config()
     s3_client = get_s3_client()
 
     # Extract S3 key from URL
-    if config['public_url'] and file_url.startswith(config['public_url']):
-        s3_key = file_url.replace(f"{config['public_url']}/", "")
-    else:
-        # Try to extract from presigned URL
-        s3_key = file_url.split('/')[-2] + '/' + file_url.split('/')[-1].split('?')[0]
+    s3_key = _s3_key_from_url(file_url)
 
     try:
         s3_client.delete_object(Bucket=config['bucket_name'], Key=s3_key)
         return True
     except ClientError as e:
-        print(f"[STORAGE] Failed to delete from cloud: {e}")
+        log.warning("Failed to delete from cloud", extra={"key": s3_key, "error": str(e)})
         return False
 
 
@@ -178,10 +327,111 @@ def _delete_from_local(file_path: str) -> bool:
             return True
         return False
     except Exception as e:
-        print(f"[STORAGE] Failed to delete from local: {e}")
+        log.warning("Failed to delete from local", extra={"path": file_path, "error": str(e)})
         return False
 
 
+@timed_storage("read")
+def read_file(file_path_or_url: str, max_bytes: Optional[int] = None) -> bytes:
+    """
+    Read a stored file back into memory from cloud storage or local filesystem.
+
+    Args:
+        file_path_or_url: Path or URL of the file, as returned by upload_file
+        max_bytes: Only read the first max_bytes (ranged GET for cloud storage)
+
+    Returns:
+        The file contents
+    """
+
+    if is_cloud_storage_configured() and file_path_or_url.startswith('http'):
+        config = get_storage_config()
+        s3_client = get_s3_client()
+        args = {
+            'Bucket': config['bucket_name'],
+            'Key': _s3_key_from_url(file_path_or_url),
+        }
+        if max_bytes:
+            args['Range'] = f"bytes=0-{max_bytes - 1}"
+        try:
+            return s3_client.get_object(**args)['Body'].read()
+        except ClientError as e:
+            log.error("Failed to read from cloud", extra={"error": str(e)})
+            raise Exception(f"Failed to read file: {str(e)}")
+    else:
+        with open(file_path_or_url, "rb") as f:
+            return f.read(max_bytes) if max_bytes else f.read()
+
+
+def is_cloud_path(file_path_or_url: str) -> bool:
+    return is_cloud_storage_configured() and file_path_or_url.startswith('http')
+
+
+def object_key(file_url: str) -> str:
+    """Bucket key of a cloud file URL (as returned by upload_file)"""
+    return _s3_key_from_url(file_url)
+
+
+def same_file(a: str, b: str) -> bool:
+    """Whether two upload_file results name the same stored file.
+
+    Without a public URL every cloud upload returns a fresh presigned URL, so
+    a file re-uploaded under the same name must be compared by bucket key.
+    """
+    if is_cloud_path(a) and is_cloud_path(b):
+        return object_key(a) == object_key(b)
+    return a == b
+
+
+@timed_storage("read_range")
+def read_range(file_path_or_url: str, start: int, length: int) -> bytes:
+    """Read length bytes at offset start (ranged GET for cloud storage)"""
+
+    if is_cloud_path(file_path_or_url):
+        config = get_storage_config()
+        try:
+            return get_s3_client().get_object(
+                Bucket=config['bucket_name'],
+                Key=_s3_key_from_url(file_path_or_url),
+                Range=f"bytes={start}-{start + length - 1}"
+            )['Body'].read()
+        except ClientError as e:
+            log.error("Failed to read range from cloud", extra={"error": str(e)})
+            raise Exception(f"Failed to read file: {str(e)}")
+    else:
+        with open(file_path_or_url, "rb") as f:
+            f.seek(start)
+            return f.read(length)
+
+
+def list_cloud_objects(prefix: str = ""):
+    """
+    Yield every object in the bucket as {"key", "size", "etag", "last_modified"}.
+    Listing only reads metadata, so it's cheap even for large libraries.
+    """
+    config = get_storage_config()
+    paginator = get_s3_client().get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=config['bucket_name'], Prefix=prefix):
+        for obj in page.get('Contents', []):
+            yield {
+                "key": obj['Key'],
+                "size": obj['Size'],
+                "etag": obj['ETag'].strip('"'),
+                "last_modified": obj['LastModified'],
+            }
+
+
+@timed_storage("open", path_arg=False)
+def open_cloud_object(key: str):
+    """Readable stream of a bucket object by key (caller closes it)"""
+    config = get_storage_config()
+    try:
+        return get_s3_client().get_object(Bucket=config['bucket_name'], Key=key)['Body']
+    except ClientError as e:
+        log.error("Failed to open cloud object", extra={"key": key, "error": str(e)})
+        raise Exception(f"Failed to read file: {str(e)}")
+
+
 def get_file_url(file_path_or_url: str) -> str:
     """
     Get the public URL for a file.
@@ -0,0 +1,187 @@
+"""
+Optional audio transcoding to bitrate-capped streaming renditions.
+
+For every recording ffmpeg produces:
+    - "opus": Opus in WebM, capped at AUDIO_OPUS_BITRATE (Chrome, Firefox, Android)
+    - "aac":  AAC in MP4/M4A, capped at AUDIO_AAC_BITRATE (Safari/iOS, everything else)
+    - "hls":  for recordings longer than AUDIO_HLS_MIN_SECONDS, an HLS playlist of
+              short AAC segments so long oral histories start playing immediately
+
+Renditions are built by a background task after upload, or in bulk by
+transcode_audio.py. Transcoding is off unless AUDIO_TRANSCODE=true and
+ffmpeg is installed; the original upload is always kept and served as a
+fallback.
+"""
+
+import os
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+from app import models, storage
+from app.audio import FFMPEG, local_copy
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+TRANSCODE_ENABLED = os.getenv("AUDIO_TRANSCODE", "false").lower() == "true"
+OPUS_BITRATE = int(os.getenv("AUDIO_OPUS_BITRATE", "64000"))
+AAC_BITRATE = int(os.getenv("AUDIO_AAC_BITRATE", "96000"))
+HLS_MIN_SECONDS = int(os.getenv("AUDIO_HLS_MIN_SECONDS", "600"))
+HLS_SEGMENT_SECONDS = 10
+
+RENDITIONS_FOLDER = "audio_renditions"
+HLS_FOLDER = "audio_hls"
+
+# Rendition kind -> (file extension, MIME type)
+RENDITION_TYPES = {
+    "opus": (".webm", "audio/webm"),
+    "aac": (".m4a", "audio/mp4"),
+    "hls": (".m3u8", "application/vnd.apple.mpegurl"),
+}
+
+
+def is_enabled() -> bool:
+    return TRANSCODE_ENABLED and FFMPEG is not None
+
+
+def _ffmpeg(*args: str):
+    subprocess.run([FFMPEG, "-v", "error", "-y", *args], check=True, capture_output=True, timeout=3600)
+
+
+def _transcode_file(source: str, kind: str, dest: str):
+    if kind == "opus":
+        _ffmpeg("-i", source, "-vn", "-c:a", "libopus", "-b:a", str(OPUS_BITRATE), "-f", "webm", dest)
+    elif kind == "aac":
+        _ffmpeg("-i", source, "-vn", "-c:a", "aac", "-b:a", str(AAC_BITRATE),
+                "-movflags", "+faststart", "-f", "mp4", dest)
+
+
+def _transcode_hls(source: str, stem: str, out_dir: Path) -> Path:
+    """Segment into HLS; all files share the stem so they can live in one flat storage folder"""
+    playlist = out_dir / f"{stem}.m3u8"
+    _ffmpeg(
+        "-i", source, "-vn", "-c:a", "aac", "-b:a", str(AAC_BITRATE),
+        "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+        "-hls_segment_filename", str(out_dir / f"{stem}_%05d.ts"),
+        str(playlist)
+    )
+    return playlist
+
+
+def _already_efficient(analysis: Optional[models.AudioAnalysis], kind: str) -> bool:
+    """Skip renditions that wouldn't be smaller than the original (e.g. a 48 kbps Opus recording)"""
+    if not analysis or not analysis.codec or not analysis.bitrate:
+        return False
+    if kind == "opus":
+        return analysis.codec == "opus" and analysis.bitrate <= OPUS_BITRATE
+    if kind == "aac":
+        return analysis.codec == "aac" and analysis.bitrate <= AAC_BITRATE
+    return False
+
+
+def _save_rendition(db, audio: models.AudioRecording, kind: str, file_path: str, size: int):
+    rendition = db.query(models.AudioRendition).filter(
+        models.AudioRendition.audio_id == audio.id,
+        models.AudioRendition.kind == kind
+    ).first() or models.AudioRendition(audio_id=audio.id, kind=kind)
+    # Rebuilds re-upload under the same names (presigned URLs still differ): keep those
+    if rendition.file_path and not storage.same_file(rendition.file_path, file_path):
+        delete_rendition_files(rendition)
+    rendition.file_path = file_path
+    rendition.mime_type = RENDITION_TYPES[kind][1]
+    rendition.bitrate = OPUS_BITRATE if kind == "opus" else AAC_BITRATE
+    rendition.size = size
+    db.add(rendition)
+
+
+def transcode_recording(db, audio: models.AudioRecording):
+    """Build all renditions for one recording (caller commits)"""
+    stem = Path(audio.filename).stem
+    analysis = audio.analysis
+
+    with local_copy(audio.file_path) as source, tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+
+        for kind in ("opus", "aac"):
+            if _already_efficient(analysis, kind):
+                continue
+            extension, mime_type = RENDITION_TYPES[kind]
+            dest = tmp_dir / f"{stem}_{kind}{extension}"
+            _transcode_file(source, kind, str(dest))
+            with open(dest, "rb") as f:
+                file_path = storage.upload_file(f, dest.name, RENDITIONS_FOLDER, mime_type)
+            _save_rendition(db, audio, kind, file_path, dest.stat().st_size)
+
+        if audio.duration_seconds and audio.duration_seconds >= HLS_MIN_SECONDS:
+            hls_dir = tmp_dir / "hls"
+            hls_dir.mkdir()
+            playlist = _transcode_hls(source, stem, hls_dir)
+            total = 0
+            for segment in sorted(hls_dir.glob(f"{stem}_*.ts")):
+                total += segment.stat().st_size
+                with open(segment, "rb") as f:
+                    storage.upload_file(f, segment.name, HLS_FOLDER, "video/mp2t")
+            with open(playlist, "rb") as f:
+                playlist_path = storage.upload_file(f, playlist.name, HLS_FOLDER, RENDITION_TYPES["hls"][1])
+            _save_rendition(db, audio, "hls", playlist_path, total)
+
+
+def hls_sibling_path(playlist_path: str, name: str) -> str:
+    """Storage path/URL of a segment stored next to an HLS playlist"""
+    return f"{playlist_path.rsplit('/', 1)[0]}/{name}"
+
+
+def delete_rendition_files(rendition: models.AudioRendition):
+    """Delete a rendition's stored file(s), including HLS segments"""
+    if rendition.kind == "hls":
+        try:
+            playlist = storage.read_file(rendition.file_path).decode("utf-8", "replace")
+            for line in playlist.splitlines():
+                if line and not line.startswith("#"):
+                    storage.delete_file(hls_sibling_path(rendition.file_path, line.strip()))
+        except Exception as e:
+            log.warning("Could not read playlist", extra={"path": rendition.file_path, "error": str(e)})
+    storage.delete_file(rendition.file_path)
+
+
+def pick_rendition(renditions, accept: str, requested: str = "auto") -> Optional[models.AudioRendition]:
+    """
+    Choose which rendition to serve.
+
+    An explicit ?rendition= wins; otherwise the Accept header decides between
+    Opus and AAC, defaulting to AAC which every browser can play.
+    """
+    by_kind = {rendition.kind: rendition for rendition in renditions}
+    if requested == "original":
+        return None
+    if requested != "auto":
+        return by_kind.get(requested)
+
+    accept = (accept or "").lower()
+    if ("audio/webm" in accept or "audio/ogg" in accept or "opus" in accept) and "opus" in by_kind:
+        return by_kind["opus"]
+    return by_kind.get("aac") or by_kind.get("opus")
+
+
+def transcode_recording_task(audio_id: int):
+    """Background task entry point: transcode a freshly uploaded recording in its own session"""
+    if not is_enabled():
+        return
+
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        audio = db.query(models.AudioRecording).filter(models.AudioRecording.id == audio_id).first()
+        if not audio:
+            return
+        transcode_recording(db, audio)
+        db.commit()
+        log.info("Built renditions", extra={"audio_id": audio_id})
+    except Exception:
+        db.rollback()
+        log.exception("Failed to transcode recording", extra={"audio_id": audio_id})
+    finally:
+        db.close()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Probe duration/codec and precompute waveform peaks for existing audio recordings.
+
+Recordings that already have an audio_analysis row are skipped unless
+--reanalyse is given. Non-WAV formats need ffmpeg/ffprobe on the PATH.
+
+Usage:
+    python backfill_audio_analysis.py               # Analyse recordings without analysis
+    python backfill_audio_analysis.py --reanalyse   # Redo every recording
+"""
+
+import sys
+import os
+import argparse
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.database import SessionLocal, init_db
+from app.models import AudioRecording, AudioAnalysis
+from app import audio
+
+
+def backfill(reanalyse: bool):
+    init_db()  # Creates the audio_analysis table if it doesn't exist yet
+    db = SessionLocal()
+    done = 0
+    failed = 0
+
+    try:
+        query = db.query(AudioRecording)
+        if not reanalyse:
+            query = query.outerjoin(
+                AudioAnalysis, AudioAnalysis.audio_id == AudioRecording.id
+            ).filter(AudioAnalysis.id.is_(None))
+
+        if not audio.FFMPEG:
+            print("⚠️  ffmpeg not found - only WAV recordings will get waveforms")
+
+        for recording in query.order_by(AudioRecording.id).all():
+            try:
+                audio.analyse_recording(db, recording)
+                db.commit()
+                done += 1
+                print(f"🎵 {recording.id}: {recording.title} - {recording.duration_seconds}s")
+            except Exception as e:
+                db.rollback()
+                failed += 1
+                print(f"   Failed to analyse {recording.id}: {e}")
+    finally:
+        db.close()
+
+    print(f"\n✅ Done: {done} analysed, {failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill audio duration and waveform peaks")
+    parser.add_argument("--reanalyse", action="store_true", help="Redo recordings that were already analysed")
+    args = parser.parse_args()
+
+    backfill(args.reanalyse)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compute perceptual hashes for photos that don't have one yet.
+
+Photos are read back from cloud storage or the local uploads/ folder,
+hashed in a thread pool, and committed in batches so the job can be
+stopped and re-run at any time.
+
+Usage:
+    python backfill_photo_hashes.py                 # Hash all unhashed photos
+    python backfill_photo_hashes.py --workers 8     # Use 8 download/hash threads
+    python backfill_photo_hashes.py --rehash        # Recompute every hash
+"""
+
+import sys
+import os
+import io
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from PIL import Image
+from pillow_heif import register_heif_opener
+
+from app.database import SessionLocal
+from app.models import Photo
+from app import storage, phash
+
+BATCH_SIZE = 200
+
+register_heif_opener()
+
+
+def hash_photo(file_path):
+    """Return the perceptual hash for a stored photo, or None if unreadable"""
+    try:
+        img = Image.open(io.BytesIO(storage.read_file(file_path)))
+        return phash.dhash(img)
+    except Exception as e:
+        print(f"   Could not hash {file_path}: {e}")
+        return None
+
+
+def backfill(workers: int, rehash: bool):
+    db = SessionLocal()
+    hashed = 0
+    failed = 0
+    last_id = 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                query = db.query(Photo.id, Photo.file_path).filter(Photo.id > last_id)
+                if not rehash:
+                    query = query.filter(Photo.phash.is_(None))
+                batch = query.order_by(Photo.id).limit(BATCH_SIZE).all()
+                if not batch:
+                    break
+
+                results = pool.map(hash_photo, [file_path for _, file_path in batch])
+                updates = []
+                for (photo_id, _), value in zip(batch, results):
+                    if value:
+                        updates.append({"id": photo_id, "phash": value})
+                    else:
+                        failed += 1
+
+                if updates:
+                    db.bulk_update_mappings(Photo, updates)
+                    db.commit()
+                hashed += len(updates)
+                last_id = batch[-1][0]
+                print(f"📷 Hashed {hashed} photos so far (up to id {last_id})")
+    finally:
+        db.close()
+
+    print(f"\n✅ Done: {hashed} hashed, {failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill photo perceptual hashes")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel download/hash threads")
+    parser.add_argument("--rehash", action="store_true", help="Recompute hashes that already exist")
+    args = parser.parse_args()
+
+    backfill(args.workers, args.rehash)
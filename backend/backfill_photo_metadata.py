@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Extract metadata (dimensions, orientation, EXIF date, camera, GPS) for photos
+that don't have a photo_metadata row yet.
+
+Only the first few hundred KB of each original is fetched (a ranged GET for
+cloud storage) since the headers are all we parse; the full file is read
+only if the header alone can't be parsed. Work is committed in batches so
+the job can be stopped and re-run at any time.
+
+Usage:
+    python backfill_photo_metadata.py                 # Process photos without metadata
+    python backfill_photo_metadata.py --workers 8     # Use 8 download threads
+    python backfill_photo_metadata.py --fill-taken-at # Also set Photo.taken_at where it is empty
+"""
+
+import sys
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.database import SessionLocal, init_db
+from app.models import Photo, PhotoMetadata
+from app import storage, metadata
+
+BATCH_SIZE = 200
+
+
+def extract(file_path):
+    """Return parsed metadata for a stored photo, or None if unreadable"""
+    try:
+        return metadata.extract_photo_metadata(storage.read_file(file_path, metadata.HEADER_BYTES))
+    except Exception:
+        pass
+    try:
+        return metadata.extract_photo_metadata(storage.read_file(file_path))
+    except Exception as e:
+        print(f"   Could not read metadata from {file_path}: {e}")
+        return None
+
+
+def backfill(workers: int, fill_taken_at: bool):
+    init_db()  # Creates the photo_metadata table if it doesn't exist yet
+    db = SessionLocal()
+    processed = 0
+    failed = 0
+    last_id = 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                batch = db.query(Photo.id, Photo.file_path, Photo.taken_at).outerjoin(
+                    PhotoMetadata, PhotoMetadata.photo_id == Photo.id
+                ).filter(
+                    PhotoMetadata.id.is_(None),
+                    Photo.id > last_id
+                ).order_by(Photo.id).limit(BATCH_SIZE).all()
+                if not batch:
+                    break
+
+                results = pool.map(extract, [file_path for _, file_path, _ in batch])
+                rows = []
+                taken_at_updates = []
+                for (photo_id, _, taken_at), photo_metadata in zip(batch, results):
+                    if not photo_metadata:
+                        failed += 1
+                        continue
+                    rows.append({"photo_id": photo_id, **photo_metadata})
+                    if fill_taken_at and not taken_at and photo_metadata["taken_at"]:
+                        taken_at_updates.append({"id": photo_id, "taken_at": photo_metadata["taken_at"]})
+
+                if rows:
+                    db.bulk_insert_mappings(PhotoMetadata, rows)
+                if taken_at_updates:
+                    db.bulk_update_mappings(Photo, taken_at_updates)
+                db.commit()
+
+                processed += len(rows)
+                last_id = batch[-1][0]
+                print(f"📷 Extracted metadata for {processed} photos so far (up to id {last_id})")
+    finally:
+        db.close()
+
+    print(f"\n✅ Done: {processed} processed, {failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill photo metadata")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel download threads")
+    parser.add_argument("--fill-taken-at", action="store_true", help="Set missing Photo.taken_at from EXIF")
+    args = parser.parse_args()
+
+    backfill(args.workers, args.fill_taken_at)
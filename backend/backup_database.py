@@ -1,142 +1,167 @@
 #!/usr/bin/env python3
 """
 Automated database backup script for tag_diary.db
-Creates timestamped backups and maintains a rolling history.
+Creates incremental, compressed, deduplicated snapshots (see app/backup.py)
+and prunes them with a grandfather-father-son retention policy.
 """
 
 import os
+import sys
 import shutil
-import sqlite3
 from datetime import datetime
 from pathlib import Path
 
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import backup
+
 
 # Configuration
-DB_PATH = Path(__file__).parent / "tag_diary.db"
-BACKUP_DIR = Path(__file__).parent / "backups"
-MAX_BACKUPS = 30  # Keep last 30 backups (1 month if daily)
+BACKUP_DIR = backup.BACKUP_DIR
+
+
+def get_db_path():
+    """Database file from DATABASE_URL (defaults to tag_diary.db next to this script)"""
+    if not os.getenv("DATABASE_URL"):
+        return Path(__file__).parent / "tag_diary.db"
+    return backup.sqlite_db_path()
 
 
 def create_backup():
-    """Create a timestamped backup of the database"""
+    """Create an incremental snapshot of the database, then apply retention"""
+
+    if backup.is_postgres():
+        return create_pg_dump()
 
-    # Ensure backup directory exists
-    BACKUP_DIR.mkdir(exist_ok=True)
+    db_path = get_db_path()
 
     # Check if database exists
-    if not DB_PATH.exists():
-        print(f"⚠️  Database not found at {DB_PATH}")
+    if not db_path.exists():
+        print(f"⚠️  Database not found at {db_path}")
         return False
 
-    # Create timestamp for backup filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_filename = f"tag_diary_backup_{timestamp}.db"
-    backup_path = BACKUP_DIR / backup_filename
-
     try:
-        # Use SQLite backup API for safe backup (even if database is in use)
-        print(f"📦 Creating backup: {backup_filename}")
-
-        # Connect to source database
-        source_conn = sqlite3.connect(str(DB_PATH))
+        # Uses the SQLite backup API for a safe copy (even if database is in use)
+        print(f"📦 Creating incremental backup of {db_path.name}...")
+        # Retention runs under the same repository lock as the snapshot
+        snapshot = backup.create_snapshot(db_path, BACKUP_DIR, prune=True)
 
-        # Connect to backup database
-        backup_conn = sqlite3.connect(str(backup_path))
+        print(f"✅ Backup created successfully!")
+        print(f"   Snapshot: {snapshot['id']}")
+        print(f"   Database size: {snapshot['size'] / 1024:.2f} KB")
+        print(f"   New data stored: {snapshot['stored_bytes'] / 1024:.2f} KB "
+              f"({snapshot['new_blocks']} changed blocks)")
 
-        # Perform the backup
-        with backup_conn:
-            source_conn.backup(backup_conn)
+        report_retention(snapshot["retention"])
 
-        source_conn.close()
-        backup_conn.close()
+        return True
 
-        # Get backup file size
-        backup_size = backup_path.stat().st_size
-        backup_size_kb = backup_size / 1024
+    except Exception as e:
+        print(f"❌ Backup failed: {e}")
+        return False
 
-        print(f"✅ Backup created successfully!")
-        print(f"   Location: {backup_path}")
-        print(f"   Size: {backup_size_kb:.2f} KB")
 
-        # Clean up old backups
-        cleanup_old_backups()
+def create_pg_dump():
+    """Postgres: stream a compressed pg_dump into the backup repository"""
 
+    try:
+        print("📦 Dumping Postgres database...")
+        dump = backup.create_pg_dump(BACKUP_DIR, prune=True)
+        print(f"✅ Backup created successfully!")
+        print(f"   Dump: {dump['filename']}")
+        print(f"   Dump size: {dump['size'] / 1024:.2f} KB (compressed: {dump['stored_bytes'] / 1024:.2f} KB)")
+        report_retention(dump["retention"])
         return True
 
     except Exception as e:
         print(f"❌ Backup failed: {e}")
-        # Remove incomplete backup file if it exists
-        if backup_path.exists():
-            backup_path.unlink()
         return False
 
 
 def cleanup_old_backups():
-    """Remove old backups, keeping only the most recent MAX_BACKUPS"""
+    """Remove snapshots outside the daily/weekly/monthly retention policy"""
 
-    # Get all backup files
-    backup_files = sorted(
-        BACKUP_DIR.glob("tag_diary_backup_*.db"),
-        key=lambda p: p.stat().st_mtime,
-        reverse=True
-    )
+    try:
+        result = backup.apply_retention(BACKUP_DIR)
+    except backup.BackupError as e:
+        print(f"❌ Cleanup failed: {e}")
+        return False
+
+    report_retention(result)
+    return True
 
-    # Remove old backups if we have more than MAX_BACKUPS
-    if len(backup_files) > MAX_BACKUPS:
-        files_to_remove = backup_files[MAX_BACKUPS:]
-        print(f"\n🗑️  Removing {len(files_to_remove)} old backup(s)...")
 
-        for old_backup in files_to_remove:
-            try:
-                old_backup.unlink()
-                print(f"   Removed: {old_backup.name}")
-            except Exception as e:
-                print(f"   Failed to remove {old_backup.name}: {e}")
+def report_retention(result):
+    if result["removed_snapshots"]:
+        print(f"\n🗑️  Removed {len(result['removed_snapshots'])} old snapshot(s) "
+              f"and {result['removed_blocks']} unreferenced block(s)")
+        for snapshot_id in result["removed_snapshots"]:
+            print(f"   Removed: {snapshot_id}")
 
-    print(f"\n📊 Total backups: {min(len(backup_files), MAX_BACKUPS)}")
+    print(f"\n📊 Total snapshots: {len(backup.list_snapshots(BACKUP_DIR))} "
+          f"(keeping last {backup.KEEP_LAST}, {backup.KEEP_DAILY} daily, {backup.KEEP_WEEKLY} weekly, {backup.KEEP_MONTHLY} monthly)")
 
 
 def list_backups():
     """List all available backups"""
 
-    backup_files = sorted(
+    snapshots = backup.list_snapshots(BACKUP_DIR)
+    dumps = backup.list_dumps(BACKUP_DIR)
+    legacy_files = sorted(
         BACKUP_DIR.glob("tag_diary_backup_*.db"),
         key=lambda p: p.stat().st_mtime,
         reverse=True
     )
 
-    if not backup_files:
+    if not snapshots and not dumps and not legacy_files:
         print("No backups found.")
         return
 
-    print(f"\n📋 Available backups ({len(backup_files)}):\n")
+    if snapshots:
+        print(f"\n📋 Incremental snapshots ({len(snapshots)}):\n")
+        for i, snapshot in enumerate(snapshots, 1):
+            print(f"{i:2d}. {snapshot['id']}")
+            print(f"    Size: {snapshot['size'] / 1024:.2f} KB | Stored: {snapshot['stored_bytes'] / 1024:.2f} KB"
+                  f" | Created: {snapshot['created_at'].replace('T', ' ')}")
 
-    for i, backup_file in enumerate(backup_files, 1):
-        size_kb = backup_file.stat().st_size / 1024
-        modified = datetime.fromtimestamp(backup_file.stat().st_mtime)
-        print(f"{i:2d}. {backup_file.name}")
-        print(f"    Size: {size_kb:.2f} KB | Created: {modified.strftime('%Y-%m-%d %H:%M:%S')}")
+    if dumps:
+        print(f"\n📋 Postgres dumps ({len(dumps)}):\n")
+        for i, dump in enumerate(dumps, 1):
+            print(f"{i:2d}. {dump['filename']}")
+            print(f"    Stored: {dump['stored_bytes'] / 1024:.2f} KB | Created: {dump['created_at'].replace('T', ' ')}")
 
+    if legacy_files:
+        print(f"\n📋 Full-copy backups ({len(legacy_files)}):\n")
+        for i, backup_file in enumerate(legacy_files, 1):
+            size_kb = backup_file.stat().st_size / 1024
+            modified = datetime.fromtimestamp(backup_file.stat().st_mtime)
+            print(f"{i:2d}. {backup_file.name}")
+            print(f"    Size: {size_kb:.2f} KB | Created: {modified.strftime('%Y-%m-%d %H:%M:%S')}")
 
-def restore_backup(backup_filename):
-    """Restore database from a specific backup file"""
 
-    backup_path = BACKUP_DIR / backup_filename
+def restore_backup(backup_name):
+    """Restore database from a snapshot id or a full-copy backup file"""
 
-    if not backup_path.exists():
-        print(f"❌ Backup file not found: {backup_filename}")
-        return False
+    db_path = get_db_path()
 
     # Create a backup of current database before restoring
-    if DB_PATH.exists():
+    if db_path.exists():
         print("📦 Creating safety backup of current database...")
-        safety_backup = DB_PATH.parent / f"tag_diary_before_restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-        shutil.copy2(DB_PATH, safety_backup)
+        safety_backup = db_path.parent / f"tag_diary_before_restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+        shutil.copy2(db_path, safety_backup)
         print(f"   Safety backup: {safety_backup.name}")
 
     try:
-        print(f"\n🔄 Restoring from: {backup_filename}")
-        shutil.copy2(backup_path, DB_PATH)
+        print(f"\n🔄 Restoring from: {backup_name}")
+        if backup_name.endswith(".db"):
+            backup_path = BACKUP_DIR / backup_name
+            if not backup_path.exists():
+                print(f"❌ Backup file not found: {backup_name}")
+                return False
+            shutil.copy2(backup_path, db_path)
+        else:
+            backup.restore_snapshot(backup_name, db_path, BACKUP_DIR)
         print(f"✅ Database restored successfully!")
         return True
 
@@ -145,21 +170,59 @@ def restore_backup(backup_filename):
         return False
 
 
-if __name__ == "__main__":
-    import sys
+def restore_at(timestamp):
+    """Point-in-time restore: the newest snapshot taken at or before timestamp"""
+
+    try:
+        when = datetime.fromisoformat(timestamp)
+    except ValueError:
+        print(f"❌ Invalid timestamp: {timestamp} (use e.g. 2025-12-02T13:00)")
+        return False
 
+    snapshot_id = backup.snapshot_at(when, BACKUP_DIR)
+    if not snapshot_id:
+        print(f"❌ No snapshot exists at or before {when}")
+        return False
+
+    return restore_backup(snapshot_id)
+
+
+def verify_backups():
+    """Check the checksum of every stored block"""
+
+    print("🔍 Verifying backups...")
+    result = backup.verify(BACKUP_DIR)
+    for problem in result["problems"]:
+        print(f"   ❌ {problem}")
+    if result["problems"]:
+        print(f"\n❌ {len(result['problems'])} problem(s) in {result['snapshots']} snapshots")
+        return False
+    print(f"✅ {result['snapshots']} snapshots and {result['blocks']} blocks verified")
+    return True
+
+
+if __name__ == "__main__":
     if len(sys.argv) > 1:
         command = sys.argv[1]
 
         if command == "list":
             list_backups()
+        elif command == "restore" and len(sys.argv) > 3 and sys.argv[2] == "--at":
+            restore_at(sys.argv[3])
         elif command == "restore" and len(sys.argv) > 2:
             restore_backup(sys.argv[2])
+        elif command == "verify":
+            sys.exit(0 if verify_backups() else 1)
+        elif command == "prune":
+            sys.exit(0 if cleanup_old_backups() else 1)
         else:
             print("Usage:")
             print("  python3 backup_database.py          # Create backup")
             print("  python3 backup_database.py list     # List all backups")
-            print("  python3 backup_database.py restore <filename>  # Restore from backup")
+            print("  python3 backup_database.py restore <snapshot or filename>  # Restore from backup")
+            print("  python3 backup_database.py restore --at 2025-12-02T13:00  # Restore as of a point in time")
+            print("  python3 backup_database.py verify   # Check backup checksums")
+            print("  python3 backup_database.py prune    # Apply retention policy")
     else:
         # Default: create backup
         create_backup()
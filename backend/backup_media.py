@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Media library backup script for uploads/ (or the S3/R2 bucket)
+Creates incremental, deduplicated snapshots (see app/media_backup.py): only
+files whose size/mtime or ETag changed since the last snapshot are read.
+
+Usage:
+    python3 backup_media.py                      # Create snapshot
+    python3 backup_media.py --source local       # Back up uploads/ even if cloud storage is configured
+    python3 backup_media.py list                 # List snapshots
+    python3 backup_media.py restore <id> <dir> [prefix]  # Restore files into dir
+    python3 backup_media.py verify               # Check every chunk in parallel
+    python3 backup_media.py prune                # Apply retention policy
+"""
+
+import os
+import sys
+import argparse
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import backup, media_backup
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.2f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GB"
+
+
+def create_backup(source):
+    """Create an incremental media snapshot, then apply retention"""
+
+    source = source or media_backup.default_source()
+    print(f"📦 Creating incremental media backup ({source})...")
+
+    def progress(totals):
+        print(f"   + {totals['current']} ({totals['changed_files']} changed, "
+              f"{format_size(totals['stored_bytes'])} stored)")
+
+    try:
+        # Retention runs under the same lock, so a concurrent run can't collect our chunks
+        snapshot = media_backup.create_snapshot(source, progress=progress, prune=True)
+    except Exception as e:
+        print(f"❌ Media backup failed: {e}")
+        return False
+
+    print(f"✅ Media backup created successfully!")
+    print(f"   Snapshot: {snapshot['id']}")
+    print(f"   Files: {snapshot['files']} ({format_size(snapshot['total_size'])})")
+    print(f"   Changed files: {snapshot['changed_files']}")
+    print(f"   New data stored: {format_size(snapshot['stored_bytes'])} ({snapshot['new_chunks']} new chunks)")
+
+    report_retention(snapshot["retention"])
+    return True
+
+
+def cleanup_old_backups():
+    """Remove snapshots outside the daily/weekly/monthly retention policy"""
+
+    try:
+        result = media_backup.apply_retention()
+    except backup.BackupError as e:
+        print(f"❌ Pruning failed: {e}")
+        return False
+
+    report_retention(result)
+    return True
+
+
+def report_retention(result):
+    if result["removed_snapshots"]:
+        print(f"\n🗑️  Removed {len(result['removed_snapshots'])} old snapshot(s) "
+              f"and {result['removed_chunks']} unreferenced chunk(s)")
+
+    print(f"\n📊 Total media snapshots: {len(media_backup.list_snapshots())} "
+          f"(keeping last {backup.KEEP_LAST}, {backup.KEEP_DAILY} daily, {backup.KEEP_WEEKLY} weekly, {backup.KEEP_MONTHLY} monthly)")
+
+
+def list_backups():
+    """List all media snapshots"""
+
+    snapshots = media_backup.list_snapshots()
+    if not snapshots:
+        print("No media backups found.")
+        return
+
+    print(f"\n📋 Media snapshots ({len(snapshots)}):\n")
+    for i, snapshot in enumerate(snapshots, 1):
+        print(f"{i:2d}. {snapshot['id']} [{snapshot['source']}]")
+        print(f"    Files: {snapshot['files']} | Size: {format_size(snapshot['total_size'])}"
+              f" | Stored: {format_size(snapshot['stored_bytes'])}"
+              f" | Created: {snapshot['created_at'].replace('T', ' ')}")
+
+
+def restore_backup(snapshot_id, dest_dir, prefix=None):
+    """Restore a snapshot's files into dest_dir (never overwrites uploads/ in place)"""
+
+    print(f"🔄 Restoring media snapshot {snapshot_id} into {dest_dir}...")
+    try:
+        result = media_backup.restore_snapshot(snapshot_id, Path(dest_dir), prefix or "")
+    except Exception as e:
+        print(f"❌ Restore failed: {e}")
+        return False
+
+    print(f"✅ Restored {result['files']} files ({format_size(result['bytes'])})")
+    return True
+
+
+def verify_backups():
+    """Check the checksum of every stored chunk"""
+
+    print(f"🔍 Verifying media backups ({media_backup.VERIFY_WORKERS} workers)...")
+    result = media_backup.verify()
+    for problem in result["problems"]:
+        print(f"   ❌ {problem}")
+    if result["problems"]:
+        print(f"\n❌ {len(result['problems'])} problem(s) in {result['snapshots']} snapshots")
+        return False
+    print(f"✅ {result['snapshots']} snapshots and {result['chunks']} chunks verified")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Back up the media library")
+    parser.add_argument("command", nargs="?", default="create",
+                        choices=["create", "list", "restore", "verify", "prune"])
+    parser.add_argument("args", nargs="*", help="restore: <snapshot id> <dest dir> [path prefix]")
+    parser.add_argument("--source", choices=["local", "bucket"], help="Media source (default: configured storage)")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        sys.exit(0 if create_backup(args.source) else 1)
+    elif args.command == "list":
+        list_backups()
+    elif args.command == "restore":
+        if len(args.args) < 2:
+            parser.error("restore needs <snapshot id> <dest dir> [path prefix]")
+        sys.exit(0 if restore_backup(*args.args[:3]) else 1)
+    elif args.command == "verify":
+        sys.exit(0 if verify_backups() else 1)
+    elif args.command == "prune":
+        sys.exit(0 if cleanup_old_backups() else 1)
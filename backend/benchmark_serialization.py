@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for list-endpoint serialization.
+
+Builds a throwaway SQLite database with 10,000 photos and 1,000 vignettes
+(10 photos each) and times producing the JSON body two ways:
+
+  before: ORM objects -> Pydantic validation (from_attributes) -> stdlib json,
+          the way FastAPI serializes a response_model; vignettes with one
+          photo query per vignette
+  after:  column projection -> plain dicts -> FastJSONResponse (orjson if installed)
+
+Usage:
+    python benchmark_serialization.py             # 10,000 rows, best of 5
+    python benchmark_serialization.py --rows 50000 --repeat 3
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from typing import List
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app import models, schemas, serialize
+from app.database import Base
+
+
+def build_database(path, rows):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, username="bench", hashed_password="x"))
+    start = datetime(1960, 1, 1)
+    db.bulk_insert_mappings(models.Photo, [
+        {
+            "id": i + 1,
+            "filename": f"{i:08d}.jpg",
+            "file_path": f"uploads/photos/{i:08d}.jpg",
+            "title": f"Photo {i}",
+            "description": "Summer at the lake house with the whole family" if i % 3 == 0 else None,
+            "uploaded_by_id": 1,
+            "created_at": start + timedelta(hours=i),
+            "taken_at": start + timedelta(days=i) if i % 2 == 0 else None,
+            "sort_order": i,
+        }
+        for i in range(rows)
+    ])
+    vignettes = rows // 10
+    db.bulk_insert_mappings(models.Vignette, [
+        {"id": i + 1, "title": f"Story {i}", "content": "Once upon a time... " * 50,
+         "author_id": 1, "created_at": start + timedelta(days=i), "sort_order": i}
+        for i in range(vignettes)
+    ])
+    db.bulk_insert_mappings(models.VignettePhoto, [
+        {"vignette_id": i // 10 + 1, "photo_id": i + 1, "position": i % 10}
+        for i in range(vignettes * 10)
+    ])
+    db.commit()
+    return db
+
+
+def photos_before(db):
+    adapter = TypeAdapter(List[schemas.Photo])
+    photos = db.query(models.Photo).order_by(models.Photo.sort_order.asc()).all()
+    content = adapter.dump_python(adapter.validate_python(photos, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def photos_after(db):
+    result = db.execute(select(*serialize.schema_columns(schemas.Photo, models.Photo)).order_by(models.Photo.sort_order.asc()))
+    return serialize.FastJSONResponse(serialize.rows_to_dicts(result)).body
+
+
+def vignettes_before(db):
+    adapter = TypeAdapter(List[schemas.Vignette])
+    result = []
+    for vignette in db.query(models.Vignette).order_by(models.Vignette.sort_order.asc()).all():
+        vignette_photos = db.query(models.VignettePhoto).filter(
+            models.VignettePhoto.vignette_id == vignette.id
+        ).order_by(models.VignettePhoto.position).all()
+        result.append({
+            "id": vignette.id,
+            "title": vignette.title,
+            "content": vignette.content,
+            "author_id": vignette.author_id,
+            "created_at": vignette.created_at,
+            "updated_at": vignette.updated_at,
+            "photos": [vp.photo for vp in vignette_photos],
+        })
+    content = adapter.dump_python(adapter.validate_python(result, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def vignettes_after(db):
+    vignettes = serialize.rows_to_dicts(db.execute(
+        select(*serialize.schema_columns(schemas.Vignette, models.Vignette)).order_by(models.Vignette.sort_order.asc())
+    ))
+    photos = serialize.group_by(serialize.rows_to_dicts(db.execute(
+        select(models.VignettePhoto.vignette_id, *serialize.schema_columns(schemas.Photo, models.Photo))
+        .join(models.Photo, models.Photo.id == models.VignettePhoto.photo_id)
+        .order_by(models.VignettePhoto.vignette_id, models.VignettePhoto.position)
+    )), "vignette_id")
+    for vignette in vignettes:
+        vignette["photos"] = photos.get(vignette["id"], [])
+    return serialize.FastJSONResponse(vignettes).body
+
+
+def best_of(fn, db, repeat):
+    times = []
+    for _ in range(repeat):
+        db.expunge_all()  # Start each run with an empty identity map, like a fresh request
+        start = time.perf_counter()
+        body = fn(db)
+        times.append(time.perf_counter() - start)
+    return min(times), body
+
+
+def main(rows, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = build_database(os.path.join(tmp, "bench.db"), rows)
+        print(f"📊 Serialization benchmark: {rows:,} photos, {rows // 10:,} vignettes, best of {repeat}")
+        print(f"   JSON encoder: {'orjson' if serialize.orjson else 'stdlib json (pip install orjson for the fast path)'}\n")
+
+        for name, before, after in (
+            ("GET /api/photos", photos_before, photos_after),
+            ("GET /api/vignettes", vignettes_before, vignettes_after),
+        ):
+            before_time, before_body = best_of(before, db, repeat)
+            after_time, after_body = best_of(after, db, repeat)
+            same = json.loads(before_body) == json.loads(after_body)
+            print(f"   {name:<20} before {before_time * 1000:8.1f} ms   after {after_time * 1000:8.1f} ms"
+                  f"   {before_time / after_time:5.1f}x   {len(after_body) / 1024:,.0f} KB"
+                  f"{'' if same else '   ❌ output differs'}")
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark list-endpoint JSON serialization")
+    parser.add_argument("--rows", type=int, default=10000, help="Number of photos (vignettes = rows / 10)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant; the best is reported")
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Check the main API endpoints against SQL query budgets (for CI).
+
+Seeds a throwaway SQLite database (photos, albums, vignettes, people,
+invite codes), calls each endpoint with query profiling on (see
+app/queryprofile.py) and fails when an endpoint runs more statements than
+its budget, or runs any one statement shape more than --max-repeats times.
+That is how a query issued once per row of a loop (N+1) shows up. Budgets
+don't depend on how much data is seeded, so raising --rows should never
+change the counts.
+
+Usage:
+    python check_query_budgets.py                # Exit 1 if any budget is exceeded
+    python check_query_budgets.py --rows 200     # Seed more data
+    python check_query_budgets.py --verbose      # Print the statement shapes of each request
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# (method, path, budget). Paths are formatted with the seeded ids.
+BUDGETS = [
+    ("GET", "/api/auth/me", 1),
+    ("GET", "/api/photos", 2),
+    ("GET", "/api/albums", 2),
+    ("GET", "/api/albums/{album_id}", 3),
+    ("GET", "/api/vignettes", 3),
+    ("GET", "/api/vignettes/{vignette_id}", 3),
+    ("GET", "/api/people", 2),
+    ("GET", "/api/people/by-photo?{photo_query}", 2),
+    ("GET", "/api/audio", 2),
+    ("GET", "/api/files", 2),
+    ("GET", "/api/admin/invite-codes", 3),
+    ("GET", "/api/admin/users", 3),
+    ("GET", "/api/changes", 2),
+    ("POST", "/api/photos/reorder", 4),
+    ("POST", "/api/albums/reorder", 4),
+    ("POST", "/api/vignettes/reorder", 4),
+]
+
+
+def seed(db, rows):
+    """Insert rows photos plus albums, vignettes, people and invite codes; returns the admin username and ids for the paths"""
+    from app import models
+    from app.auth import get_password_hash
+
+    admin = models.User(username="admin", email="admin@example.com", hashed_password=get_password_hash("x"),
+                        full_name="Admin", is_admin=True, is_active=True)
+    db.add(admin)
+    db.flush()
+
+    photos = [models.Photo(filename=f"{i}.jpg", file_path=f"uploads/photos/{i}.jpg", title=f"Photo {i}",
+                           uploaded_by_id=admin.id, sort_order=i) for i in range(rows)]
+    db.add_all(photos)
+    db.flush()
+
+    groups = max(1, rows // 5)
+    albums = [models.Album(name=f"Album {i}", created_by_id=admin.id, sort_order=i) for i in range(groups)]
+    vignettes = [models.Vignette(title=f"Story {i}", content="Once upon a time", author_id=admin.id, sort_order=i)
+                 for i in range(groups)]
+    people = [models.Person(name=f"Person {i}") for i in range(groups)]
+    db.add_all(albums + vignettes + people)
+    db.flush()
+
+    for i, photo in enumerate(photos):
+        db.add(models.AlbumPhoto(album_id=albums[i % groups].id, photo_id=photo.id))
+        db.add(models.VignettePhoto(vignette_id=vignettes[i % groups].id, photo_id=photo.id, position=i))
+        db.add(models.PhotoPerson(photo_id=photo.id, person_id=people[i % groups].id))
+
+    for i in range(groups):
+        user = models.User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x", full_name=f"User {i}")
+        db.add(user)
+        db.flush()
+        db.add(models.InviteCode(code=f"CODE{i:04d}", created_by_id=admin.id, used_by_id=user.id, is_used=True))
+        db.add(models.InviteCode(code=f"OPEN{i:04d}", created_by_id=admin.id))
+    for i in range(groups):
+        db.add(models.AudioRecording(filename=f"{i}.webm", file_path=f"uploads/audio/{i}.webm",
+                                     title=f"Recording {i}", author_id=admin.id))
+        db.add(models.File(filename=f"{i}.pdf", file_path=f"uploads/files/{i}.pdf", title=f"File {i}",
+                           uploaded_by_id=admin.id, source="vignettes"))
+    db.commit()
+
+    return admin.username, {
+        "photo_query": "&".join(f"photo_ids={photo.id}" for photo in photos[:20]),
+        "album_id": albums[0].id,
+        "vignette_id": vignettes[0].id,
+        "photo_ids": [photo.id for photo in photos],
+        "album_ids": [album.id for album in albums],
+        "vignette_ids": [vignette.id for vignette in vignettes],
+    }
+
+
+def request_body(path, ids):
+    """Reorder payloads: reverse every seeded row"""
+    for kind in ("photo", "album", "vignette"):
+        if path == f"/api/{kind}s/reorder":
+            return [{"id": row_id, "sort_order": position} for position, row_id in enumerate(reversed(ids[f"{kind}_ids"]))]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check API endpoints against SQL query budgets")
+    parser.add_argument("--rows", type=int, default=50, help="Photos to seed (default: 50)")
+    parser.add_argument("--max-repeats", type=int, default=3,
+                        help="Most times one statement shape may run per request (default: 3)")
+    parser.add_argument("--verbose", action="store_true", help="Print statement shapes for every request")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="query-budgets-")
+    os.chdir(workdir)  # main.py creates uploads/ in the working directory
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/budgets.db"
+    os.environ["BACKUP_DIR"] = f"{workdir}/backups"
+    os.environ["LOG_LEVEL"] = "ERROR"
+
+    from fastapi.testclient import TestClient
+    from app import queryprofile
+    from app.auth import create_access_token
+    from app.database import SessionLocal, engine, init_db
+    from app.main import app
+
+    init_db()
+    db = SessionLocal()
+    try:
+        username, ids = seed(db, args.rows)
+    finally:
+        db.close()
+    queryprofile.instrument_engine(engine)
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+    print(f"🔍 Checking {len(BUDGETS)} endpoints ({args.rows} photos seeded)\n")
+
+    failures = 0
+    with TestClient(app) as client:
+        for method, template, budget in BUDGETS:
+            path = template.format(**ids)
+            with queryprofile.profile_queries() as profile:
+                # Run in this thread's context so the profile sees the request's statements
+                response = client.request(method, path, headers=headers, json=request_body(path, ids))
+            try:
+                queryprofile.check_budget(profile, budget, args.max_repeats)
+                status = "✅"
+            except queryprofile.QueryBudgetExceeded as e:
+                status = f"❌ {e}"
+                failures += 1
+            if response.status_code >= 400:
+                status = f"❌ HTTP {response.status_code}"
+                failures += 1
+            print(f"{method:5} {template.split('?')[0]:34} {profile.count:3}/{budget:<3} {profile.seconds * 1000:7.1f} ms  {status}")
+            if args.verbose:
+                for shape, count in profile.shapes.most_common():
+                    print(f"        {count:3}x {shape[:160]}")
+
+    print()
+    if failures:
+        print(f"❌ {failures} endpoint(s) over budget")
+        sys.exit(1)
+    print("✅ All endpoints within budget")
+
+
+if __name__ == "__main__":
+    main()
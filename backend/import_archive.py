@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Bulk-import photos, audio and files from a directory or a ZIP/TAR archive
+(including Google Takeout exports with their JSON sidecars).
+
+Folders become albums. Conversion, hashing and storage uploads run in a
+process pool; progress is checkpointed after every committed batch, so an
+interrupted import resumes where it stopped when run again on the same source.
+
+Usage:
+    python import_archive.py ~/Pictures/Family --user admin --dry-run  # Show what would be imported
+    python import_archive.py takeout.zip --user admin                  # Import
+    python import_archive.py takeout.zip --user admin --workers 8      # Use 8 worker processes
+    python import_archive.py scans/ --user admin --no-albums           # Don't create albums from folders
+    python import_archive.py scans/ --user admin --restart             # Ignore the checkpoint
+"""
+
+import sys
+import os
+import argparse
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.database import SessionLocal, init_db
+from app.models import User
+from app import importer
+
+
+def print_report(report):
+    print(f"   Photos: {report['photos']} | Audio: {report['audio']} | Files: {report['files']}"
+          f" | {report['bytes'] / (1024 * 1024):.1f} MB")
+    print(f"   With Takeout sidecar: {report['with_sidecar']}")
+    print(f"   Albums: {len(report['albums'])}")
+    for album in report["albums"][:20]:
+        print(f"     - {album}")
+    if len(report["albums"]) > 20:
+        print(f"     ... and {len(report['albums']) - 20} more")
+    print(f"   Ignored (sidecars/system files): {report['ignored']}")
+    print(f"   Already imported (checkpoint): {report['skipped']}")
+
+
+def main(args):
+    init_db()
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == args.user).first()
+        if not user:
+            print(f"❌ User '{args.user}' not found")
+            return False
+
+        print(f"{'🔍 Planning' if args.dry_run else '📦 Importing'} {args.source}...")
+
+        def progress(report):
+            print(f"   ✓ {report['imported']} imported, {report['failed']} failed")
+
+        report = importer.run_import(
+            db, args.source, user,
+            dry_run=args.dry_run,
+            with_albums=not args.no_albums,
+            workers=args.workers,
+            restart=args.restart,
+            progress=progress,
+        )
+    except importer.ArchiveImportError as e:
+        print(f"❌ {e}")
+        return False
+    finally:
+        db.close()
+
+    print_report(report)
+    if args.dry_run:
+        print("\nDry run - nothing was uploaded or written.")
+        return True
+
+    for error in report["errors"]:
+        print(f"   ❌ {error['name']}: {error['error']}")
+    print(f"\n✅ Imported {report['imported']} items ({report['failed']} failed)")
+    if report["audio"]:
+        print("   Run backfill_audio_analysis.py to compute durations and waveforms for imported audio.")
+    return report["failed"] == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-import a directory or ZIP/TAR archive")
+    parser.add_argument("source", help="Directory, .zip or .tar(.gz) to import")
+    parser.add_argument("--user", required=True, help="Username the imported items belong to")
+    parser.add_argument("--dry-run", action="store_true", help="Plan only; upload and write nothing")
+    parser.add_argument("--workers", type=int, default=importer.IMPORT_WORKERS, help="Worker processes")
+    parser.add_argument("--no-albums", action="store_true", help="Don't create albums from folders")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and import everything")
+    sys.exit(0 if main(parser.parse_args()) else 1)
@@ -0,0 +1,45 @@
+"""
+Add composite indexes to the photo_people table used by the people tagging API.
+
+Works against whatever DATABASE_URL points at (SQLite or PostgreSQL).
+Duplicate (photo_id, person_id) rows are removed first so the unique index can be built.
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+from app.database import engine
+from app.models import PhotoPerson
+
+
+def add_photo_people_indexes():
+    """Create the photo_people composite indexes if they don't exist yet"""
+    if not inspect(engine).has_table("photo_people"):
+        print("photo_people table does not exist yet - it will be created with its indexes on startup")
+        return
+
+    with engine.begin() as conn:
+        removed = conn.execute(text("""
+            DELETE FROM photo_people
+            WHERE id NOT IN (
+                SELECT MIN(id) FROM photo_people GROUP BY photo_id, person_id
+            )
+        """)).rowcount
+        if removed:
+            print(f"Removed {removed} duplicate photo_people rows")
+
+    for index in PhotoPerson.__table__.indexes:
+        if len(index.columns) < 2:
+            continue
+        index.create(bind=engine, checkfirst=True)
+        print(f"✓ {index.name}")
+
+
+if __name__ == "__main__":
+    print("Adding photo_people indexes...")
+    add_photo_people_indexes()
+    print("Migration complete!")
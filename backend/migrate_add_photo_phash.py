@@ -0,0 +1,43 @@
+"""
+Add the phash (perceptual hash) column to the photos table.
+
+Works against whatever DATABASE_URL points at (SQLite or PostgreSQL).
+Run backfill_photo_hashes.py afterwards to hash existing photos.
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+from app.database import engine
+from app.models import Photo
+
+
+def add_phash_column():
+    """Add photos.phash and its index if missing"""
+    inspector = inspect(engine)
+    if not inspector.has_table("photos"):
+        print("photos table does not exist yet - it will be created with phash on startup")
+        return
+
+    columns = [col["name"] for col in inspector.get_columns("photos")]
+    if "phash" in columns:
+        print("phash column already exists in photos table")
+    else:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE photos ADD COLUMN phash VARCHAR(16)"))
+        print("✓ Added phash column to photos table")
+
+    for index in Photo.__table__.indexes:
+        if "phash" in index.columns:
+            index.create(bind=engine, checkfirst=True)
+            print(f"✓ {index.name}")
+
+
+if __name__ == "__main__":
+    print("Adding phash column...")
+    add_phash_column()
+    print("Migration complete!")
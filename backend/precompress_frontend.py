@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Write Brotli/gzip variants of the built frontend (frontend/dist) so the
+server can send them without compressing on every request.
+
+Run after `npm run build`. Brotli variants need the brotli package
+(pip install Brotli); without it only gzip variants are written.
+
+Usage:
+    python precompress_frontend.py                 # Compress ../frontend/dist
+    python precompress_frontend.py path/to/dist    # Compress another build directory
+    python precompress_frontend.py --force         # Rewrite existing variants
+"""
+
+import os
+import sys
+import argparse
+from pathlib import Path
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import static
+
+DEFAULT_BUILD_DIR = Path(__file__).resolve().parent.parent / "frontend" / "dist"
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def main(build_dir, force):
+    if not build_dir.is_dir():
+        print(f"❌ Build directory not found: {build_dir}")
+        print("   Run 'cd frontend && npm run build' first.")
+        return False
+
+    print(f"📦 Precompressing {build_dir}...")
+    if static.brotli is None:
+        print("   ⚠️  brotli not installed - writing gzip variants only")
+
+    totals = static.precompress(build_dir, force=force)
+
+    print(f"✅ {totals['files']} files ({format_size(totals['bytes'])}), {totals['written']} variants written")
+    print(f"   gzip: {format_size(totals['gzip_bytes'])}")
+    if static.brotli is not None:
+        print(f"   brotli: {format_size(totals['br_bytes'])}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompress the built frontend")
+    parser.add_argument("build_dir", nargs="?", type=Path, default=DEFAULT_BUILD_DIR, help="Build directory (default: ../frontend/dist)")
+    parser.add_argument("--force", action="store_true", help="Rewrite variants even if up to date")
+    args = parser.parse_args()
+    sys.exit(0 if main(args.build_dir, args.force) else 1)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Background worker that builds streaming renditions (Opus, AAC, HLS) for audio recordings.
+
+New uploads are transcoded automatically when AUDIO_TRANSCODE=true; run this to
+process the existing library, or as a periodic job (cron/launchd) instead of
+transcoding inside the web process. Requires ffmpeg on the PATH.
+
+Usage:
+    python transcode_audio.py              # Transcode recordings with no renditions yet
+    python transcode_audio.py --all        # Rebuild renditions for every recording
+    python transcode_audio.py --id 42      # Transcode one recording
+"""
+
+import sys
+import os
+import argparse
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.database import SessionLocal, init_db
+from app.models import AudioRecording, AudioRendition, AudioAnalysis
+from app import audio, transcode
+
+
+def run(rebuild_all: bool, audio_id: int = None):
+    if not audio.FFMPEG:
+        print("❌ ffmpeg not found - install it or set FFMPEG_PATH")
+        return
+
+    init_db()  # Creates the audio_renditions table if it doesn't exist yet
+    db = SessionLocal()
+    done = 0
+    failed = 0
+
+    try:
+        query = db.query(AudioRecording)
+        if audio_id:
+            query = query.filter(AudioRecording.id == audio_id)
+        elif not rebuild_all:
+            query = query.filter(~AudioRecording.renditions.any())
+
+        for recording in query.order_by(AudioRecording.id).all():
+            try:
+                # Duration/codec decide whether HLS and which renditions are worth building
+                if not db.query(AudioAnalysis).filter(AudioAnalysis.audio_id == recording.id).first():
+                    audio.analyse_recording(db, recording)
+                    db.flush()
+                    db.refresh(recording)
+                transcode.transcode_recording(db, recording)
+                db.commit()
+                kinds = [r.kind for r in db.query(AudioRendition).filter(AudioRendition.audio_id == recording.id)]
+                done += 1
+                print(f"🎵 {recording.id}: {recording.title} -> {', '.join(kinds) or 'original is already efficient'}")
+            except Exception as e:
+                db.rollback()
+                failed += 1
+                print(f"   Failed to transcode {recording.id}: {e}")
+    finally:
+        db.close()
+
+    print(f"\n✅ Done: {done} transcoded, {failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcode audio recordings to streaming renditions")
+    parser.add_argument("--all", action="store_true", help="Rebuild renditions for every recording")
+    parser.add_argument("--id", type=int, help="Only transcode this recording")
+    args = parser.parse_args()
+
+    run(args.all, args.id)
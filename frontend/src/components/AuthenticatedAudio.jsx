@@ -1,6 +1,9 @@
 import React, { useState, useEffect } from 'react'
 import axios from '../config/api'
 
+const supportsNativeHls = () =>
+  !!document.createElement('audio').canPlayType('application/vnd.apple.mpegurl')
+
 function AuthenticatedAudio({ audioId, onPlay, onPause, style, preload, ...props }) {
   const [audioUrl, setAudioUrl] = useState(null)
   const [loading, setLoading] = useState(true)
@@ -10,6 +13,19 @@ function AuthenticatedAudio({ audioId, onPlay, onPause, style, preload, ...props
     let objectUrl = null
 
     const fetchAudio = async () => {
+      // Browsers that play HLS natively (Safari, iOS) stream long recordings from a
+      // signed playlist URL and start at once instead of downloading the whole file
+      if (supportsNativeHls()) {
+        try {
+          const response = await axios.get(`/api/audio/${audioId}/hls-url`)
+          setAudioUrl(`${axios.defaults.baseURL || ''}${response.data.url}`)
+          setLoading(false)
+          return
+        } catch (err) {
+          // 404: no HLS rendition for this recording, fall back to the file
+        }
+      }
+
       try {
         const response = await axios.get(`/api/audio/${audioId}`, {
           responseType: 'blob',
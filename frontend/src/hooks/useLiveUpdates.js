@@ -0,0 +1,71 @@
+import { useEffect, useRef } from 'react'
+
+const API_URL = import.meta.env.VITE_API_URL || ''
+
+// Subscribe to /api/events (server-sent events) and call onChange with each
+// change notification ({ entity, id, op, cursor }). A 'resync' event, or a
+// reconnect after the stream drops, calls onChange(null): the caller should
+// catch up from /api/changes. Uses fetch rather than EventSource so the
+// Authorization header can be sent.
+function useLiveUpdates(onChange) {
+  const callback = useRef(onChange)
+  callback.current = onChange
+
+  useEffect(() => {
+    let stopped = false
+    let controller = null
+    let retryTimer = null
+
+    const connect = async (isReconnect) => {
+      const token = localStorage.getItem('token')
+      if (!token || stopped) return
+
+      controller = new AbortController()
+      try {
+        const response = await fetch(`${API_URL}/api/events`, {
+          headers: { Authorization: `Bearer ${token}` },
+          signal: controller.signal
+        })
+        if (!response.ok) throw new Error(`HTTP ${response.status}`)
+        if (isReconnect) callback.current(null)
+
+        const reader = response.body.getReader()
+        const decoder = new TextDecoder()
+        let buffer = ''
+        while (!stopped) {
+          const { value, done } = await reader.read()
+          if (done) break
+          buffer += decoder.decode(value, { stream: true })
+
+          // Events are separated by a blank line
+          let boundary
+          while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary)
+            buffer = buffer.slice(boundary + 2)
+            let event = 'message'
+            let data = ''
+            for (const line of block.split('\n')) {
+              if (line.startsWith('event:')) event = line.slice(6).trim()
+              else if (line.startsWith('data:')) data += line.slice(5).trim()
+            }
+            if (event === 'change') callback.current(JSON.parse(data))
+            else if (event === 'resync') callback.current(null)
+          }
+        }
+      } catch (error) {
+        if (stopped) return
+        console.error('[LIVE] Connection lost:', error.message)
+      }
+      if (!stopped) retryTimer = setTimeout(() => connect(true), 5000)
+    }
+
+    connect(false)
+    return () => {
+      stopped = true
+      clearTimeout(retryTimer)
+      controller?.abort()
+    }
+  }, [])
+}
+
+export default useLiveUpdates
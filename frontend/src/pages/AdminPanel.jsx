@@ -49,7 +49,10 @@ function AdminPanel() {
   const fetchInviteCodes = async () => {
     try {
       setLoading(true)
-      const response = await axios.get('/api/admin/invite-codes')
+      // Only unused codes are shown; the server filters them
+      const response = await axios.get('/api/admin/invite-codes', {
+        params: { status: 'unused' }
+      })
       setInviteCodes(response.data)
       setError('')
     } catch (err) {
@@ -1,11 +1,28 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import axios from '../config/api'
 import { format } from 'date-fns'
 import { useAuth } from '../context/AuthContext'
 import AuthenticatedImage from '../components/AuthenticatedImage'
+import useLiveUpdates from '../hooks/useLiveUpdates'
 import { DragDropContext, Droppable, Draggable } from '@hello-pangea/dnd'
 import './PhotoGallery.css'
 
+// Same order as the server: sort_order ascending, then newest first
+const byServerOrder = (a, b) =>
+  (a.sort_order ?? 0) - (b.sort_order ?? 0) || new Date(b.created_at) - new Date(a.created_at)
+
+// Apply one entity's delta from /api/changes to a local list
+const applyChanges = (items, delta) => {
+  if (!delta) return items
+  const deleted = new Set(delta.deletes)
+  const upserts = new Map(delta.upserts.map(item => [item.id, item]))
+  const merged = items
+    .filter(item => !deleted.has(item.id))
+    .map(item => upserts.get(item.id) ?? item)
+  const known = new Set(merged.map(item => item.id))
+  return [...merged, ...delta.upserts.filter(item => !known.has(item.id))].sort(byServerOrder)
+}
+
 function PhotoGallery() {
   const { user } = useAuth()
   const [photos, setPhotos] = useState([])
@@ -25,11 +42,58 @@ function PhotoGallery() {
   const [editingPhotoDate, setEditingPhotoDate] = useState(false)
   const [editedDate, setEditedDate] = useState('')
 
+  // Change feed cursor: after the first load, mutations pull only what changed
+  const changesCursor = useRef(null)
+
   useEffect(() => {
-    fetchPhotos()
-    fetchAlbums()
+    loadAll()
   }, [])
 
+  const loadAll = async () => {
+    try {
+      const response = await axios.get('/api/changes')
+      changesCursor.current = response.data.cursor
+    } catch (error) {
+      console.error('Failed to fetch change cursor:', error)
+    }
+    await Promise.all([fetchPhotos(), fetchAlbums()])
+  }
+
+  // Pull other people's uploads and edits as they happen; bursts of
+  // notifications (a batch upload) are coalesced into one sync
+  const liveSyncTimer = useRef(null)
+  useLiveUpdates((change) => {
+    if (change && !['photos', 'albums'].includes(change.entity)) return
+    if (change && change.cursor <= changesCursor.current) return
+    clearTimeout(liveSyncTimer.current)
+    liveSyncTimer.current = setTimeout(syncChanges, 300)
+  })
+
+  const syncChanges = async () => {
+    if (changesCursor.current === null) {
+      await loadAll()
+      return
+    }
+
+    try {
+      let hasMore = true
+      while (hasMore) {
+        const response = await axios.get('/api/changes', {
+          params: { since: changesCursor.current }
+        })
+        const { cursor, has_more, changes } = response.data
+        setPhotos(prev => applyChanges(prev, changes.photos))
+        setAlbums(prev => applyChanges(prev, changes.albums))
+        changesCursor.current = cursor
+        hasMore = has_more
+      }
+    } catch (error) {
+      console.error('Failed to sync changes, reloading:', error)
+      changesCursor.current = null
+      await loadAll()
+    }
+  }
+
 
   const fetchPhotos = async () => {
     try {
@@ -88,7 +152,7 @@ function PhotoGallery() {
       alert(`Uploaded ${successCount} photo(s) successfully. ${failCount} photo(s) failed to upload.`)
     }
 
-    await fetchPhotos()
+    await syncChanges()
     setLoading(false)
     setShowUpload(false)
   }
@@ -100,7 +164,7 @@ function PhotoGallery() {
 
     try {
       await axios.delete(`/api/photos/${photoId}`)
-      await fetchPhotos()
+      await syncChanges()
       setSelectedPhoto(null)
     } catch (error) {
       console.error('Failed to delete photo:', error)
@@ -118,7 +182,7 @@ function PhotoGallery() {
       await axios.put(`/api/photos/${selectedPhoto.id}`, {
         title: editedTitle
       })
-      await fetchPhotos()
+      await syncChanges()
       setSelectedPhoto({ ...selectedPhoto, title: editedTitle })
       setEditingPhotoTitle(false)
     } catch (error) {
@@ -141,7 +205,7 @@ function PhotoGallery() {
       await axios.put(`/api/photos/${selectedPhoto.id}`, {
         taken_at: isoDate
       })
-      await fetchPhotos()
+      await syncChanges()
       setSelectedPhoto({ ...selectedPhoto, taken_at: isoDate })
       setEditingPhotoDate(false)
     } catch (error) {
@@ -165,7 +229,7 @@ function PhotoGallery() {
       setNewAlbumName('')
       setNewAlbumDescription('')
       setShowCreateAlbum(false)
-      await fetchAlbums()
+      await syncChanges()
     } catch (error) {
       console.error('Failed to create album:', error)
       alert('Failed to create album. Please try again.')
@@ -190,7 +254,7 @@ function PhotoGallery() {
 
     try {
       await axios.delete(`/api/albums/${albumId}`)
-      await fetchAlbums()
+      await syncChanges()
       if (selectedAlbum?.id === albumId) {
         setSelectedAlbum(null)
         setAlbumPhotos([])
@@ -209,7 +273,7 @@ function PhotoGallery() {
       if (selectedAlbum?.id === albumId) {
         await handleViewAlbum(albumId)
       }
-      await fetchAlbums()
+      await syncChanges()
     } catch (error) {
       console.error('Failed to add photo to album:', error)
       const errorMessage = error.response?.data?.detail || 'Failed to add photo to album.'
@@ -226,7 +290,7 @@ function PhotoGallery() {
       await axios.delete(`/api/albums/${albumId}/photos/${photoId}`)
       // Refresh album view
       await handleViewAlbum(albumId)
-      await fetchAlbums()
+      await syncChanges()
     } catch (error) {
       console.error('Failed to remove photo from album:', error)
       alert('Failed to remove photo.')
@@ -294,7 +358,7 @@ function PhotoGallery() {
       await axios.post(`/api/albums/${albumId}/background`, formData, {
         headers: { 'Content-Type': 'multipart/form-data' }
       })
-      await fetchAlbums() // Refresh to show new background
+      await syncChanges() // Refresh to show new background
     } catch (error) {
       console.error('Failed to upload album background:', error)
       alert('Failed to upload background image. Please try again.')